@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+# Vitals watched for readings that are unusual for the person
+ANOMALY_METRICS = ['Systolic', 'Diastolic', 'HeartRate']
+
+# Weight of each new reading in the exponentially weighted mean and variance
+EWMA_ALPHA = 0.1
+
+# A reading more than this many standard deviations from the profile's
+# weighted mean is flagged
+CONTROL_LIMIT = 3.0
+
+# Readings needed before anything is scored, so a new profile's first few
+# readings are not all "unusual"
+WARMUP_READINGS = 10
+
+# Smallest standard deviation used for scoring, so a run of identical
+# readings does not make the next small change look extreme
+SD_FLOOR = 2.0
+
+# State of one metric: (readings seen, weighted mean, weighted variance)
+EMPTY_STATE = (0, 0.0, 0.0)
+
+def update(state, value, alpha=EWMA_ALPHA):
+    """
+    Score one reading against a metric's state, then fold it in.
+
+    O(1): the state is three numbers, updated with the exponentially
+    weighted mean/variance recursion.
+
+    Returns: (z-score or None while warming up or if value is missing, new state)
+    """
+    if value is None or value != value:
+        return None, state
+    count, mean, variance = state
+    if count == 0:
+        return None, (1, float(value), 0.0)
+
+    z = None
+    if count >= WARMUP_READINGS:
+        z = (value - mean) / max(variance ** 0.5, SD_FLOOR)
+
+    diff = value - mean
+    increment = alpha * diff
+    return z, (count + 1, mean + increment, (1 - alpha) * (variance + diff * increment))
+
+def is_anomaly(z, limit=CONTROL_LIMIT):
+    """True if a z-score is outside the control limits"""
+    return z is not None and abs(z) > limit
+
+def score_series(values, state=EMPTY_STATE, alpha=EWMA_ALPHA):
+    """
+    Score a whole history at once, giving the same results as calling
+    update() on each value in order.
+
+    The weighted mean and variance are linear recursions, so both come
+    from pandas' ewm() rather than a Python loop.
+
+    Returns: (array of z-scores, NaN where not scored, final state)
+    """
+    values = np.asarray(values, dtype=float)
+    z = np.full(len(values), np.nan)
+    present = np.flatnonzero(~np.isnan(values))
+    if not len(present):
+        return z, state
+    x = values[present]
+
+    count, mean, variance = state
+    if count == 0:
+        # The first value only seeds the mean
+        count, mean, variance = 1, x[0], 0.0
+        x = x[1:]
+        present = present[1:]
+        if not len(x):
+            return z, (count, float(mean), float(variance))
+
+    # mean[i] and variance[i] are the state after i values; prefixing the
+    # current state makes pandas start its recursion from it
+    means = pd.Series(np.concatenate([[mean], x])).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    diffs = x - means[:-1]
+    variances = pd.Series(np.concatenate([[variance], (1 - alpha) * diffs ** 2])).ewm(
+        alpha=alpha, adjust=False).mean().to_numpy()
+
+    counts = count + np.arange(len(x))
+    scored = counts >= WARMUP_READINGS
+    z[present[scored]] = diffs[scored] / np.maximum(np.sqrt(variances[:-1][scored]), SD_FLOOR)
+
+    return z, (count + len(x), float(means[-1]), float(variances[-1]))
+
+def score_history(df, alpha=EWMA_ALPHA):
+    """
+    Batch mode: score every reading of one profile's history vectorized.
+
+    df: readings with Date, Time and metric columns, in any order
+
+    Returns: (DataFrame in time order with a {metric}_z column per metric
+    and an Anomaly column, dict of final state per metric)
+    """
+    history = df.sort_values(['Date', 'Time'], kind='stable').reset_index(drop=True)
+    states = {}
+    anomalies = np.zeros(len(history), dtype=bool)
+    for metric in ANOMALY_METRICS:
+        if metric not in history.columns:
+            continue
+        z, states[metric] = score_series(history[metric].to_numpy(dtype=float), alpha=alpha)
+        history[f'{metric}_z'] = z
+        anomalies |= np.abs(np.nan_to_num(z)) > CONTROL_LIMIT
+    history['Anomaly'] = anomalies
+    return history, states
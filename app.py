@@ -5,10 +5,17 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import numpy as np
 from utils import (categorize_bp, get_category_color, get_category_description,
-                   calculate_statistics, get_educational_info)
+                   calculate_statistics, statistics_from_rollups, get_educational_info,
+                   get_bp_categories)
 import base64
 import io
 import database
+import app_cache
+from readings_store import ReadingsStore
+import session_memory
+import chart_data
+import figure_cache
+import write_queue
 import hashlib
 import hmac
 import os
@@ -68,6 +75,9 @@ if "selected_profile_id" not in st.session_state:
 if "current_tab" not in st.session_state:
     st.session_state.current_tab = "login"
 
+# Record this interaction for idle-session eviction and memory accounting
+session_memory.touch(st.session_state)
+
 # Function to reset session state for logout
 def logout():
     st.session_state.authenticated = False
@@ -80,6 +90,7 @@ def logout():
     st.session_state.registration_step = "initial"
     st.session_state.temp_user_data = {}
     st.session_state.current_tab = "login"
+    session_memory.clear()
     # Don't reset selected_profile_id to maintain user preference
 
 # Check if we have a session token in cookies
@@ -156,10 +167,9 @@ with st.sidebar:
             
             with login_col2:
                 if st.button("Sign in with Google"):
-    auth_url = 
-  auth_utils.get_google_auth_url()
-    st.markdown(f"[Click here to sign in with Google]({auth_url})",
-                unsafe_allow_html=True)
+                    auth_url = auth_utils.get_google_auth_url()
+                    st.markdown(f"[Click here to sign in with Google]({auth_url})",
+                                unsafe_allow_html=True)
         
         # Registration form
         with register_tab:
@@ -299,6 +309,16 @@ with st.sidebar:
             # Clear session state
             logout()
             st.rerun()
+        
+        # Approximate server memory held per session, for operators
+        if os.environ.get("BP_MEMORY_STATS") == "1":
+            with st.expander("Session Memory"):
+                memory = session_memory.stats()
+                st.write(f"{memory['sessions']} sessions, {memory['total_bytes'] / 1024:.0f} KiB")
+                st.dataframe(pd.DataFrame(memory['per_session']), hide_index=True)
+                figures = figure_cache.stats()
+                st.write(f"Figure cache: {figures['hits']} hits, {figures['misses']} misses, "
+                         f"{figures['entries']} figures, {figures['bytes'] / 1024:.0f} KiB")
 
 # If not authenticated, show only the welcome screen
 if not st.session_state.authenticated:
@@ -338,96 +358,34 @@ if not st.session_state.authenticated:
 
 # If we reach here, the user is authenticated - continue with the main app functionality
 
-# Load data from database
-try:
-    # Get all readings from the database
-    db_data = database.get_all_readings()
-
-    # Initialize session state with data from database
-    if 'bp_data' not in st.session_state:
-        st.session_state.bp_data = db_data if not db_data.empty else pd.DataFrame(
-            {
-                'Date': pd.Series(dtype='object'),
-                'Time': pd.Series(dtype='object'),
-                'Systolic': pd.Series(dtype='int'),
-                'Diastolic': pd.Series(dtype='int'),
-                'HeartRate': pd.Series(dtype='int'),
-                'Gender': pd.Series(dtype='object'),
-                'Age': pd.Series(dtype='int'),
-                'Category': pd.Series(dtype='object')
-            })
-except Exception as e:
-    st.error(f"Error loading data from database: {e}")
-    # Fallback to empty DataFrame if database fails
-    if 'bp_data' not in st.session_state:
-        st.session_state.bp_data = pd.DataFrame({
-            'Date':
-            pd.Series(dtype='object'),
-            'Time':
-            pd.Series(dtype='object'),
-            'Systolic':
-            pd.Series(dtype='int'),
-            'Diastolic':
-            pd.Series(dtype='int'),
-            'HeartRate':
-            pd.Series(dtype='int'),
-            'Gender':
-            pd.Series(dtype='object'),
-            'Age':
-            pd.Series(dtype='int'),
-            'Category':
-            pd.Series(dtype='object')
-        })
+# Profiles saved before accounts existed have no owner. On a single-account
+# install they can only be that account's, so hand them over once per session
+if not st.session_state.get("legacy_profiles_checked"):
+    st.session_state.legacy_profiles_checked = True
+    if not database.SHARD_BY_USER and auth_db.count_users() == 1:
+        claimed = database.claim_unowned_profiles(st.session_state.user_id)
+        if claimed:
+            st.info(f"Added {claimed} existing profile(s) to your account.")
 
-# App title and description
-st.title("Blood Pressure Monitor")
-st.markdown("""
-    Track, analyze, and monitor your blood pressure readings over time.
-    Create profiles for up to 5 people and easily track their measurements.
-""")
+def load_readings_store():
+    """Load the user's readings from the database into a compact columnar store"""
+    try:
+        # Get all readings from the database
+        db_data = app_cache.query_readings(
+            columns=['Date', 'Time', 'ProfileId', 'Name', 'Gender', 'Age',
+                     'Systolic', 'Diastolic', 'HeartRate', 'Category'],
+            ascending=True,
+            user_id=st.session_state.user_id)
+    except Exception as e:
+        st.error(f"Error loading data from database: {e}")
+        db_data = pd.DataFrame()
+    return ReadingsStore.from_frame(db_data)
 
-# Add tabs for main interface, profile management, and analytics
-tab1, tab2, tab3 = st.tabs(
-    ["Blood Pressure Readings", "Manage Profiles", "My Profile Analytics"])
-try:
-    # Get all readings from the database
-    db_data = database.get_all_readings()
-
-    # Initialize session state with data from database
-    if 'bp_data' not in st.session_state:
-        st.session_state.bp_data = db_data if not db_data.empty else pd.DataFrame(
-            {
-                'Date': pd.Series(dtype='object'),
-                'Time': pd.Series(dtype='object'),
-                'Systolic': pd.Series(dtype='int'),
-                'Diastolic': pd.Series(dtype='int'),
-                'HeartRate': pd.Series(dtype='int'),
-                'Gender': pd.Series(dtype='object'),
-                'Age': pd.Series(dtype='int'),
-                'Category': pd.Series(dtype='object')
-            })
-except Exception as e:
-    st.error(f"Error loading data from database: {e}")
-    # Fallback to empty DataFrame if database fails
-    if 'bp_data' not in st.session_state:
-        st.session_state.bp_data = pd.DataFrame({
-            'Date':
-            pd.Series(dtype='object'),
-            'Time':
-            pd.Series(dtype='object'),
-            'Systolic':
-            pd.Series(dtype='int'),
-            'Diastolic':
-            pd.Series(dtype='int'),
-            'HeartRate':
-            pd.Series(dtype='int'),
-            'Gender':
-            pd.Series(dtype='object'),
-            'Age':
-            pd.Series(dtype='int'),
-            'Category':
-            pd.Series(dtype='object')
-        })
+# The session's readings are held server-side rather than in session
+# state, so they can be dropped while the session is idle; they are
+# reloaded here on its next interaction. Saves append to them.
+readings_store = session_memory.get(f"readings_store/{st.session_state.user_id}",
+                                    load_readings_store)
 
 # App title and description
 st.title("Blood Pressure Monitor")
@@ -436,20 +394,23 @@ st.markdown("""
     Create profiles for up to 5 people and easily track their measurements.
 """)
 
-# Add tabs for main interface, profile management, and analytics
-tab1, tab2, tab3 = st.tabs(
-    ["Blood Pressure Readings", "Manage Profiles", "My Profile Analytics"])
+# Sections for the main interface, profile management, and analytics.
+# st.tabs would build all three on every rerun; with explicit navigation
+# only the section being viewed does any work.
+SECTIONS = ["Blood Pressure Readings", "Manage Profiles", "My Profile Analytics"]
+active_section = st.radio("Section", SECTIONS, horizontal=True,
+                          key="active_section", label_visibility="collapsed")
 
-with tab2:
+if active_section == "Manage Profiles":
     st.subheader("Profile Management")
     st.markdown("Create and manage profiles for up to 5 people.")
 
     # Get all profiles
-    profiles = database.get_profiles()
+    profiles = app_cache.get_profiles(user_id=st.session_state.user_id)
 
     # Display existing profiles
     if profiles:
-        st.write(f"Current Profiles ({len(profiles)}/5):")
+        st.write(f"Current Profiles ({len(profiles)}/{database.MAX_PROFILES}):")
         for i, profile in enumerate(profiles):
             with st.expander(
                     f"{profile['name']} ({profile['gender']}, {profile['age']} years)"
@@ -481,7 +442,8 @@ with tab2:
                     if st.button("Update Profile",
                                  key=f"update_{profile['id']}"):
                         if database.update_profile(profile['id'], new_name,
-                                                   new_gender, new_age):
+                                                   new_gender, new_age,
+                                                   user_id=st.session_state.user_id):
                             st.success("Profile updated successfully!")
                             st.rerun()
                         else:
@@ -490,7 +452,7 @@ with tab2:
                 with delete_col:
                     if st.button("Delete Profile",
                                  key=f"delete_{profile['id']}"):
-                        if database.delete_profile(profile['id']):
+                        if database.delete_profile(profile['id'], user_id=st.session_state.user_id):
                             st.success("Profile deleted successfully!")
                             st.rerun()
                         else:
@@ -499,7 +461,7 @@ with tab2:
         st.info("No profiles created yet. Add your first profile below.")
 
     # Add new profile form
-    if len(profiles) < 5:
+    if len(profiles) < database.MAX_PROFILES:
         st.markdown("---")
         st.subheader("Add New Profile")
 
@@ -522,7 +484,8 @@ with tab2:
             if submitted:
                 if new_profile_name:
                     profile_id = database.create_profile(
-                        new_profile_name, new_profile_gender, new_profile_age)
+                        new_profile_name, new_profile_gender, new_profile_age,
+                        user_id=st.session_state.user_id)
                     if profile_id:
                         st.success(f"Profile created successfully!")
                         st.rerun()
@@ -531,7 +494,10 @@ with tab2:
                 else:
                     st.error("Profile name is required.")
 
-with tab1:
+# The reading form reruns on its own, so entering and saving a reading
+# does not rebuild the rest of the page
+@st.fragment
+def reading_entry():
     # Main app layout with columns
     col1, col2 = st.columns([1, 1])
 
@@ -539,7 +505,7 @@ with tab1:
         st.subheader("Enter Blood Pressure Reading")
 
         # Get profiles for selection
-        profiles = database.get_profiles()
+        profiles = app_cache.get_profiles(user_id=st.session_state.user_id)
 
         if not profiles:
             st.warning("Please create a profile first before adding readings.")
@@ -556,7 +522,8 @@ with tab1:
             selected_profile_id = profile_options[profile_display_name]
 
             # Get selected profile details
-            selected_profile = database.get_profile_by_id(selected_profile_id)
+            selected_profile = app_cache.get_profile_by_id(selected_profile_id,
+                                                          user_id=st.session_state.user_id)
 
             # Date and time input - with current date and time as default
             current_date = datetime.now().date()
@@ -601,37 +568,26 @@ with tab1:
                 # Format time as string
                 time_str = time.strftime('%H:%M')
 
-                # Save to database
-                success = database.save_reading(profile_id=selected_profile_id,
-                                                date=date,
-                                                time=time_str,
-                                                systolic=systolic,
-                                                diastolic=diastolic,
-                                                heart_rate=heart_rate,
-                                                category=category)
+                # Save to database (queued for a group commit in write-behind mode)
+                success = write_queue.save_reading(profile_id=selected_profile_id,
+                                                   date=date,
+                                                   time=time_str,
+                                                   systolic=systolic,
+                                                   diastolic=diastolic,
+                                                   heart_rate=heart_rate,
+                                                   category=category,
+                                                   user_id=st.session_state.user_id)
 
                 if success:
-                    # Create a new entry for session state
-                    new_entry = pd.DataFrame([{
-                        'Date': date,
-                        'Time': time_str,
-                        'ProfileId': selected_profile_id,
-                        'Name': selected_profile['name'],
-                        'Gender': gender,
-                        'Age': age,
-                        'Systolic': systolic,
-                        'Diastolic': diastolic,
-                        'HeartRate': heart_rate,
-                        'Category': category
-                    }])
-
-                    # Add to session state
-                    st.session_state.bp_data = pd.concat(
-                        [st.session_state.bp_data, new_entry],
-                        ignore_index=True)
+                    # Add to the session's store; no frame is copied
+                    readings_store.set_profile(selected_profile_id, selected_profile['name'],
+                                               gender, age)
+                    readings_store.append(selected_profile_id, date, time_str, systolic,
+                                          diastolic, heart_rate, category)
 
+                    # The latest reading column below is drawn after this,
+                    # so it shows the new entry without another rerun
                     st.success("Reading saved successfully!")
-                    st.rerun()
                 else:
                     st.error(
                         "Failed to save reading to database. Please try again."
@@ -639,9 +595,9 @@ with tab1:
 
     with col2:
         # Only show this if we have data
-        if not st.session_state.bp_data.empty:
+        if not readings_store.empty:
             # Get the latest reading
-            latest = st.session_state.bp_data.iloc[-1]
+            latest = readings_store.latest()
             category = latest['Category']
 
             st.subheader("Latest Reading")
@@ -680,41 +636,39 @@ with tab1:
                 "No readings yet. Enter your first blood pressure reading to get started."
             )
 
-# Create tab3 content for Analytics
-with tab3:
+if active_section == "Blood Pressure Readings":
+    reading_entry()
+
+# Analytics section
+if active_section == "My Profile Analytics":
     st.subheader("My Profile Analytics")
 
-    if st.session_state.bp_data.empty:
+    # Analytics read from the database, so queued readings must land first
+    if not write_queue.flush():
+        st.warning("Some recently saved readings could not be written and are missing below.")
+    if app_cache.count_readings(user_id=st.session_state.user_id) == 0:
         st.info(
             "No blood pressure readings found. Please add readings in the 'Blood Pressure Readings' tab."
         )
     else:
-        # Add profile filter if we have profile data
+        # Add profile filter
         selected_profile_for_viz = None
-        filtered_data = st.session_state.bp_data
         
-        if 'ProfileId' in st.session_state.bp_data.columns:
-            profiles = database.get_profiles()
-            if profiles:
-                profile_options = {"All Profiles": None}
-                profile_options.update({
-                    f"{p['name']} ({p['gender']}, {p['age']} years)":
-                    p['id'] for p in profiles
-                })
-                
-                selected_profile_name = st.selectbox(
-                    "Select Profile for Analysis",
-                    options=list(profile_options.keys()),
-                    key="profile_viz"
-                )
-                
-                selected_profile_for_viz = profile_options[selected_profile_name]
-                
-                # Filter data if a specific profile is selected
-                if selected_profile_for_viz:
-                    filtered_data = st.session_state.bp_data[
-                        st.session_state.bp_data['ProfileId'] == selected_profile_for_viz
-                    ]
+        profiles = app_cache.get_profiles(user_id=st.session_state.user_id)
+        if profiles:
+            profile_options = {"All Profiles": None}
+            profile_options.update({
+                f"{p['name']} ({p['gender']}, {p['age']} years)":
+                p['id'] for p in profiles
+            })
+            
+            selected_profile_name = st.selectbox(
+                "Select Profile for Analysis",
+                options=list(profile_options.keys()),
+                key="profile_viz"
+            )
+            
+            selected_profile_for_viz = profile_options[selected_profile_name]
         
         # Time range filter
         st.subheader("Time Range")
@@ -724,27 +678,39 @@ with tab3:
             key="time_range"
         )
         
-        # Apply time filter
-        if time_range != "All Time" and 'Date' in filtered_data.columns:
-            if isinstance(filtered_data['Date'].iloc[0], str):
-                filtered_data['Date'] = pd.to_datetime(filtered_data['Date'])
-            
-            today = datetime.now().date()
-            if time_range == "Last 7 Days":
-                start_date = today - timedelta(days=7)
-            elif time_range == "Last 30 Days":
-                start_date = today - timedelta(days=30)
-            elif time_range == "Last 90 Days":
-                start_date = today - timedelta(days=90)
-                
-            filtered_data = filtered_data[filtered_data['Date'] >= start_date]
+        start_date = None
+        today = datetime.now().date()
+        if time_range == "Last 7 Days":
+            start_date = today - timedelta(days=7)
+        elif time_range == "Last 30 Days":
+            start_date = today - timedelta(days=30)
+        elif time_range == "Last 90 Days":
+            start_date = today - timedelta(days=90)
+        
+        # Let the database filter, order and project the rows being charted
+        filtered_data = app_cache.query_readings(
+            profile_ids=[selected_profile_for_viz] if selected_profile_for_viz else None,
+            start_date=start_date,
+            columns=['Date', 'Time', 'ProfileId', 'Name', 'Gender', 'Age',
+                     'Systolic', 'Diastolic', 'HeartRate', 'Category'],
+            user_id=st.session_state.user_id
+        )
         
         # If no data after filtering
         if filtered_data.empty:
             st.warning("No data available for the selected profile and time range.")
         else:
-            # Calculate statistics
-            stats = calculate_statistics(filtered_data)
+            # Statistics come from the daily rollups kept up to date on
+            # every write; the raw readings are only summarized if the
+            # rollups cannot be read
+            profile_filter = [selected_profile_for_viz] if selected_profile_for_viz else None
+            overall = app_cache.summarize_rollups(profile_ids=profile_filter,
+                                                  start_date=start_date, per_profile=False,
+                                                  user_id=st.session_state.user_id)
+            if overall.empty:
+                stats = calculate_statistics(filtered_data)
+            else:
+                stats = statistics_from_rollups(overall.iloc[0])
             
             # Display statistics in expandable section
             with st.expander("Statistics Summary", expanded=True):
@@ -761,150 +727,317 @@ with tab3:
                     st.metric("Max Diastolic", f"{stats['max_diastolic']} mmHg")
                 
                 with col3:
-                    if 'HeartRate' in filtered_data.columns:
+                    if stats['avg_heart_rate'] is not None:
                         st.metric("Average Heart Rate", f"{stats['avg_heart_rate']:.1f} BPM")
                         st.metric("Min Heart Rate", f"{stats['min_heart_rate']} BPM")
                         st.metric("Max Heart Rate", f"{stats['max_heart_rate']} BPM")
+                    else:
+                        st.metric("Average Heart Rate", "No data")
+                
+                st.caption(
+                    f"Average pulse pressure: {stats['avg_pulse_pressure']:.1f} mmHg · "
+                    f"Average mean arterial pressure: {stats['avg_map']:.1f} mmHg"
+                )
+                
+                # Weekly summary per profile, read from the cached rollup
+                # summary, so it stays cheap to build on every rerun
+                summary = app_cache.summarize_rollups(profile_ids=profile_filter,
+                                                      start_date=start_date, period='week',
+                                                      user_id=st.session_state.user_id)
+                if not summary.empty:
+                    names = {p['id']: p['name'] for p in profiles}
+                    st.download_button(
+                        label="Download Weekly Summary as CSV",
+                        data=database.summary_table(summary, names).to_csv(index=False),
+                        file_name='blood_pressure_weekly_summary.csv',
+                        mime='text/csv',
+                    )
+            
+            # Variability for a single profile, kept up to date incrementally
+            if selected_profile_for_viz:
+                rolling = database.get_rolling_analytics(selected_profile_for_viz,
+                                                         user_id=st.session_state.user_id)
+                if rolling:
+                    with st.expander("Variability (last readings)", expanded=False):
+                        col1, col2 = st.columns(2)
+                        for col, metric in [(col1, 'Systolic'), (col2, 'Diastolic')]:
+                            summary = rolling[metric]
+                            with col:
+                                if summary['moving_average'] is not None:
+                                    st.metric(f"{metric} Moving Average",
+                                              f"{summary['moving_average']:.1f} mmHg")
+                                if summary['window_std'] is not None:
+                                    st.metric(f"{metric} SD / CV",
+                                              f"{summary['window_std']:.1f} / {summary['window_cv']:.1%}")
+                                    st.metric(f"{metric} Average Real Variability",
+                                              f"{summary['window_arv']:.1f} mmHg")
+                                if summary['morning_evening_diff'] is not None:
+                                    st.metric(f"{metric} Morning vs Evening",
+                                              f"{summary['morning_evening_diff']:+.1f} mmHg")
+            
+            # Robust trend per profile with short-horizon projections
+            trend = database.get_trends(
+                profile_ids=[selected_profile_for_viz] if selected_profile_for_viz else None,
+                user_id=st.session_state.user_id
+            )
+            if not trend.empty:
+                with st.expander("Trend and Forecast", expanded=False):
+                    st.caption("Slopes are fitted over each profile's full history, down-weighting outlying readings. Forecasts extend the trend from the latest reading.")
+                    table = pd.DataFrame({
+                        'Name': trend['Name'],
+                        'Readings': trend['n'],
+                        'Systolic / week': (trend['Systolic_slope'] * 7).round(2),
+                        'Systolic in 7 days': trend['Systolic_forecast_7d'].round(0),
+                        'Systolic in 30 days': trend['Systolic_forecast_30d'].round(0),
+                        'Diastolic / week': (trend['Diastolic_slope'] * 7).round(2),
+                        'Diastolic in 7 days': trend['Diastolic_forecast_7d'].round(0),
+                        'Diastolic in 30 days': trend['Diastolic_forecast_30d'].round(0),
+                    })
+                    st.dataframe(table, use_container_width=True, hide_index=True)
+
+            # Time-of-day pattern over each profile's full history
+            by_period, by_profile = database.get_circadian(
+                profile_ids=[selected_profile_for_viz] if selected_profile_for_viz else None,
+                user_id=st.session_state.user_id
+            )
+            if not by_period.empty:
+                with st.expander("Time of Day", expanded=False):
+                    fig = px.bar(by_period, x='Period', y=['Systolic', 'Diastolic'],
+                                 facet_col='Name' if not selected_profile_for_viz else None,
+                                 barmode='group',
+                                 labels={'value': 'Average (mmHg)', 'variable': 'Measurement'})
+                    st.plotly_chart(fig, use_container_width=True)
+                    st.caption("Nocturnal dip is the fall in average systolic from daytime to night (22:00-06:00); 10-20% is typical. Morning surge is the morning average minus the lowest reading of the night before.")
+                    st.dataframe(pd.DataFrame({
+                        'Name': by_profile['Name'],
+                        'Day Systolic': by_profile['Day_Systolic'].round(1),
+                        'Night Systolic': by_profile['Night_Systolic'].round(1),
+                        'Nocturnal Dip (%)': by_profile['Dip_pct'].round(1),
+                        'Pattern': by_profile['DipPattern'],
+                        'Morning Surge (mmHg)': by_profile['MorningSurge'].round(1),
+                        'Surge Days': by_profile['SurgeDays'],
+                    }), use_container_width=True, hide_index=True)
+
+            # Readings far from the person's own usual values
+            anomalies = database.get_anomalies(
+                profile_ids=[selected_profile_for_viz] if selected_profile_for_viz else None,
+                start_date=start_date,
+                user_id=st.session_state.user_id
+            )
+            if not anomalies.empty:
+                with st.expander(f"Unusual Readings ({anomalies['Id'].nunique()})", expanded=False):
+                    st.caption("Readings far outside the range of the person's own recent readings. Z is the distance in standard deviations.")
+                    st.dataframe(anomalies.drop(columns=['Id', 'ProfileId']).round({'Z': 1}),
+                                 use_container_width=True)
             
             # Time series visualization
             st.subheader("Blood Pressure Trends")
             
-            # Convert date column to datetime if it's not already
-            if not pd.api.types.is_datetime64_any_dtype(filtered_data['Date']):
-                filtered_data['Date'] = pd.to_datetime(filtered_data['Date'])
-            
-            # Sort by date for proper timeline
-            plot_data = filtered_data.sort_values('Date')
-            
-            # Create a time series plot
-            fig = go.Figure()
-            
-            # Add traces for systolic and diastolic
-            fig.add_trace(go.Scatter(
-                x=plot_data['Date'],
-                y=plot_data['Systolic'],
-                mode='lines+markers',
-                name='Systolic',
-                line=dict(color='red', width=2),
-                marker=dict(size=8)
-            ))
-            
-            fig.add_trace(go.Scatter(
-                x=plot_data['Date'],
-                y=plot_data['Diastolic'],
-                mode='lines+markers',
-                name='Diastolic',
-                line=dict(color='blue', width=2),
-                marker=dict(size=8)
-            ))
-            
-            # Add heart rate if available
-            if 'HeartRate' in plot_data.columns and plot_data['HeartRate'].notna().any():
-                fig.add_trace(go.Scatter(
-                    x=plot_data['Date'],
-                    y=plot_data['HeartRate'],
-                    mode='lines+markers',
-                    name='Heart Rate',
-                    line=dict(color='green', width=2),
-                    marker=dict(size=8),
-                    yaxis="y2"
-                ))
+            # Long histories are downsampled to a bounded number of points
+            # per series; picking a narrower visible range redraws it at
+            # full resolution
+            reading_times = chart_data.reading_times(filtered_data)
+            visible_start, visible_end = reading_times.min(), reading_times.max()
+            if len(filtered_data) > chart_data.TARGET_POINTS and visible_start < visible_end:
+                visible_start, visible_end = st.slider(
+                    "Visible range",
+                    min_value=visible_start.to_pydatetime(),
+                    max_value=visible_end.to_pydatetime(),
+                    value=(visible_start.to_pydatetime(), visible_end.to_pydatetime()),
+                    format="YYYY-MM-DD"
+                )
+            # Figures are cached per user, selection, range and data
+            # version, so reruns that change none of them skip rebuilding
+            figure_version = database.get_write_seq(st.session_state.user_id)
+            
+            def cached_figure(name, build, *key):
+                """Build a figure, or reuse the cached one for the same inputs"""
+                if figure_version is None:
+                    return build()
+                return figure_cache.get_figure(
+                    (name, st.session_state.user_id, selected_profile_for_viz, start_date,
+                     figure_version) + key, build)
+            
+            def build_trend_figure():
+                series = chart_data.chart_series(
+                    filtered_data, ['Systolic', 'Diastolic', 'HeartRate'],
+                    start=visible_start, end=visible_end
+                )
+            
+                # Create a time series plot
+                fig = go.Figure()
+            
+                # Add traces for systolic and diastolic, with WebGL once dense
+                for column, color in [('Systolic', 'red'), ('Diastolic', 'blue')]:
+                    times, values, total = series[column]
+                    fig.add_trace(chart_data.scatter(
+                        len(values),
+                        x=times,
+                        y=values,
+                        mode='lines+markers',
+                        name=column if len(values) == total else f"{column} ({len(values)} of {total} shown)",
+                        line=dict(color=color, width=2),
+                        marker=dict(size=8 if len(values) <= chart_data.WEBGL_THRESHOLD else 4)
+                    ))
+            
+                # Add heart rate if available
+                times, values, total = series['HeartRate']
+                if len(values):
+                    fig.add_trace(chart_data.scatter(
+                        len(values),
+                        x=times,
+                        y=values,
+                        mode='lines+markers',
+                        name='Heart Rate',
+                        line=dict(color='green', width=2),
+                        marker=dict(size=8 if len(values) <= chart_data.WEBGL_THRESHOLD else 4),
+                        yaxis="y2"
+                    ))
                 
-                # Add secondary y-axis for heart rate
-                fig.update_layout(
-                    yaxis2=dict(
-                        title="Heart Rate (BPM)",
-                        overlaying="y",
-                        side="right",
-                        range=[30, 180]
+                    # Add secondary y-axis for heart rate
+                    fig.update_layout(
+                        yaxis2=dict(
+                            title="Heart Rate (BPM)",
+                            overlaying="y",
+                            side="right",
+                            range=[30, 180]
+                        )
                     )
-                )
             
-            # Update layout
-            fig.update_layout(
-                title="Blood Pressure Over Time",
-                xaxis_title="Date",
-                yaxis_title="Blood Pressure (mmHg)",
-                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-                height=500,
-                margin=dict(l=50, r=50, t=80, b=50)
-            )
+                # Update layout
+                fig.update_layout(
+                    title="Blood Pressure Over Time",
+                    xaxis_title="Date",
+                    yaxis_title="Blood Pressure (mmHg)",
+                    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+                    height=500,
+                    margin=dict(l=50, r=50, t=80, b=50)
+                )
             
-            # Add reference lines for normal ranges
-            fig.add_shape(
-                type="line",
-                x0=plot_data['Date'].min(),
-                x1=plot_data['Date'].max(),
-                y0=120,
-                y1=120,
-                line=dict(color="rgba(255,0,0,0.3)", width=2, dash="dash"),
-                name="Systolic Reference"
-            )
+                # Add reference lines for normal ranges
+                fig.add_shape(
+                    type="line",
+                    x0=visible_start,
+                    x1=visible_end,
+                    y0=120,
+                    y1=120,
+                    line=dict(color="rgba(255,0,0,0.3)", width=2, dash="dash"),
+                    name="Systolic Reference"
+                )
             
-            fig.add_shape(
-                type="line",
-                x0=plot_data['Date'].min(),
-                x1=plot_data['Date'].max(),
-                y0=80,
-                y1=80,
-                line=dict(color="rgba(0,0,255,0.3)", width=2, dash="dash"),
-                name="Diastolic Reference"
-            )
+                fig.add_shape(
+                    type="line",
+                    x0=visible_start,
+                    x1=visible_end,
+                    y0=80,
+                    y1=80,
+                    line=dict(color="rgba(0,0,255,0.3)", width=2, dash="dash"),
+                    name="Diastolic Reference"
+                )
+                
+                return fig
             
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(cached_figure("trend", build_trend_figure, visible_start, visible_end),
+                            use_container_width=True)
             
             # Distribution of readings by category
             st.subheader("Blood Pressure Categories")
             
-            # Create a bar chart showing count by category
-            category_counts = plot_data['Category'].value_counts().reset_index()
-            category_counts.columns = ['Category', 'Count']
-            
-            fig_categories = px.bar(
-                category_counts,
-                x='Category',
-                y='Count',
-                color='Category',
-                color_discrete_map={
-                    'Normal': 'green',
-                    'Elevated': 'yellow',
-                    'Hypertension Stage 1': 'orange',
-                    'Hypertension Stage 2': 'red',
-                    'Hypertensive Crisis': 'darkred'
-                }
-            )
+            def build_category_figure():
+                # Create a bar chart showing count by category
+                category_counts = filtered_data['Category'].value_counts().reset_index()
+                category_counts.columns = ['Category', 'Count']
             
-            fig_categories.update_layout(
-                title="Distribution of Blood Pressure Readings by Category",
-                xaxis_title="Category",
-                yaxis_title="Number of Readings",
-                height=400
-            )
+                fig_categories = px.bar(
+                    category_counts,
+                    x='Category',
+                    y='Count',
+                    color='Category',
+                    color_discrete_map={
+                        category: get_category_color(category)
+                        for category in get_bp_categories()
+                    }
+                )
+            
+                fig_categories.update_layout(
+                    title="Distribution of Blood Pressure Readings by Category",
+                    xaxis_title="Category",
+                    yaxis_title="Number of Readings",
+                    height=400
+                )
+                
+                return fig_categories
             
-            st.plotly_chart(fig_categories, use_container_width=True)
+            st.plotly_chart(cached_figure("categories", build_category_figure),
+                            use_container_width=True)
             
             # Data table with all readings
             st.subheader("All Readings")
             
-            # Show a downloadable CSV option
-            def convert_df_to_csv(df):
-                csv = df.to_csv(index=False)
-                return csv
-            
-            display_data = filtered_data.sort_values(by=['Date', 'Time'], ascending=[False, False])
-            if 'ProfileId' in display_data.columns:
-                display_data = display_data.drop(columns=['ProfileId'])
-            
-            csv = convert_df_to_csv(display_data)
-            st.download_button(
-                label="Download Data as CSV",
-                data=csv,
-                file_name='blood_pressure_data.csv',
-                mime='text/csv',
+            # Downloads are built only when "Prepare download" is clicked and
+            # streamed from the database. The button is rendered for that run
+            # alone and does not rerun the app when clicked, so no other rerun
+            # fetches or resends the export.
+            export_format = st.selectbox(
+                "Download format",
+                options=database.export_formats(),
+                format_func=lambda fmt: {'csv': 'CSV', 'csv.gz': 'CSV (gzip)',
+                                         'jsonl': 'JSON Lines', 'parquet': 'Parquet'}[fmt],
+                key="download_format"
             )
+            extension, mime = database.EXPORT_FORMATS[export_format]
+            export_profile_ids = [selected_profile_for_viz] if selected_profile_for_viz else None
+            if st.button("Prepare download", key="prepare_download"):
+                export_data = app_cache.export_readings(export_format, export_profile_ids,
+                                                        start_date, st.session_state.user_id)
+                if export_data:
+                    st.download_button(
+                        label="Download Data",
+                        data=export_data,
+                        file_name=f'blood_pressure_data.{extension}',
+                        mime=mime,
+                        on_click="ignore",
+                    )
+                else:
+                    st.error("The download could not be prepared. Please try again.")
+            
+            # Show the data table one keyset page at a time; changing the
+            # filters starts again from the newest page
+            page_filters = (selected_profile_for_viz, start_date)
+            if st.session_state.get("readings_page_filters") != page_filters:
+                st.session_state.readings_page_filters = page_filters
+                st.session_state.readings_page_cursor = None
+                st.session_state.readings_page_direction = "next"
+            
+            page = database.get_readings_page(
+                profile_id=selected_profile_for_viz,
+                cursor=st.session_state.readings_page_cursor,
+                direction=st.session_state.readings_page_direction,
+                start_date=start_date,
+                user_id=st.session_state.user_id
+            )
+            page_rows = page["rows"]
+            if not page_rows.empty:
+                page_rows = page_rows.rename(columns={
+                    'date': 'Date', 'time': 'Time', 'systolic': 'Systolic',
+                    'diastolic': 'Diastolic', 'heart_rate': 'HeartRate',
+                    'category': 'Category'
+                }).drop(columns=['id', 'measured_at', 'ProfileId'])
+            
+            st.caption(f"{len(filtered_data)} readings in range")
+            st.dataframe(page_rows, use_container_width=True)
             
-            # Show the data table
-            st.dataframe(display_data, use_container_width=True)
+            prev_col, next_col = st.columns(2)
+            with prev_col:
+                if st.button("Newer", disabled=page["prev_cursor"] is None, key="readings_prev"):
+                    st.session_state.readings_page_cursor = page["prev_cursor"]
+                    st.session_state.readings_page_direction = "prev"
+                    st.rerun()
+            with next_col:
+                if st.button("Older", disabled=page["next_cursor"] is None, key="readings_next"):
+                    st.session_state.readings_page_cursor = page["next_cursor"]
+                    st.session_state.readings_page_direction = "next"
+                    st.rerun()
     
     # Educational section
     st.subheader("Blood Pressure Education")
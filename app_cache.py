@@ -0,0 +1,119 @@
+import streamlit as st
+import database
+
+# Cached results kept per function; the least recently used are evicted
+# first. Each user/query/write-sequence combination is one entry.
+MAX_ENTRIES = 64
+
+# Every cached loader takes the database write sequence as an argument, so
+# an entry is only reused while nothing has been written since it was
+# loaded. user_id is part of every key, so users never share entries.
+
+@st.cache_data(max_entries=MAX_ENTRIES, show_spinner=False)
+def _profiles(user_id, write_seq):
+    """Cached database.get_profiles()"""
+    return database.get_profiles(user_id=user_id)
+
+@st.cache_data(max_entries=MAX_ENTRIES, show_spinner=False)
+def _query_readings(user_id, write_seq, profile_ids, start_date, end_date, columns, ascending):
+    """Cached database.query_readings()"""
+    return database.query_readings(
+        profile_ids=list(profile_ids) if profile_ids is not None else None,
+        start_date=start_date, end_date=end_date,
+        columns=list(columns) if columns is not None else None,
+        ascending=ascending, user_id=user_id)
+
+@st.cache_data(max_entries=MAX_ENTRIES, show_spinner=False)
+def _count_readings(user_id, write_seq, profile_id):
+    """Cached database.count_readings()"""
+    return database.count_readings(profile_id=profile_id, user_id=user_id)
+
+@st.cache_data(max_entries=MAX_ENTRIES, show_spinner=False)
+def _summarize_rollups(user_id, write_seq, profile_ids, start_date, end_date, period, per_profile):
+    """Cached database.summarize_rollups()"""
+    return database.summarize_rollups(
+        profile_ids=list(profile_ids) if profile_ids is not None else None,
+        start_date=start_date, end_date=end_date, period=period,
+        per_profile=per_profile, user_id=user_id)
+
+# Exports are large, so fewer of them are kept
+MAX_EXPORTS = 8
+
+@st.cache_data(max_entries=MAX_EXPORTS, show_spinner=False)
+def _export_readings(user_id, write_seq, fmt, profile_ids, start_date):
+    """Cached database.export_readings_bytes(); raises on failure so errors are not cached"""
+    data = database.export_readings_bytes(
+        fmt, list(profile_ids) if profile_ids is not None else None, start_date,
+        user_id=user_id)
+    if data is None:
+        raise RuntimeError(f"{fmt} export failed")
+    return data
+
+def get_profiles(user_id=None):
+    """database.get_profiles(), served from cache until the next write"""
+    write_seq = database.get_write_seq(user_id)
+    if write_seq is None:
+        return database.get_profiles(user_id=user_id)
+    return _profiles(user_id, write_seq)
+
+def get_profile_by_id(profile_id, user_id=None):
+    """database.get_profile_by_id(), answered from the cached profile list"""
+    for profile in get_profiles(user_id):
+        if profile['id'] == profile_id:
+            return profile
+    return None
+
+def query_readings(profile_ids=None, start_date=None, end_date=None, columns=None,
+                   ascending=False, user_id=None):
+    """database.query_readings(), served from cache until the next write"""
+    write_seq = database.get_write_seq(user_id)
+    if write_seq is None:
+        return database.query_readings(profile_ids, start_date, end_date, columns,
+                                       ascending, user_id=user_id)
+    # Lists are made hashable tuples for the cache key
+    return _query_readings(
+        user_id, write_seq,
+        tuple(profile_ids) if profile_ids is not None else None,
+        start_date, end_date,
+        tuple(columns) if columns is not None else None,
+        ascending)
+
+def count_readings(profile_id=None, user_id=None):
+    """database.count_readings(), served from cache until the next write"""
+    write_seq = database.get_write_seq(user_id)
+    if write_seq is None:
+        return database.count_readings(profile_id=profile_id, user_id=user_id)
+    return _count_readings(user_id, write_seq, profile_id)
+
+def summarize_rollups(profile_ids=None, start_date=None, end_date=None, period=None,
+                      per_profile=True, user_id=None):
+    """database.summarize_rollups(), served from cache until the next write"""
+    write_seq = database.get_write_seq(user_id)
+    if write_seq is None:
+        return database.summarize_rollups(profile_ids, start_date, end_date, period,
+                                          per_profile, user_id=user_id)
+    return _summarize_rollups(
+        user_id, write_seq,
+        tuple(profile_ids) if profile_ids is not None else None,
+        start_date, end_date, period, per_profile)
+
+def export_readings(fmt, profile_ids=None, start_date=None, user_id=None):
+    """database.export_readings_bytes(), cached per data version; b'' on error"""
+    write_seq = database.get_write_seq(user_id)
+    if write_seq is None:
+        return database.export_readings_bytes(fmt, profile_ids, start_date, user_id=user_id) or b''
+    try:
+        return _export_readings(user_id, write_seq, fmt,
+                                tuple(profile_ids) if profile_ids is not None else None,
+                                start_date)
+    except RuntimeError as e:
+        print(f"Export error: {e}")
+        return b''
+
+def clear():
+    """Drop every cached result"""
+    _profiles.clear()
+    _query_readings.clear()
+    _count_readings.clear()
+    _summarize_rollups.clear()
+    _export_readings.clear()
@@ -1,4 +1,4 @@
-import sqlite3
+import db_pool
 import hashlib
 import datetime
 import os
@@ -78,59 +78,102 @@ except ImportError:
 # Database setup for authentication
 AUTH_DB_FILE = "auth.db"
 
+# Lookups made on every login and rerun, shared with query_plan_check.py
+VALIDATE_SESSION_QUERY = '''SELECT s.id, s.user_id, s.expires_at, u.username, u.email 
+FROM sessions s
+JOIN users u ON s.user_id = u.id
+WHERE s.session_token = ? AND s.expires_at > ?'''
+
+END_SESSION_QUERY = "DELETE FROM sessions WHERE session_token = ?"
+
+USER_BY_EMAIL_QUERY = "SELECT id, username, password_hash, salt FROM users WHERE email = ?"
+
+USER_BY_USERNAME_QUERY = "SELECT id, username, password_hash, salt FROM users WHERE username = ?"
+
+LOGIN_HISTORY_QUERY = """SELECT ip_address, user_agent, created_at
+FROM sessions
+WHERE user_id = ?
+ORDER BY created_at DESC
+LIMIT ?"""
+
+MARK_LOGIN_SUCCESS_QUERY = """UPDATE login_attempts SET success = ?
+WHERE ip_address = ? AND username = ?
+ORDER BY attempt_time DESC LIMIT 1"""
+
+# Query name -> (SQL, sample parameters) checked by query_plan_check.py
+HOT_QUERIES = {
+    "validate_session": (VALIDATE_SESSION_QUERY, ("token", "2000-01-01")),
+    "end_session": (END_SESSION_QUERY, ("token",)),
+    "user_by_email": (USER_BY_EMAIL_QUERY, ("user@example.com",)),
+    "user_by_username": (USER_BY_USERNAME_QUERY, ("user",)),
+    "login_history": (LOGIN_HISTORY_QUERY, (1, 10)),
+    "mark_login_success": (MARK_LOGIN_SUCCESS_QUERY, (True, "127.0.0.1", "user")),
+}
+
 def setup_auth_database():
     """Create authentication database tables if they don't exist"""
     try:
-        conn = sqlite3.connect(AUTH_DB_FILE)
-        cursor = conn.cursor()
-        
-        # Create users table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE,
-            password_hash TEXT NOT NULL,
-            salt TEXT NOT NULL,
-            mobile TEXT,
-            is_email_verified BOOLEAN DEFAULT 0,
-            is_mobile_verified BOOLEAN DEFAULT 0,
-            verification_code TEXT,
-            verification_code_expiry TIMESTAMP,
-            last_login TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # Create sessions table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            session_token TEXT NOT NULL,
-            ip_address TEXT,
-            user_agent TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            expires_at TIMESTAMP NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-        )
-        ''')
-        
-        # Create login_attempts table to prevent brute force
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS login_attempts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT,
-            email TEXT,
-            ip_address TEXT NOT NULL,
-            attempt_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            success BOOLEAN
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        with db_pool.connection(AUTH_DB_FILE) as conn:
+            cursor = conn.cursor()
+            
+            # Create users table
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                email TEXT UNIQUE,
+                password_hash TEXT NOT NULL,
+                salt TEXT NOT NULL,
+                mobile TEXT,
+                is_email_verified BOOLEAN DEFAULT 0,
+                is_mobile_verified BOOLEAN DEFAULT 0,
+                verification_code TEXT,
+                verification_code_expiry TIMESTAMP,
+                last_login TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
+            
+            # Create sessions table
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                session_token TEXT NOT NULL,
+                ip_address TEXT,
+                user_agent TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+            ''')
+            
+            # Create login_attempts table to prevent brute force
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS login_attempts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT,
+                email TEXT,
+                ip_address TEXT NOT NULL,
+                attempt_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                success BOOLEAN
+            )
+            ''')
+            
+            # Indexes for token lookups, login history and brute-force checks.
+            # users.email and users.username are already indexed by UNIQUE.
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sessions_token ON sessions (session_token)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_sessions_user_created ON sessions (user_id, created_at)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_login_attempts_ip_time ON login_attempts (ip_address, attempt_time)"
+            )
+            
+            conn.commit()
         return True
     except Exception as e:
         print(f"Auth database setup error: {e}")
@@ -153,41 +196,38 @@ def hash_password(password, salt):
 def register_user(username, email, password, mobile=None):
     """Register a new user"""
     try:
-        conn = sqlite3.connect(AUTH_DB_FILE)
-        cursor = conn.cursor()
-        
-        # Check if username already exists
-        cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
-        if cursor.fetchone():
-            conn.close()
-            return {"success": False, "message": "Username already exists"}
-        
-        # Check if email already exists
-        if email:
-            cursor.execute("SELECT id FROM users WHERE email = ?", (email,))
+        with db_pool.connection(AUTH_DB_FILE) as conn:
+            cursor = conn.cursor()
+            
+            # Check if username already exists
+            cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
             if cursor.fetchone():
-                conn.close()
-                return {"success": False, "message": "Email already exists"}
-        
-        # Generate salt and hash password
-        salt = generate_salt()
-        password_hash = hash_password(password, salt)
-        
-        # Generate verification code
-        verification_code = str(secrets.randbelow(1000000)).zfill(6)
-        verification_expiry = datetime.now() + timedelta(hours=24)
-        
-        # Insert new user
-        cursor.execute(
-            '''INSERT INTO users 
-            (username, email, password_hash, salt, mobile, verification_code, verification_code_expiry) 
-            VALUES (?, ?, ?, ?, ?, ?, ?)''',
-            (username, email, password_hash, salt, mobile, verification_code, verification_expiry)
-        )
-        
-        user_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+                return {"success": False, "message": "Username already exists"}
+            
+            # Check if email already exists
+            if email:
+                cursor.execute("SELECT id FROM users WHERE email = ?", (email,))
+                if cursor.fetchone():
+                    return {"success": False, "message": "Email already exists"}
+            
+            # Generate salt and hash password
+            salt = generate_salt()
+            password_hash = hash_password(password, salt)
+            
+            # Generate verification code
+            verification_code = str(secrets.randbelow(1000000)).zfill(6)
+            verification_expiry = datetime.now() + timedelta(hours=24)
+            
+            # Insert new user
+            cursor.execute(
+                '''INSERT INTO users 
+                (username, email, password_hash, salt, mobile, verification_code, verification_code_expiry) 
+                VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                (username, email, password_hash, salt, mobile, verification_code, verification_expiry)
+            )
+            
+            user_id = cursor.lastrowid
+            conn.commit()
         
         return {
             "success": True, 
@@ -202,62 +242,50 @@ def register_user(username, email, password, mobile=None):
 def verify_user_credentials(username_or_email, password, ip_address=None):
     """Verify user credentials and log the attempt"""
     try:
-        conn = sqlite3.connect(AUTH_DB_FILE)
-        cursor = conn.cursor()
-        
-        # Check if it's an email (contains @) or username
-        if '@' in username_or_email:
-            cursor.execute(
-                "SELECT id, username, password_hash, salt FROM users WHERE email = ?", 
-                (username_or_email,)
-            )
-        else:
-            cursor.execute(
-                "SELECT id, username, password_hash, salt FROM users WHERE username = ?", 
-                (username_or_email,)
-            )
-        
-        user = cursor.fetchone()
-        
-        # Log the attempt
-        if ip_address:
-            cursor.execute(
-                "INSERT INTO login_attempts (username, email, ip_address, success) VALUES (?, ?, ?, ?)",
-                (
-                    username_or_email if '@' not in username_or_email else None,
-                    username_or_email if '@' in username_or_email else None,
-                    ip_address,
-                    False
+        with db_pool.connection(AUTH_DB_FILE) as conn:
+            cursor = conn.cursor()
+            
+            # Check if it's an email (contains @) or username
+            if '@' in username_or_email:
+                cursor.execute(USER_BY_EMAIL_QUERY, (username_or_email,))
+            else:
+                cursor.execute(USER_BY_USERNAME_QUERY, (username_or_email,))
+            
+            user = cursor.fetchone()
+            
+            # Log the attempt
+            if ip_address:
+                cursor.execute(
+                    "INSERT INTO login_attempts (username, email, ip_address, success) VALUES (?, ?, ?, ?)",
+                    (
+                        username_or_email if '@' not in username_or_email else None,
+                        username_or_email if '@' in username_or_email else None,
+                        ip_address,
+                        False
+                    )
                 )
-            )
-            conn.commit()
-        
-        if not user:
-            conn.close()
-            return {"success": False, "message": "Invalid username/email or password"}
-        
-        user_id, username, password_hash, salt = user
-        
-        # Verify password
-        if hash_password(password, salt) != password_hash:
-            conn.close()
-            return {"success": False, "message": "Invalid username/email or password"}
-        
-        # Update login attempt to success
-        if ip_address:
+                conn.commit()
+            
+            if not user:
+                return {"success": False, "message": "Invalid username/email or password"}
+            
+            user_id, username, password_hash, salt = user
+            
+            # Verify password
+            if hash_password(password, salt) != password_hash:
+                return {"success": False, "message": "Invalid username/email or password"}
+            
+            # Update login attempt to success
+            if ip_address:
+                cursor.execute(MARK_LOGIN_SUCCESS_QUERY, (True, ip_address, username))
+            
+            # Update last login time
             cursor.execute(
-                "UPDATE login_attempts SET success = ? WHERE ip_address = ? AND username = ? ORDER BY attempt_time DESC LIMIT 1",
-                (True, ip_address, username)
+                "UPDATE users SET last_login = ? WHERE id = ?",
+                (datetime.now(), user_id)
             )
-        
-        # Update last login time
-        cursor.execute(
-            "UPDATE users SET last_login = ? WHERE id = ?",
-            (datetime.now(), user_id)
-        )
-        
-        conn.commit()
-        conn.close()
+            
+            conn.commit()
         
         return {"success": True, "user_id": user_id, "username": username}
     except Exception as e:
@@ -267,24 +295,23 @@ def verify_user_credentials(username_or_email, password, ip_address=None):
 def create_session(user_id, ip_address=None, user_agent=None):
     """Create a new session for a user"""
     try:
-        conn = sqlite3.connect(AUTH_DB_FILE)
-        cursor = conn.cursor()
-        
-        # Generate session token
-        session_token = secrets.token_hex(32)
-        
-        # Set expiry to 30 days from now
-        expires_at = datetime.now() + timedelta(days=30)
-        
-        cursor.execute(
-            '''INSERT INTO sessions 
-            (user_id, session_token, ip_address, user_agent, expires_at) 
-            VALUES (?, ?, ?, ?, ?)''',
-            (user_id, session_token, ip_address, user_agent, expires_at)
-        )
-        
-        conn.commit()
-        conn.close()
+        with db_pool.connection(AUTH_DB_FILE) as conn:
+            cursor = conn.cursor()
+            
+            # Generate session token
+            session_token = secrets.token_hex(32)
+            
+            # Set expiry to 30 days from now
+            expires_at = datetime.now() + timedelta(days=30)
+            
+            cursor.execute(
+                '''INSERT INTO sessions 
+                (user_id, session_token, ip_address, user_agent, expires_at) 
+                VALUES (?, ?, ?, ?, ?)''',
+                (user_id, session_token, ip_address, user_agent, expires_at)
+            )
+            
+            conn.commit()
         
         return {"success": True, "session_token": session_token, "expires_at": expires_at}
     except Exception as e:
@@ -294,19 +321,12 @@ def create_session(user_id, ip_address=None, user_agent=None):
 def validate_session(session_token):
     """Validate a session token"""
     try:
-        conn = sqlite3.connect(AUTH_DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            '''SELECT s.id, s.user_id, s.expires_at, u.username, u.email 
-            FROM sessions s
-            JOIN users u ON s.user_id = u.id
-            WHERE s.session_token = ? AND s.expires_at > ?''',
-            (session_token, datetime.now())
-        )
-        
-        session = cursor.fetchone()
-        conn.close()
+        with db_pool.connection(AUTH_DB_FILE) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(VALIDATE_SESSION_QUERY, (session_token, datetime.now()))
+            
+            session = cursor.fetchone()
         
         if not session:
             return {"success": False, "message": "Invalid or expired session"}
@@ -327,13 +347,12 @@ def validate_session(session_token):
 def end_session(session_token):
     """End a session by deleting it"""
     try:
-        conn = sqlite3.connect(AUTH_DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute("DELETE FROM sessions WHERE session_token = ?", (session_token,))
-        
-        conn.commit()
-        conn.close()
+        with db_pool.connection(AUTH_DB_FILE) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(END_SESSION_QUERY, (session_token,))
+            
+            conn.commit()
         
         return {"success": True, "message": "Session ended successfully"}
     except Exception as e:
@@ -343,20 +362,19 @@ def end_session(session_token):
 def generate_verification_code(user_id):
     """Generate a new verification code for a user"""
     try:
-        conn = sqlite3.connect(AUTH_DB_FILE)
-        cursor = conn.cursor()
-        
-        # Generate verification code
-        verification_code = str(secrets.randbelow(1000000)).zfill(6)
-        verification_expiry = datetime.now() + timedelta(hours=24)
-        
-        cursor.execute(
-            "UPDATE users SET verification_code = ?, verification_code_expiry = ? WHERE id = ?",
-            (verification_code, verification_expiry, user_id)
-        )
-        
-        conn.commit()
-        conn.close()
+        with db_pool.connection(AUTH_DB_FILE) as conn:
+            cursor = conn.cursor()
+            
+            # Generate verification code
+            verification_code = str(secrets.randbelow(1000000)).zfill(6)
+            verification_expiry = datetime.now() + timedelta(hours=24)
+            
+            cursor.execute(
+                "UPDATE users SET verification_code = ?, verification_code_expiry = ? WHERE id = ?",
+                (verification_code, verification_expiry, user_id)
+            )
+            
+            conn.commit()
         
         return {"success": True, "verification_code": verification_code}
     except Exception as e:
@@ -366,37 +384,33 @@ def generate_verification_code(user_id):
 def verify_email(user_id, verification_code):
     """Verify a user's email with a verification code"""
     try:
-        conn = sqlite3.connect(AUTH_DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT verification_code, verification_code_expiry FROM users WHERE id = ?",
-            (user_id,)
-        )
-        
-        result = cursor.fetchone()
-        
-        if not result:
-            conn.close()
-            return {"success": False, "message": "User not found"}
-        
-        stored_code, expiry = result
-        
-        if stored_code != verification_code:
-            conn.close()
-            return {"success": False, "message": "Invalid verification code"}
-        
-        if datetime.fromisoformat(expiry) < datetime.now():
-            conn.close()
-            return {"success": False, "message": "Verification code expired"}
-        
-        cursor.execute(
-            "UPDATE users SET is_email_verified = 1, verification_code = NULL WHERE id = ?",
-            (user_id,)
-        )
-        
-        conn.commit()
-        conn.close()
+        with db_pool.connection(AUTH_DB_FILE) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                "SELECT verification_code, verification_code_expiry FROM users WHERE id = ?",
+                (user_id,)
+            )
+            
+            result = cursor.fetchone()
+            
+            if not result:
+                return {"success": False, "message": "User not found"}
+            
+            stored_code, expiry = result
+            
+            if stored_code != verification_code:
+                return {"success": False, "message": "Invalid verification code"}
+            
+            if datetime.fromisoformat(expiry) < datetime.now():
+                return {"success": False, "message": "Verification code expired"}
+            
+            cursor.execute(
+                "UPDATE users SET is_email_verified = 1, verification_code = NULL WHERE id = ?",
+                (user_id,)
+            )
+            
+            conn.commit()
         
         return {"success": True, "message": "Email verified successfully"}
     except Exception as e:
@@ -406,37 +420,33 @@ def verify_email(user_id, verification_code):
 def verify_mobile(user_id, verification_code):
     """Verify a user's mobile number with a verification code"""
     try:
-        conn = sqlite3.connect(AUTH_DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT verification_code, verification_code_expiry FROM users WHERE id = ?",
-            (user_id,)
-        )
-        
-        result = cursor.fetchone()
-        
-        if not result:
-            conn.close()
-            return {"success": False, "message": "User not found"}
-        
-        stored_code, expiry = result
-        
-        if stored_code != verification_code:
-            conn.close()
-            return {"success": False, "message": "Invalid verification code"}
-        
-        if datetime.fromisoformat(expiry) < datetime.now():
-            conn.close()
-            return {"success": False, "message": "Verification code expired"}
-        
-        cursor.execute(
-            "UPDATE users SET is_mobile_verified = 1, verification_code = NULL WHERE id = ?",
-            (user_id,)
-        )
-        
-        conn.commit()
-        conn.close()
+        with db_pool.connection(AUTH_DB_FILE) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                "SELECT verification_code, verification_code_expiry FROM users WHERE id = ?",
+                (user_id,)
+            )
+            
+            result = cursor.fetchone()
+            
+            if not result:
+                return {"success": False, "message": "User not found"}
+            
+            stored_code, expiry = result
+            
+            if stored_code != verification_code:
+                return {"success": False, "message": "Invalid verification code"}
+            
+            if datetime.fromisoformat(expiry) < datetime.now():
+                return {"success": False, "message": "Verification code expired"}
+            
+            cursor.execute(
+                "UPDATE users SET is_mobile_verified = 1, verification_code = NULL WHERE id = ?",
+                (user_id,)
+            )
+            
+            conn.commit()
         
         return {"success": True, "message": "Mobile verified successfully"}
     except Exception as e:
@@ -446,18 +456,17 @@ def verify_mobile(user_id, verification_code):
 def get_user_by_id(user_id):
     """Get user details by ID"""
     try:
-        conn = sqlite3.connect(AUTH_DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            """SELECT id, username, email, mobile, is_email_verified, 
-            is_mobile_verified, last_login, created_at 
-            FROM users WHERE id = ?""",
-            (user_id,)
-        )
-        
-        user = cursor.fetchone()
-        conn.close()
+        with db_pool.connection(AUTH_DB_FILE) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                """SELECT id, username, email, mobile, is_email_verified, 
+                is_mobile_verified, last_login, created_at 
+                FROM users WHERE id = ?""",
+                (user_id,)
+            )
+            
+            user = cursor.fetchone()
         
         if not user:
             return {"success": False, "message": "User not found"}
@@ -479,44 +488,58 @@ def get_user_by_id(user_id):
         print(f"Get user error: {e}")
         return {"success": False, "message": f"Failed to get user: {str(e)}"}
 
+def count_users():
+    """
+    Count registered accounts.
+    
+    Returns: number of users, or None on error
+    """
+    try:
+        with db_pool.connection(AUTH_DB_FILE) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM users")
+            return cursor.fetchone()[0]
+    except Exception as e:
+        print(f"Count users error: {e}")
+        return None
+
 def update_user(user_id, email=None, mobile=None, password=None):
     """Update user information"""
     try:
-        conn = sqlite3.connect(AUTH_DB_FILE)
-        cursor = conn.cursor()
-        
-        # Update email if provided
-        if email:
-            cursor.execute(
-                "UPDATE users SET email = ?, is_email_verified = 0 WHERE id = ?",
-                (email, user_id)
-            )
-        
-        # Update mobile if provided
-        if mobile:
-            cursor.execute(
-                "UPDATE users SET mobile = ?, is_mobile_verified = 0 WHERE id = ?",
-                (mobile, user_id)
-            )
-        
-        # Update password if provided
-        if password:
-            salt = generate_salt()
-            password_hash = hash_password(password, salt)
+        with db_pool.connection(AUTH_DB_FILE) as conn:
+            cursor = conn.cursor()
+            
+            # Update email if provided
+            if email:
+                cursor.execute(
+                    "UPDATE users SET email = ?, is_email_verified = 0 WHERE id = ?",
+                    (email, user_id)
+                )
+            
+            # Update mobile if provided
+            if mobile:
+                cursor.execute(
+                    "UPDATE users SET mobile = ?, is_mobile_verified = 0 WHERE id = ?",
+                    (mobile, user_id)
+                )
             
+            # Update password if provided
+            if password:
+                salt = generate_salt()
+                password_hash = hash_password(password, salt)
+                
+                cursor.execute(
+                    "UPDATE users SET password_hash = ?, salt = ? WHERE id = ?",
+                    (password_hash, salt, user_id)
+                )
+            
+            # Update timestamp
             cursor.execute(
-                "UPDATE users SET password_hash = ?, salt = ? WHERE id = ?",
-                (password_hash, salt, user_id)
+                "UPDATE users SET updated_at = ? WHERE id = ?",
+                (datetime.now(), user_id)
             )
-        
-        # Update timestamp
-        cursor.execute(
-            "UPDATE users SET updated_at = ? WHERE id = ?",
-            (datetime.now(), user_id)
-        )
-        
-        conn.commit()
-        conn.close()
+            
+            conn.commit()
         
         return {"success": True, "message": "User updated successfully"}
     except Exception as e:
@@ -526,20 +549,12 @@ def update_user(user_id, email=None, mobile=None, password=None):
 def get_login_history(user_id, limit=10):
     """Get login history for a user"""
     try:
-        conn = sqlite3.connect(AUTH_DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            """SELECT ip_address, user_agent, created_at
-            FROM sessions
-            WHERE user_id = ?
-            ORDER BY created_at DESC
-            LIMIT ?""",
-            (user_id, limit)
-        )
-        
-        sessions = cursor.fetchall()
-        conn.close()
+        with db_pool.connection(AUTH_DB_FILE) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(LOGIN_HISTORY_QUERY, (user_id, limit))
+            
+            sessions = cursor.fetchall()
         
         result = []
         for session in sessions:
@@ -8,6 +8,7 @@ from datetime import datetime, timedelta
 from urllib.parse import urlencode
 import streamlit as st
 import auth_db
+import db_pool
 
 # Always import time for our JWT implementation
 import time
@@ -187,13 +188,11 @@ def login_or_register_with_google(user_info, ip_address=None, user_agent=None):
 
 def check_user_exists_by_email(email):
     """Check if a user exists by email"""
-    conn = sqlite3.connect(auth_db.AUTH_DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT id FROM users WHERE email = ?", (email,))
-    result = cursor.fetchone()
-    
-    conn.close()
+    with db_pool.connection(auth_db.AUTH_DB_FILE) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT id FROM users WHERE email = ?", (email,))
+        result = cursor.fetchone()
     
     return result is not None
 
@@ -219,13 +218,11 @@ def generate_secure_random_password():
 
 def login_with_email(email, ip_address=None, user_agent=None):
     """Login user with email"""
-    conn = sqlite3.connect(auth_db.AUTH_DB_FILE)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT id, username FROM users WHERE email = ?", (email,))
-    result = cursor.fetchone()
-    
-    conn.close()
+    with db_pool.connection(auth_db.AUTH_DB_FILE) as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT id, username FROM users WHERE email = ?", (email,))
+        result = cursor.fetchone()
     
     if not result:
         return {"success": False, "message": "User not found"}
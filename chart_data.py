@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from circadian import minutes_of_day
+
+# Most points drawn per series, whatever the length of the history
+TARGET_POINTS = 1500
+
+# Series with more points than this are drawn with WebGL (Scattergl),
+# which stays responsive where SVG traces do not
+WEBGL_THRESHOLD = 1000
+
+def reading_times(df):
+    """Timestamps of readings from their Date and 'HH:MM' Time columns; NaT where Time is invalid"""
+    dates = pd.to_datetime(df['Date']).dt.normalize()
+    if 'Time' not in df.columns:
+        return dates
+    minutes = minutes_of_day(df['Time'].astype(str).to_numpy()).astype(float)
+    minutes[minutes < 0] = np.nan
+    return dates + pd.to_timedelta(minutes, unit='min')
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each of threshold - 2 equal
+    buckets in between, the point forming the largest triangle with the
+    point kept from the previous bucket and the mean of the next bucket.
+    This preserves peaks and the visual shape of the line.
+
+    x, y: float arrays, x ascending, no NaN
+
+    Returns: sorted indexes of the points to keep
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # The last bucket looks ahead to the final point
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def min_max(x, y, threshold):
+    """
+    Min/max bucketing: split the series into threshold / 2 equal buckets
+    and keep the lowest and highest point of each. Fully vectorized, and
+    never hides an extreme reading.
+
+    Returns: sorted indexes of the points to keep
+    """
+    n = len(x)
+    buckets = max(threshold // 2, 1)
+    if threshold >= n:
+        return np.arange(n)
+    codes = np.arange(n) * buckets // n
+    order = np.lexsort((y, codes))
+    starts = np.searchsorted(codes[order], np.arange(buckets))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+DOWNSAMPLERS = {'lttb': lttb, 'minmax': min_max}
+
+def downsample(times, values, target=TARGET_POINTS, method='lttb'):
+    """
+    Reduce one series to at most target points.
+
+    times: datetime64 array in ascending order; values: numbers, NaN for
+    missing (dropped)
+
+    Returns: (times, values) of the points kept
+    """
+    times = np.asarray(times)
+    values = np.asarray(values, dtype=float)
+    present = ~np.isnan(values)
+    times, values = times[present], values[present]
+    if len(values) <= target:
+        return times, values
+    x = times.astype('datetime64[s]').astype(np.int64).astype(float)
+    keep = DOWNSAMPLERS[method](x, values, target)
+    return times[keep], values[keep]
+
+def chart_series(df, columns, start=None, end=None, target=TARGET_POINTS, method='lttb'):
+    """
+    Prepare series for a time chart, bounded in size.
+
+    df: readings with Date, Time and the columns to plot, in any order;
+        readings without a valid time are left out
+    start, end: visible time range (None for open-ended). Only readings in
+        it are downsampled, so a narrow range is drawn at full resolution.
+
+    Returns: dict column -> (times, values, total points in range)
+    """
+    times = reading_times(df)
+    order = np.argsort(times.to_numpy(), kind='stable')
+    times = times.to_numpy()[order]
+    visible = ~np.isnat(times)
+    if start is not None:
+        visible &= times >= np.datetime64(pd.Timestamp(start))
+    if end is not None:
+        visible &= times <= np.datetime64(pd.Timestamp(end))
+
+    series = {}
+    for column in columns:
+        values = df[column].to_numpy(dtype=float)[order][visible]
+        total = int((~np.isnan(values)).sum())
+        series[column] = downsample(times[visible], values, target, method) + (total,)
+    return series
+
+def scatter(points, **kwargs):
+    """A Scatter trace, or Scattergl once there are enough points to need it"""
+    trace = go.Scattergl if points > WEBGL_THRESHOLD else go.Scatter
+    return trace(**kwargs)
@@ -0,0 +1,224 @@
+import threading
+import numpy as np
+import pandas as pd
+
+MINUTES_PER_DAY = 1440
+SECONDS_PER_DAY = 86400
+
+# Vitals averaged per time-of-day period
+CIRCADIAN_METRICS = ['Systolic', 'Diastolic', 'HeartRate']
+
+# (name, start, end) as 'HH:MM'; a period whose end is before its start
+# wraps past midnight. Minutes not covered by any period are ignored.
+DAY_PERIODS = (
+    ("Morning", "06:00", "12:00"),
+    ("Afternoon", "12:00", "18:00"),
+    ("Evening", "18:00", "22:00"),
+    ("Night", "22:00", "06:00"),
+)
+
+# Period treated as asleep for dipping, and the one right after waking
+# for the morning surge
+NIGHT_PERIOD = "Night"
+MORNING_PERIOD = "Morning"
+
+# Nocturnal dipping patterns by fall in systolic from day to night, in
+# percent: (name, minimum fall) from the largest fall down
+DIPPING_PATTERNS = (
+    ("Extreme dipper", 20),
+    ("Dipper", 10),
+    ("Non-dipper", 0),
+    ("Reverse dipper", None),
+)
+
+def minutes_of_day(times):
+    """
+    Parse 'HH:MM' strings into minutes since midnight without per-row
+    string handling: the strings are viewed as a byte matrix and the digits
+    combined arithmetically.
+
+    Returns: int array, -1 where a value is not a valid 'HH:MM' time
+    """
+    chars = np.asarray(times, dtype='S5')
+    if not chars.size:
+        return np.zeros(0, dtype=np.int64)
+    digits = chars.view(np.uint8).reshape(-1, 5).astype(np.int64) - ord('0')
+    hours = digits[:, 0] * 10 + digits[:, 1]
+    minutes = digits[:, 3] * 10 + digits[:, 4]
+    valid = ((digits[:, 2] == ord(':') - ord('0')) &
+             (digits[:, [0, 1, 3, 4]] >= 0).all(axis=1) &
+             (digits[:, [0, 1, 3, 4]] <= 9).all(axis=1) &
+             (hours < 24) & (minutes < 60))
+    return np.where(valid, hours * 60 + minutes, -1)
+
+def period_table(periods=DAY_PERIODS):
+    """
+    Build the minute-of-day -> period code lookup.
+
+    Returns: (int8 array of MINUTES_PER_DAY + 1 codes, with -1 for minutes
+    outside every period and for the invalid-time slot at the end, list of
+    period names)
+    """
+    table = np.full(MINUTES_PER_DAY + 1, -1, dtype=np.int8)
+    names = []
+    for code, (name, start, end) in enumerate(periods):
+        start, end = minutes_of_day([start, end])
+        if start < 0 or end < 0:
+            raise ValueError(f"Invalid period bounds for {name}")
+        if start < end:
+            table[start:end] = code
+        else:
+            table[start:MINUTES_PER_DAY] = code
+            table[:end] = code
+        names.append(name)
+    return table, names
+
+def _reading_times(df):
+    """Day number and minute of day of each reading, from MeasuredAt or Date and Time"""
+    days = np.full(len(df), -1, dtype=np.int64)
+    minutes = np.full(len(df), -1, dtype=np.int64)
+    missing = np.ones(len(df), dtype=bool)
+
+    if 'MeasuredAt' in df.columns:
+        # measured_at encodes the local date and time, so day and minute
+        # are plain integer arithmetic on the epoch seconds
+        seconds = ((pd.to_datetime(df['MeasuredAt']) - pd.Timestamp(0))
+                   / pd.Timedelta(seconds=1)).to_numpy(dtype=float)
+        missing = np.isnan(seconds)
+        seconds = np.nan_to_num(seconds).astype(np.int64)
+        days = np.where(missing, -1, seconds // SECONDS_PER_DAY)
+        minutes = np.where(missing, -1, seconds % SECONDS_PER_DAY // 60)
+
+    if missing.any() and 'Time' in df.columns and 'Date' in df.columns:
+        fallback = df[missing]
+        dates = pd.to_datetime(fallback['Date'])
+        days[missing] = np.where(dates.isna(), -1,
+                                 (dates - pd.Timestamp(0)).dt.days.fillna(-1).astype(np.int64))
+        minutes[missing] = minutes_of_day(fallback['Time'].astype(str).to_numpy())
+    return days, minutes
+
+def _group_mean(codes, values, groups):
+    """(count, mean) of values per group, ignoring NaN"""
+    present = ~np.isnan(values)
+    counts = np.bincount(codes[present], minlength=groups)
+    sums = np.bincount(codes[present], weights=values[present], minlength=groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return counts, sums / counts
+
+def dipping_pattern(dip_percent):
+    """Classify a nocturnal fall in systolic (percent) into a dipping pattern"""
+    if dip_percent is None or dip_percent != dip_percent:
+        return None
+    for name, minimum in DIPPING_PATTERNS:
+        if minimum is None or dip_percent >= minimum:
+            return name
+
+def circadian_profile(df, periods=DAY_PERIODS):
+    """
+    Aggregate readings by time of day for every profile at once.
+
+    df: readings with ProfileId, MeasuredAt and/or Date and Time, and
+        metric columns
+
+    Returns: (period DataFrame with a row per profile and period: n and the
+    mean of each metric, profile DataFrame with a row per profile: day and
+    night mean systolic, the nocturnal dip in percent and its pattern, and
+    the sleep-trough morning surge averaged over the days it can be
+    measured)
+    """
+    table, names = period_table(periods)
+    if df.empty:
+        return (pd.DataFrame(columns=['ProfileId', 'Period', 'n']),
+                pd.DataFrame(columns=['ProfileId']))
+
+    profile_codes, profile_ids = pd.factorize(df['ProfileId'], sort=True)
+    days, minutes = _reading_times(df)
+    periods_of = table[np.where(minutes < 0, MINUTES_PER_DAY, minutes)].astype(np.int64)
+    # Readings without a usable date or time, or outside every period
+    keep = (periods_of >= 0) & (days >= 0)
+    profile_codes, days, minutes, periods_of = (
+        profile_codes[keep], days[keep], minutes[keep], periods_of[keep])
+    values = {metric: df[metric].to_numpy(dtype=float)[keep]
+              for metric in CIRCADIAN_METRICS if metric in df.columns}
+    profiles, period_count = len(profile_ids), len(names)
+
+    # Per (profile, period)
+    cell = profile_codes * period_count + periods_of
+    by_period = pd.DataFrame({
+        'ProfileId': np.repeat(profile_ids, period_count),
+        'Period': pd.Categorical(np.tile(names, profiles), categories=names, ordered=True),
+        'n': np.bincount(cell, minlength=profiles * period_count),
+    })
+    for metric, metric_values in values.items():
+        by_period[metric] = _group_mean(cell, metric_values, profiles * period_count)[1]
+    by_period = by_period[by_period['n'] > 0].reset_index(drop=True)
+
+    result = pd.DataFrame({'ProfileId': profile_ids})
+    if 'Systolic' not in values:
+        return by_period, result
+    systolic = values['Systolic']
+
+    # Dipping: awake (every period but the night) against asleep
+    night = names.index(NIGHT_PERIOD) if NIGHT_PERIOD in names else -1
+    asleep = (periods_of == night).astype(np.int64)
+    _, means = _group_mean(profile_codes * 2 + asleep, systolic, profiles * 2)
+    day_mean, night_mean = means[0::2], means[1::2]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dip = (day_mean - night_mean) / day_mean * 100
+    result['Day_Systolic'] = day_mean
+    result['Night_Systolic'] = night_mean
+    result['Dip_pct'] = dip
+    result['DipPattern'] = [dipping_pattern(value) for value in dip]
+
+    # Morning surge: each morning's mean systolic minus the lowest reading
+    # of the night before it. Night readings before midnight belong to the
+    # next morning's night.
+    result['MorningSurge'] = np.nan
+    result['SurgeDays'] = 0
+    if night >= 0 and MORNING_PERIOD in names:
+        night_start, night_end = minutes_of_day(
+            [bound for name, *bounds in periods if name == NIGHT_PERIOD for bound in bounds])
+        wake_days = days.copy()
+        if night_start > night_end:
+            wake_days += (periods_of == night) & (minutes >= night_start)
+        morning = periods_of == names.index(MORNING_PERIOD)
+        span = int(days.max()) + 2
+        day_codes, day_keys = pd.factorize(profile_codes * span + wake_days)
+        groups = len(day_keys)
+
+        _, morning_mean = _group_mean(day_codes[morning], systolic[morning], groups)
+        trough = np.full(groups, np.inf)
+        is_night = (periods_of == night) & ~np.isnan(systolic)
+        np.minimum.at(trough, day_codes[is_night], systolic[is_night])
+        surge = morning_mean - trough
+        measured = np.isfinite(surge)
+
+        day_profiles = np.asarray(day_keys) // span
+        counts, surge_means = _group_mean(day_profiles[measured], surge[measured], profiles)
+        result['MorningSurge'] = surge_means
+        result['SurgeDays'] = counts
+    return by_period, result
+
+# scope -> (profile versions, periods, (by_period, by_profile))
+_cache = {}
+_cache_lock = threading.Lock()
+
+def get_circadian(scope, versions, load, periods=DAY_PERIODS):
+    """
+    Return circadian_profile() for a set of profiles, cached until one of
+    their data versions changes.
+
+    scope: cache namespace, e.g. the database file and requested profiles
+    versions: {profile_id: data version}
+    load(): returns the readings of those profiles
+    """
+    key = tuple(sorted(versions.items()))
+    with _cache_lock:
+        cached = _cache.get(scope)
+    if cached is not None and cached[0] == key and cached[1] == periods:
+        return cached[2]
+
+    result = circadian_profile(load(), periods)
+    with _cache_lock:
+        _cache[scope] = (key, periods, result)
+    return result
@@ -1,93 +1,930 @@
-import sqlite3
+import csv
+import gzip
+import io
+import json
+import db_pool
 import pandas as pd
 import os
-from datetime import datetime
+import sys
+import threading
+import guidelines
+import rolling_analytics
+import anomaly
+import trends
+import circadian
+from datetime import date as date_type, datetime, timedelta
+from utils import categorize_bp_codes, categorization_key, get_bp_categories
+
+# Parquet exports need pyarrow; the other formats work without it
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    print("pyarrow package not found. Parquet export disabled.")
+    HAS_PYARROW = False
 
 # Database setup
 DB_FILE = "blood_pressure.db"
 
-def setup_database():
+# Optional sharding: with BP_SHARD_BY_USER=1 each user's profiles and
+# readings live in their own file under BP_SHARD_DIR, so households never
+# share a writer lock. Otherwise everything stays in DB_FILE.
+SHARD_BY_USER = os.environ.get("BP_SHARD_BY_USER") == "1"
+SHARD_DIR = os.environ.get("BP_SHARD_DIR", "shards")
+
+# Queries on the page-load path, shared with query_plan_check.py
+READINGS_BY_PROFILE_QUERY = """
+SELECT r.id, r.date, r.time, r.measured_at, r.systolic, r.diastolic, r.heart_rate, r.category,
+       p.id as ProfileId, p.name as Name, p.gender as Gender, p.age as Age
+FROM readings r
+JOIN profiles p ON r.profile_id = p.id
+WHERE r.profile_id = ?
+ORDER BY r.date DESC, r.time DESC
+"""
+
+PROFILE_BY_ID_QUERY = "SELECT id, name, gender, age FROM profiles WHERE id = ?"
+
+PROFILES_BY_USER_QUERY = "SELECT id, name, gender, age FROM profiles WHERE user_id = ? ORDER BY name"
+
+PROFILE_OWNER_QUERY = "SELECT 1 FROM profiles WHERE id = ? AND user_id = ?"
+
+PROFILE_VERSIONS_BY_USER_QUERY = "SELECT id, name, data_version FROM profiles WHERE user_id = ?"
+
+# Restricts readings to the profiles a user owns
+USER_PROFILES_SUBQUERY = "SELECT id FROM profiles WHERE user_id = ?"
+
+DELETE_PROFILE_READINGS_QUERY = "DELETE FROM readings WHERE profile_id = ?"
+
+DELETE_READING_QUERY = "DELETE FROM readings WHERE id = ?"
+
+# Reading columns with profile information, as listed and paged; aliased
+# so ORDER BY can name them whether or not the query is a compound one
+READINGS_LIST_COLUMNS = """r.id AS id, r.date AS date, r.time AS time, r.measured_at, r.systolic, r.diastolic,
+       r.heart_rate, r.category,
+       p.id as ProfileId, p.name as Name, p.gender as Gender, p.age as Age"""
+
+READINGS_PROFILE_JOIN = "JOIN profiles p ON r.profile_id = p.id"
+
+COUNT_READINGS_BY_PROFILE_QUERY = "SELECT COUNT(*) FROM readings WHERE profile_id = ?"
+
+COUNT_READINGS_QUERY = "SELECT COUNT(*) FROM readings"
+
+COUNT_READINGS_BY_USER_QUERY = f"SELECT COUNT(*) FROM readings WHERE profile_id IN ({USER_PROFILES_SUBQUERY})"
+
+# Profiles each user may create
+MAX_PROFILES = 5
+
+DEFAULT_PAGE_SIZE = 50
+
+# App-facing column name -> SQL expression for query_readings()
+READING_COLUMNS = {
+    'Id': 'r.id',
+    'Date': 'r.date',
+    'Time': 'r.time',
+    'MeasuredAt': 'r.measured_at',
+    'ProfileId': 'r.profile_id',
+    'Name': 'p.name',
+    'Gender': 'p.gender',
+    'Age': 'p.age',
+    'Systolic': 'r.systolic',
+    'Diastolic': 'r.diastolic',
+    'HeartRate': 'r.heart_rate',
+    'Category': 'r.category',
+}
+
+# measured_at is derived from the date and time parameters in SQL so new rows
+# and the backfill in backfill_measured_at() always agree
+INSERT_READING_QUERY = """
+INSERT INTO readings 
+(profile_id, date, time, systolic, diastolic, heart_rate, category, measured_at) 
+VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, CAST(strftime('%s', ?2 || ' ' || ?3) AS INTEGER))
+"""
+
+# Rows per committed batch when backfilling readings.measured_at
+MIGRATION_BATCH_SIZE = 1000
+
+# Highest reading id the measured_at backfill has visited. Rows whose date
+# and time cannot be converted stay NULL but are not visited again.
+BACKFILL_PROGRESS_QUERY = "SELECT value FROM db_meta WHERE key = 'measured_at_backfill_id'"
+
+BACKFILL_PENDING_QUERY = "SELECT 1 FROM readings WHERE id > ? AND measured_at IS NULL LIMIT 1"
+
+# Rollup periods and the SQL expression giving each reading's bucket start;
+# weekly buckets start on Monday
+ROLLUP_BUCKETS = {
+    'day': "date",
+    'week': "date(date, 'weekday 0', '-6 days')",
+}
+
+# Vitals aggregated in reading_rollups, as (column prefix, readings column)
+ROLLUP_METRICS = [
+    ('systolic', 'systolic'),
+    ('diastolic', 'diastolic'),
+    ('heart_rate', 'heart_rate'),
+]
+
+# Readings re-scored per committed transaction when recategorizing
+RECATEGORIZE_BATCH_SIZE = 2000
+
+# Next chunk of a profile's readings to re-score, in id order
+RECATEGORIZE_BATCH_QUERY = """
+SELECT id, date, systolic, diastolic, category
+FROM readings
+WHERE profile_id = ? AND id > ?
+ORDER BY id
+LIMIT ?
+"""
+
+# Anomaly metric -> readings column and position in a reading tuple
+ANOMALY_COLUMNS = {
+    'Systolic': ('systolic', 3),
+    'Diastolic': ('diastolic', 4),
+    'HeartRate': ('heart_rate', 5),
+}
+
+ANOMALY_STATE_QUERY = "SELECT metric, n, mean, variance FROM anomaly_state WHERE profile_id = ?"
+
+# Counter bumped by every write to profiles or readings, so callers can
+# tell cheaply whether anything they loaded may be out of date
+WRITE_SEQ_QUERY = "SELECT value FROM db_meta WHERE key = 'write_seq'"
+
+# Rows per executemany() call when bulk importing readings
+BULK_BATCH_SIZE = 500
+
+# Rows fetched per round trip when streaming exports
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_COLUMNS = ['Date', 'Time', 'Systolic', 'Diastolic', 'Heart Rate',
+                  'Category', 'Name', 'Gender', 'Age']
+
+# Rows per Parquet row group; larger groups compress better
+PARQUET_ROW_GROUP_SIZE = 50000
+
+# Export format -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv'),
+    'csv.gz': ('csv.gz', 'application/gzip'),
+    'jsonl': ('jsonl', 'application/x-ndjson'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+# Accepted spellings of each reading field in bulk imports
+READING_FIELD_ALIASES = {
+    'date': ('date', 'Date'),
+    'time': ('time', 'Time'),
+    'systolic': ('systolic', 'Systolic'),
+    'diastolic': ('diastolic', 'Diastolic'),
+    'heart_rate': ('heart_rate', 'HeartRate', 'Heart Rate'),
+    'category': ('category', 'Category'),
+}
+
+# Query name -> (SQL, sample parameters) checked by query_plan_check.py
+HOT_QUERIES = {
+    "readings_by_profile": (READINGS_BY_PROFILE_QUERY, (1,)),
+    "profile_by_id": (PROFILE_BY_ID_QUERY, (1,)),
+    "profiles_by_user": (PROFILES_BY_USER_QUERY, (1,)),
+    "profile_owner": (PROFILE_OWNER_QUERY, (1, 1)),
+    "profile_versions_by_user": (PROFILE_VERSIONS_BY_USER_QUERY, (1,)),
+    "count_readings_by_user": (COUNT_READINGS_BY_USER_QUERY, (1,)),
+    "delete_profile_readings": (DELETE_PROFILE_READINGS_QUERY, (1,)),
+    "delete_reading": (DELETE_READING_QUERY, (1,)),
+    "count_readings_by_profile": (COUNT_READINGS_BY_PROFILE_QUERY, (1,)),
+    "rollups_by_profile": (
+        "SELECT * FROM reading_rollups WHERE profile_id = ? AND period = ? AND bucket_start >= ?",
+        (1, "day", "2024-01-01")),
+    "rollup_summary_by_user": (
+        "SELECT SUM(n) FROM reading_rollups WHERE period = ? AND profile_id IN "
+        f"({USER_PROFILES_SUBQUERY}) AND bucket_start >= ?",
+        ("day", 1, "2024-01-01")),
+    "rollup_window": (
+        "SELECT COUNT(*) FROM readings WHERE profile_id = ? AND date >= ? AND date <= ?",
+        (1, "2024-01-01", "2024-01-07")),
+    "recategorize_batch": (RECATEGORIZE_BATCH_QUERY, (1, 0, RECATEGORIZE_BATCH_SIZE)),
+    "anomaly_state": (ANOMALY_STATE_QUERY, (1,)),
+    "write_seq": (WRITE_SEQ_QUERY, ()),
+    "anomalies_by_profile": (
+        "SELECT reading_id, metric, z FROM reading_anomalies WHERE profile_id = ? ORDER BY reading_id",
+        (1,)),
+    "measured_at_backfill_pending": (BACKFILL_PENDING_QUERY, (0,)),
+    "measured_at_backfill_batch": (
+        "SELECT id FROM readings WHERE id > ? AND measured_at IS NULL ORDER BY id LIMIT ?",
+        (0, MIGRATION_BATCH_SIZE)),
+}
+
+def setup_database(db_file=DB_FILE):
     """Create database tables if they don't exist"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # Create profiles table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS profiles (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            gender TEXT NOT NULL,
-            age INTEGER NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # Create blood pressure readings table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS readings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            profile_id INTEGER NOT NULL,
-            date TEXT NOT NULL,
-            time TEXT NOT NULL,
-            systolic INTEGER NOT NULL,
-            diastolic INTEGER NOT NULL,
-            heart_rate INTEGER,
-            category TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (profile_id) REFERENCES profiles(id) ON DELETE CASCADE
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        with db_pool.connection(db_file) as conn:
+            cursor = conn.cursor()
+            
+            # Create profiles table
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS profiles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                gender TEXT NOT NULL,
+                age INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                user_id INTEGER,
+                data_version INTEGER NOT NULL DEFAULT 0
+            )
+            ''')
+            
+            # Profiles created before per-user scoping have no owner; they
+            # stay visible only to callers that pass no user_id
+            cursor.execute("PRAGMA table_info(profiles)")
+            profile_columns = [column[1] for column in cursor.fetchall()]
+            if 'user_id' not in profile_columns:
+                cursor.execute("ALTER TABLE profiles ADD COLUMN user_id INTEGER")
+            
+            # Bumped whenever a profile's readings change, so derived
+            # results such as trends know when to recompute
+            if 'data_version' not in profile_columns:
+                cursor.execute("ALTER TABLE profiles ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0")
+            
+            # Index a user's profile list in display order
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_profiles_user
+            ON profiles (user_id, name)
+            ''')
+            
+            # Create blood pressure readings table
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS readings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                profile_id INTEGER NOT NULL,
+                date TEXT NOT NULL,
+                time TEXT NOT NULL,
+                systolic INTEGER NOT NULL,
+                diastolic INTEGER NOT NULL,
+                heart_rate INTEGER,
+                category TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                measured_at INTEGER,
+                FOREIGN KEY (profile_id) REFERENCES profiles(id) ON DELETE CASCADE
+            )
+            ''')
+            
+            # Older databases predate measured_at; add it in place. Existing
+            # rows are filled in by backfill_measured_at().
+            cursor.execute("PRAGMA table_info(readings)")
+            if 'measured_at' not in [column[1] for column in cursor.fetchall()]:
+                cursor.execute("ALTER TABLE readings ADD COLUMN measured_at INTEGER")
+
+            # Index the per-profile lookup in the order readings are listed
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_readings_profile_date
+            ON readings (profile_id, date, time)
+            ''')
+
+            # Index time-range filters on the epoch timestamp
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_readings_profile_measured
+            ON readings (profile_id, measured_at)
+            ''')
+
+            # Index a profile's readings in id order for recategorization
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_readings_profile_id
+            ON readings (profile_id, id)
+            ''')
+
+            # Index the all-profiles listing for keyset pagination
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_readings_date
+            ON readings (date, time)
+            ''')
+            
+            # Per-profile daily and weekly rollups. Sums and sums of squares
+            # give mean and standard deviation without touching raw readings.
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reading_rollups'")
+            new_rollups = cursor.fetchone() is None
+            metric_columns = ",\n".join(
+                f"{prefix}_n INTEGER NOT NULL, {prefix}_sum INTEGER, {prefix}_sumsq INTEGER, "
+                f"{prefix}_min INTEGER, {prefix}_max INTEGER"
+                for prefix, _ in ROLLUP_METRICS
+            )
+            cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS reading_rollups (
+                profile_id INTEGER NOT NULL,
+                period TEXT NOT NULL,
+                bucket_start TEXT NOT NULL,
+                n INTEGER NOT NULL,
+                {metric_columns},
+                PRIMARY KEY (profile_id, period, bucket_start)
+            )
+            ''')
+            
+            # Category histogram per rollup bucket
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS reading_rollup_categories (
+                profile_id INTEGER NOT NULL,
+                period TEXT NOT NULL,
+                bucket_start TEXT NOT NULL,
+                category TEXT NOT NULL,
+                n INTEGER NOT NULL,
+                PRIMARY KEY (profile_id, period, bucket_start, category)
+            )
+            ''')
+            
+            # Per-profile anomaly detector state (see anomaly.py), one row
+            # per metric, updated with every saved reading
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS anomaly_state (
+                profile_id INTEGER NOT NULL,
+                metric TEXT NOT NULL,
+                n INTEGER NOT NULL,
+                mean REAL NOT NULL,
+                variance REAL NOT NULL,
+                PRIMARY KEY (profile_id, metric)
+            )
+            ''')
+            
+            # Readings flagged as unusual for their profile
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS reading_anomalies (
+                reading_id INTEGER NOT NULL,
+                profile_id INTEGER NOT NULL,
+                metric TEXT NOT NULL,
+                value REAL NOT NULL,
+                z REAL NOT NULL,
+                PRIMARY KEY (reading_id, metric)
+            )
+            ''')
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_reading_anomalies_profile
+            ON reading_anomalies (profile_id, reading_id)
+            ''')
+            
+            # Pending recategorizations, one per profile. last_id records
+            # progress so an interrupted job resumes where it stopped.
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS recategorization_jobs (
+                profile_id INTEGER PRIMARY KEY,
+                gender TEXT NOT NULL,
+                age INTEGER NOT NULL,
+                last_id INTEGER NOT NULL DEFAULT 0,
+                changed INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
+            
+            # Small key/value store for database-wide state
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS db_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+            ''')
+            _sync_guideline(cursor)
+            
+            # Existing readings need rolling up once when the tables first appear
+            if new_rollups:
+                for period in ROLLUP_BUCKETS:
+                    _refresh_rollup_buckets(cursor, period)
+
+            conn.commit()
         return True
     except Exception as e:
         print(f"Database setup error: {e}")
         return False
 
-# Ensure database is setup
-setup_database()
+def _backfill_progress(cursor):
+    """Highest reading id already visited by backfill_measured_at()"""
+    cursor.execute(BACKFILL_PROGRESS_QUERY)
+    row = cursor.fetchone()
+    return int(row[0]) if row else 0
 
-def create_profile(name, gender, age):
-    """Create a new profile and return the ID"""
+def backfill_measured_at(batch_size=MIGRATION_BATCH_SIZE):
+    """
+    Fill readings.measured_at for rows written before the column existed.
+    
+    Works through the table in id order, one short transaction per batch,
+    so writers are never locked out for long and an interrupted run simply
+    resumes after the last committed batch. The stored date and time are
+    wall-clock values and are converted as if they were UTC, so the epoch
+    maps back to exactly the same date and time. Rows that cannot be
+    converted are left NULL and skipped by later runs.
+    
+    Returns: number of rows updated
+    """
+    updated = 0
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        with db_pool.connection(DB_FILE) as conn:
+            cursor = conn.cursor()
+            last_id = _backfill_progress(cursor)
+            while True:
+                cursor.execute(
+                    "SELECT id FROM readings WHERE id > ? AND measured_at IS NULL ORDER BY id LIMIT ?",
+                    (last_id, batch_size)
+                )
+                ids = [row[0] for row in cursor.fetchall()]
+                if not ids:
+                    break
+                
+                placeholders = ", ".join("?" for _ in ids)
+                cursor.execute(
+                    f"""
+                    UPDATE readings
+                    SET measured_at = CAST(strftime('%s', date || ' ' || time) AS INTEGER)
+                    WHERE id IN ({placeholders})
+                    """,
+                    ids
+                )
+                updated += cursor.rowcount
+                last_id = ids[-1]
+                cursor.execute(
+                    "INSERT OR REPLACE INTO db_meta (key, value) VALUES ('measured_at_backfill_id', ?)",
+                    (last_id,)
+                )
+                # Results cached under the old sequence hold NULL measured_at
+                _bump_write_seq(cursor)
+                conn.commit()
         
-        # Check if maximum profiles (5) reached
-        cursor.execute("SELECT COUNT(*) FROM profiles")
-        count = cursor.fetchone()[0]
+        return updated
+    except Exception as e:
+        print(f"Backfill measured_at error: {e}")
+        return updated
+
+_backfill_thread = None
+
+def start_measured_at_backfill():
+    """Run backfill_measured_at() on a background thread if any rows need it"""
+    global _backfill_thread
+    if _backfill_thread is not None and _backfill_thread.is_alive():
+        return _backfill_thread
+    try:
+        with db_pool.connection(DB_FILE) as conn:
+            cursor = conn.cursor()
+            cursor.execute(BACKFILL_PENDING_QUERY, (_backfill_progress(cursor),))
+            pending = cursor.fetchone() is not None
         
-        if count >= 5:
-            conn.close()
+        if not pending:
             return None
         
-        # Insert new profile
-        cursor.execute(
-            "INSERT INTO profiles (name, gender, age) VALUES (?, ?, ?)",
-            (name, gender, age)
+        _backfill_thread = threading.Thread(target=backfill_measured_at,
+                                            name="measured-at-backfill", daemon=True)
+        _backfill_thread.start()
+        return _backfill_thread
+    except Exception as e:
+        print(f"Start measured_at backfill error: {e}")
+        return None
+
+_ready_shards = set()
+_shards_lock = threading.Lock()
+
+def _db_file(user_id=None):
+    """
+    Return the database file holding a user's data.
+    
+    In sharding mode each user gets their own file, created and set up on
+    first use; otherwise (or without a user) this is DB_FILE.
+    """
+    if not SHARD_BY_USER or user_id is None:
+        return DB_FILE
+    
+    db_file = os.path.join(SHARD_DIR, f"user_{int(user_id)}.db")
+    with _shards_lock:
+        opened = db_file not in _ready_shards
+        if opened:
+            os.makedirs(SHARD_DIR, exist_ok=True)
+            if not setup_database(db_file):
+                raise RuntimeError(f"could not set up shard {db_file}")
+            _ready_shards.add(db_file)
+    
+    # Finish any recategorization interrupted the last time this shard was open
+    if opened:
+        start_recategorization(user_id)
+    return db_file
+
+def _owns_profile(cursor, profile_id, user_id):
+    """Check a profile belongs to a user; any profile passes without a user"""
+    if user_id is None:
+        return True
+    cursor.execute(PROFILE_OWNER_QUERY, (profile_id, user_id))
+    return cursor.fetchone() is not None
+
+def _with_measured_at(df):
+    """Convert measured_at to datetime64, parsing date/time for rows not yet backfilled"""
+    if df.empty or 'measured_at' not in df.columns:
+        return df
+    
+    measured_at = pd.to_datetime(df['measured_at'], unit='s')
+    missing = measured_at.isna()
+    if missing.any():
+        measured_at[missing] = pd.to_datetime(
+            df.loc[missing, 'date'] + ' ' + df.loc[missing, 'time'], errors='coerce'
         )
+    df['measured_at'] = measured_at
+    return df
+
+def _refresh_rollup_buckets(cursor, period, profile_id=None, start=None, end=None):
+    """
+    Recompute rollup rows for one period from the raw readings.
+    
+    Limits the work to one profile and to buckets whose start falls in
+    [start, end] when given; start and end must be bucket-aligned so the
+    readings window and the buckets cover the same days. Runs on the
+    caller's cursor so it commits with the write that triggered it.
+    """
+    reading_clauses, rollup_clauses = [], ["period = ?"]
+    reading_params, rollup_params = [], [period]
+    if profile_id is not None:
+        reading_clauses.append("profile_id = ?")
+        rollup_clauses.append("profile_id = ?")
+        reading_params.append(profile_id)
+        rollup_params.append(profile_id)
+    if start is not None:
+        reading_clauses.append("date >= ?")
+        rollup_clauses.append("bucket_start >= ?")
+        reading_params.append(start)
+        rollup_params.append(start)
+    if end is not None:
+        reading_clauses.append("date <= ?")
+        rollup_clauses.append("bucket_start <= ?")
+        reading_params.append(end if period == 'day' else
+                              (date_type.fromisoformat(end) + timedelta(days=6)).isoformat())
+        rollup_params.append(end)
+    
+    bucket = ROLLUP_BUCKETS[period]
+    # Rows whose date does not parse have no bucket and are left out
+    reading_clauses.append(f"{bucket} IS NOT NULL")
+    reading_where = f"WHERE {' AND '.join(reading_clauses)}"
+    rollup_where = f"WHERE {' AND '.join(rollup_clauses)}"
+    
+    metric_columns = ", ".join(
+        f"{prefix}_n, {prefix}_sum, {prefix}_sumsq, {prefix}_min, {prefix}_max"
+        for prefix, _ in ROLLUP_METRICS
+    )
+    metric_aggregates = ", ".join(
+        f"COUNT({column}), SUM({column}), SUM({column} * {column}), MIN({column}), MAX({column})"
+        for _, column in ROLLUP_METRICS
+    )
+    
+    cursor.execute(f"DELETE FROM reading_rollups {rollup_where}", rollup_params)
+    cursor.execute(
+        f"""
+        INSERT INTO reading_rollups (profile_id, period, bucket_start, n, {metric_columns})
+        SELECT profile_id, ?, {bucket}, COUNT(*), {metric_aggregates}
+        FROM readings
+        {reading_where}
+        GROUP BY profile_id, {bucket}
+        """,
+        [period] + reading_params
+    )
+    
+    cursor.execute(f"DELETE FROM reading_rollup_categories {rollup_where}", rollup_params)
+    cursor.execute(
+        f"""
+        INSERT INTO reading_rollup_categories (profile_id, period, bucket_start, category, n)
+        SELECT profile_id, ?, {bucket}, category, COUNT(*)
+        FROM readings
+        {reading_where}
+        GROUP BY profile_id, {bucket}, category
+        """,
+        [period] + reading_params
+    )
+
+def _update_rollups(cursor, touched):
+    """
+    Refresh the daily and weekly buckets for a set of (profile_id, date)
+    pairs, and bump the data version of each profile touched.
+    """
+    cursor.executemany(
+        "UPDATE profiles SET data_version = data_version + 1 WHERE id = ?",
+        [(profile_id,) for profile_id in {profile_id for profile_id, _ in touched}]
+    )
+    _bump_write_seq(cursor)
+    
+    weeks = set()
+    for profile_id, day in touched:
+        _refresh_rollup_buckets(cursor, 'day', profile_id, day, day)
+        monday = date_type.fromisoformat(day)
+        monday -= timedelta(days=monday.weekday())
+        weeks.add((profile_id, monday.isoformat()))
+    
+    for profile_id, monday in weeks:
+        _refresh_rollup_buckets(cursor, 'week', profile_id, monday, monday)
+
+def _bump_write_seq(cursor):
+    """Advance the database's write sequence inside the caller's transaction"""
+    cursor.execute(
+        "INSERT INTO db_meta (key, value) VALUES ('write_seq', 1) "
+        "ON CONFLICT(key) DO UPDATE SET value = value + 1"
+    )
+
+def get_write_seq(user_id=None):
+    """
+    Return the write sequence of a user's (or DB_FILE's) database.
+    
+    It changes whenever profiles or readings are written, so anything
+    cached under the value it was loaded at is current while it is unchanged.
+    
+    Returns: int, or None on error
+    """
+    try:
+        with db_pool.connection(_db_file(user_id)) as conn:
+            cursor = conn.cursor()
+            cursor.execute(WRITE_SEQ_QUERY)
+            row = cursor.fetchone()
         
-        profile_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        return int(row[0]) if row else 0
+    except Exception as e:
+        print(f"Get write sequence error: {e}")
+        return None
+
+def rebuild_rollups(profile_id=None, user_id=None):
+    """Rebuild the daily and weekly rollups from scratch for one or all profiles"""
+    try:
+        with db_pool.connection(_db_file(user_id)) as conn:
+            cursor = conn.cursor()
+            
+            for period in ROLLUP_BUCKETS:
+                _refresh_rollup_buckets(cursor, period, profile_id)
+            
+            conn.commit()
+        
+        return True
+    except Exception as e:
+        print(f"Rebuild rollups error: {e}")
+        return False
+
+def _sync_guideline(cursor):
+    """
+    Queue recategorization of every profile if the stored categories were
+    computed under a different guideline than the active one.
+    
+    Returns: True if jobs were queued
+    """
+    active = guidelines.get_guideline()["key"]
+    cursor.execute("SELECT value FROM db_meta WHERE key = 'guideline'")
+    row = cursor.fetchone()
+    # Databases from before guideline selection were categorized with the default
+    stored = row[0] if row else guidelines.DEFAULT_GUIDELINE
+    if row is None or stored != active:
+        cursor.execute("INSERT OR REPLACE INTO db_meta (key, value) VALUES ('guideline', ?)",
+                       (active,))
+    if stored == active:
+        return False
+    
+    cursor.execute(
+        "INSERT OR REPLACE INTO recategorization_jobs (profile_id, gender, age) "
+        "SELECT id, gender, age FROM profiles"
+    )
+    return True
+
+def sync_guideline(user_id=None):
+    """Re-score a user's (or DB_FILE's) stored categories after guidelines.set_guideline()"""
+    try:
+        with db_pool.connection(_db_file(user_id)) as conn:
+            cursor = conn.cursor()
+            queued = _sync_guideline(cursor)
+            conn.commit()
+        
+        if queued:
+            start_recategorization(user_id)
+        return queued
+    except Exception as e:
+        print(f"Sync guideline error: {e}")
+        return False
+
+def _queue_recategorization(cursor, profile_id, gender, age):
+    """Create (or restart) the recategorization job for a profile with its new demographics"""
+    cursor.execute(
+        "INSERT OR REPLACE INTO recategorization_jobs (profile_id, gender, age) VALUES (?, ?, ?)",
+        (profile_id, gender, age)
+    )
+
+def queue_recategorization(profile_ids=None, user_id=None):
+    """
+    Queue recategorization of every reading of the given profiles (or all
+    of a user's profiles) and start the background worker.
+    
+    Returns: number of jobs queued
+    """
+    try:
+        with db_pool.connection(_db_file(user_id)) as conn:
+            cursor = conn.cursor()
+            
+            if user_id is None:
+                cursor.execute("SELECT id, name, gender, age FROM profiles")
+            else:
+                cursor.execute(PROFILES_BY_USER_QUERY, (user_id,))
+            profiles = cursor.fetchall()
+            if profile_ids is not None:
+                profile_ids = set(profile_ids)
+                profiles = [profile for profile in profiles if profile[0] in profile_ids]
+            
+            for profile_id, _, gender, age in profiles:
+                _queue_recategorization(cursor, profile_id, gender, age)
+            conn.commit()
+        
+        start_recategorization(user_id)
+        return len(profiles)
+    except Exception as e:
+        print(f"Queue recategorization error: {e}")
+        return 0
+
+def recategorize_profile(profile_id, user_id=None, batch_size=RECATEGORIZE_BATCH_SIZE):
+    """
+    Run (or resume) the pending recategorization job for a profile.
+    
+    Works through the profile's readings in id order, batch_size at a
+    time. Each batch is scored in one vectorized call, only readings whose
+    category changed are written back, and the affected rollups are
+    refreshed. Every batch commits together with the job's progress, so
+    the write lock is held briefly and an interrupted job resumes from the
+    last committed batch. If the profile changes again mid-run, the job
+    restarts with the new demographics.
+    
+    Returns: number of readings whose category changed
+    """
+    try:
+        db_file = _db_file(user_id)
+        with db_pool.connection(db_file) as conn:
+            if not _owns_profile(conn.cursor(), profile_id, user_id):
+                return 0
+        
+        return _recategorize_profile(db_file, profile_id, batch_size)
+    except Exception as e:
+        print(f"Recategorize profile error: {e}")
+        return 0
+
+def _recategorize_profile(db_file, profile_id, batch_size=RECATEGORIZE_BATCH_SIZE):
+    """recategorize_profile() against a given database file, without the ownership check"""
+    changed = 0
+    try:
+        with db_pool.connection(db_file) as conn:
+            cursor = conn.cursor()
+            while True:
+                # Take the write lock up front so the job row cannot change
+                # between reading it and recording progress
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(
+                    "SELECT gender, age, last_id FROM recategorization_jobs WHERE profile_id = ?",
+                    (profile_id,)
+                )
+                job = cursor.fetchone()
+                if job is None:
+                    conn.commit()
+                    break
+                gender, age, last_id = job
+                
+                cursor.execute(RECATEGORIZE_BATCH_QUERY, (profile_id, last_id, batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    cursor.execute("DELETE FROM recategorization_jobs WHERE profile_id = ?", (profile_id,))
+                    conn.commit()
+                    break
+                
+                ids, dates, systolic, diastolic, categories = zip(*rows)
+                codes = categorize_bp_codes(systolic, diastolic, gender, age)
+                names = get_bp_categories()
+                updates = []
+                touched = set()
+                for reading_id, date, code, old in zip(ids, dates, codes, categories):
+                    category = names[code]
+                    if category != old:
+                        updates.append((category, reading_id))
+                        touched.add((profile_id, date))
+                
+                if updates:
+                    cursor.executemany("UPDATE readings SET category = ? WHERE id = ?", updates)
+                    _update_rollups(cursor, touched)
+                cursor.execute(
+                    "UPDATE recategorization_jobs SET last_id = ?, changed = changed + ? WHERE profile_id = ?",
+                    (ids[-1], len(updates), profile_id)
+                )
+                conn.commit()
+                changed += len(updates)
+        
+        return changed
+    except Exception as e:
+        print(f"Recategorize profile error: {e}")
+        return changed
+
+def resume_recategorization(user_id=None):
+    """Run every pending recategorization job in a user's database (or DB_FILE)"""
+    changed = 0
+    try:
+        db_file = _db_file(user_id)
+        with db_pool.connection(db_file) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT profile_id FROM recategorization_jobs ORDER BY created_at")
+            profile_ids = [row[0] for row in cursor.fetchall()]
+        
+        # Jobs were only queued for profiles the caller could update, so
+        # they run without the ownership check, in the file that holds them
+        for profile_id in profile_ids:
+            changed += _recategorize_profile(db_file, profile_id)
+        
+        return changed
+    except Exception as e:
+        print(f"Resume recategorization error: {e}")
+        return changed
+
+_recategorize_threads = {}
+_recategorize_requested = set()
+_recategorize_lock = threading.Lock()
+
+def _recategorize_worker(db_file, user_id):
+    """Keep running pending jobs until no new request has arrived"""
+    while True:
+        with _recategorize_lock:
+            if db_file not in _recategorize_requested:
+                _recategorize_threads.pop(db_file, None)
+                return
+            _recategorize_requested.discard(db_file)
+        resume_recategorization(user_id)
+
+def start_recategorization(user_id=None):
+    """Run pending recategorization jobs on a background thread, one per database file"""
+    try:
+        db_file = _db_file(user_id)
+        with _recategorize_lock:
+            # A running worker sees the request and makes another pass
+            _recategorize_requested.add(db_file)
+            thread = _recategorize_threads.get(db_file)
+            if thread is None or not thread.is_alive():
+                thread = threading.Thread(target=_recategorize_worker, args=(db_file, user_id),
+                                          name="recategorize", daemon=True)
+                _recategorize_threads[db_file] = thread
+                thread.start()
+        return thread
+    except Exception as e:
+        print(f"Start recategorization error: {e}")
+        return None
+
+# Ensure database is setup
+setup_database()
+start_measured_at_backfill()
+start_recategorization()
+
+def create_profile(name, gender, age, user_id=None):
+    """Create a new profile owned by user_id and return the ID"""
+    try:
+        with db_pool.connection(_db_file(user_id)) as conn:
+            cursor = conn.cursor()
+            
+            # Check if the owner already has the maximum number of profiles
+            cursor.execute("SELECT COUNT(*) FROM profiles WHERE user_id IS ?", (user_id,))
+            count = cursor.fetchone()[0]
+            
+            if count >= MAX_PROFILES:
+                return None
+            
+            # Insert new profile
+            cursor.execute(
+                "INSERT INTO profiles (name, gender, age, user_id) VALUES (?, ?, ?, ?)",
+                (name, gender, age, user_id)
+            )
+            
+            profile_id = cursor.lastrowid
+            _bump_write_seq(cursor)
+            conn.commit()
         
         return profile_id
     except Exception as e:
         print(f"Create profile error: {e}")
         return None
 
-def get_profiles():
-    """Get all profiles from the database"""
+def claim_unowned_profiles(user_id):
+    """
+    Give every profile without an owner to user_id.
+    
+    Profiles created before per-user scoping are invisible to logged-in
+    users until claimed. The app claims them on login when only one
+    account exists; other installs run `python database.py
+    claim-profiles <user_id>`. Only DB_FILE is touched, so legacy data
+    is not moved into shards.
+    
+    Returns: number of profiles claimed
+    """
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id, name, gender, age FROM profiles ORDER BY name")
-        profiles = cursor.fetchall()
+        with db_pool.connection(DB_FILE) as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE profiles SET user_id = ? WHERE user_id IS NULL", (user_id,))
+            claimed = cursor.rowcount
+            _bump_write_seq(cursor)
+            conn.commit()
         
-        conn.close()
+        return claimed
+    except Exception as e:
+        print(f"Claim unowned profiles error: {e}")
+        return 0
+
+def get_profiles(user_id=None):
+    """Get the profiles owned by a user, or all profiles without a user"""
+    try:
+        with db_pool.connection(_db_file(user_id)) as conn:
+            cursor = conn.cursor()
+            
+            if user_id is None:
+                cursor.execute("SELECT id, name, gender, age FROM profiles ORDER BY name")
+            else:
+                cursor.execute(PROFILES_BY_USER_QUERY, (user_id,))
+            profiles = cursor.fetchall()
         
         # Convert to list of dictionaries
         result = []
@@ -104,19 +941,16 @@ def get_profiles():
         print(f"Get profiles error: {e}")
         return []
 
-def get_profile_by_id(profile_id):
-    """Get a specific profile by ID"""
+def get_profile_by_id(profile_id, user_id=None):
+    """Get a specific profile by ID, if user_id owns it"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT id, name, gender, age FROM profiles WHERE id = ?",
-            (profile_id,)
-        )
-        profile = cursor.fetchone()
-        
-        conn.close()
+        with db_pool.connection(_db_file(user_id)) as conn:
+            cursor = conn.cursor()
+            
+            if not _owns_profile(cursor, profile_id, user_id):
+                return None
+            cursor.execute(PROFILE_BY_ID_QUERY, (profile_id,))
+            profile = cursor.fetchone()
         
         if profile:
             return {
@@ -131,165 +965,1222 @@ def get_profile_by_id(profile_id):
         print(f"Get profile by ID error: {e}")
         return None
 
-def update_profile(profile_id, name, gender, age):
+def update_profile(profile_id, name, gender, age, user_id=None):
     """Update an existing profile"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "UPDATE profiles SET name = ?, gender = ?, age = ? WHERE id = ?",
-            (name, gender, age, profile_id)
-        )
-        
-        conn.commit()
-        conn.close()
+        with db_pool.connection(_db_file(user_id)) as conn:
+            cursor = conn.cursor()
+            
+            if not _owns_profile(cursor, profile_id, user_id):
+                return False
+            cursor.execute(PROFILE_BY_ID_QUERY, (profile_id,))
+            old = cursor.fetchone()
+            
+            cursor.execute(
+                "UPDATE profiles SET name = ?, gender = ?, age = ? WHERE id = ?",
+                (name, gender, age, profile_id)
+            )
+            
+            # Stored categories were computed from the old demographics;
+            # re-score them if the change moves the profile to another
+            # gender adjustment or age bracket
+            recategorize = (old is not None and
+                            categorization_key(old[2], old[3]) != categorization_key(gender, age))
+            if recategorize:
+                _queue_recategorization(cursor, profile_id, gender, age)
+            _bump_write_seq(cursor)
+            
+            conn.commit()
         
+        if recategorize:
+            start_recategorization(user_id)
         return True
     except Exception as e:
         print(f"Update profile error: {e}")
         return False
 
-def delete_profile(profile_id):
+def delete_profile(profile_id, user_id=None):
     """Delete a profile and all associated readings"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # Delete associated readings first
-        cursor.execute("DELETE FROM readings WHERE profile_id = ?", (profile_id,))
-        
-        # Then delete the profile
-        cursor.execute("DELETE FROM profiles WHERE id = ?", (profile_id,))
-        
-        conn.commit()
-        conn.close()
+        with db_pool.connection(_db_file(user_id)) as conn:
+            cursor = conn.cursor()
+            
+            if not _owns_profile(cursor, profile_id, user_id):
+                return False
+            
+            # Delete associated readings and their rollups first
+            cursor.execute(DELETE_PROFILE_READINGS_QUERY, (profile_id,))
+            cursor.execute("DELETE FROM reading_rollups WHERE profile_id = ?", (profile_id,))
+            cursor.execute("DELETE FROM reading_rollup_categories WHERE profile_id = ?", (profile_id,))
+            cursor.execute("DELETE FROM recategorization_jobs WHERE profile_id = ?", (profile_id,))
+            cursor.execute("DELETE FROM anomaly_state WHERE profile_id = ?", (profile_id,))
+            cursor.execute("DELETE FROM reading_anomalies WHERE profile_id = ?", (profile_id,))
+            
+            # Then delete the profile
+            cursor.execute("DELETE FROM profiles WHERE id = ?", (profile_id,))
+            _bump_write_seq(cursor)
+            
+            conn.commit()
         
+        rolling_analytics.invalidate(_analytics_key(user_id, profile_id))
         return True
     except Exception as e:
         print(f"Delete profile error: {e}")
         return False
 
-def save_reading(profile_id, date, time, systolic, diastolic, heart_rate, category):
+def save_reading(profile_id, date, time, systolic, diastolic, heart_rate, category,
+                 user_id=None):
     """Save a new blood pressure reading"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # Convert date to string format if it's a datetime object
-        if isinstance(date, datetime):
-            date = date.strftime('%Y-%m-%d')
-        
-        cursor.execute(
-            """
-            INSERT INTO readings 
-            (profile_id, date, time, systolic, diastolic, heart_rate, category) 
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (profile_id, date, time, systolic, diastolic, heart_rate, category)
-        )
-        
-        conn.commit()
-        conn.close()
+        with db_pool.connection(_db_file(user_id)) as conn:
+            cursor = conn.cursor()
+            
+            if not _owns_profile(cursor, profile_id, user_id):
+                return False
+            
+            rows = _insert_readings(cursor, [
+                (profile_id, date, time, systolic, diastolic, heart_rate, category)
+            ])
+            
+            conn.commit()
         
+        _observe_readings(user_id, rows)
         return True
     except Exception as e:
         print(f"Save reading error: {e}")
         return False
 
-def get_readings_by_profile(profile_id):
-    """Get all readings for a specific profile"""
+def _insert_readings(cursor, readings):
+    """Insert reading tuples in order, refresh the rollups they touch and score them for anomalies"""
+    rows = []
+    for reading in readings:
+        # Convert date to string format if it's a date or datetime object
+        if isinstance(reading[1], date_type):
+            reading = (reading[0], reading[1].strftime('%Y-%m-%d')) + tuple(reading[2:])
+        rows.append(tuple(reading))
+    
+    # Detector state as it was before these readings
+    states = {profile_id: _load_anomaly_state(cursor, profile_id)
+              for profile_id in {row[0] for row in rows}}
+    
+    reading_ids = []
+    for row in rows:
+        cursor.execute(INSERT_READING_QUERY, row)
+        reading_ids.append(cursor.lastrowid)
+    _update_rollups(cursor, {(row[0], row[1]) for row in rows})
+    _score_readings(cursor, states, zip(reading_ids, rows))
+    return rows
+
+def _load_anomaly_state(cursor, profile_id):
+    """
+    Get a profile's anomaly detector state as {metric: (n, mean, variance)}.
+    
+    Profiles with readings from before anomaly detection get their state
+    built from history once, in batch mode.
+    """
+    cursor.execute(ANOMALY_STATE_QUERY, (profile_id,))
+    states = {metric: (n, mean, variance) for metric, n, mean, variance in cursor.fetchall()}
+    if not states:
+        states = _rebuild_anomalies(cursor, profile_id)
+    return states
+
+def _save_anomaly_state(cursor, profile_id, states):
+    """Write a profile's detector state, one row per metric"""
+    cursor.executemany(
+        "INSERT OR REPLACE INTO anomaly_state (profile_id, metric, n, mean, variance) "
+        "VALUES (?, ?, ?, ?, ?)",
+        [(profile_id, metric, int(n), float(mean), float(variance))
+         for metric, (n, mean, variance) in states.items()]
+    )
+
+def _score_readings(cursor, states, inserted):
+    """Score newly inserted (reading_id, row) pairs in order, O(1) each, and record anomalies"""
+    flagged = []
+    for reading_id, row in inserted:
+        profile_id = row[0]
+        profile_states = states[profile_id]
+        for metric, (_, position) in ANOMALY_COLUMNS.items():
+            value = row[position]
+            z, profile_states[metric] = anomaly.update(
+                profile_states.get(metric, anomaly.EMPTY_STATE), value)
+            if anomaly.is_anomaly(z):
+                flagged.append((reading_id, profile_id, metric, float(value), float(z)))
+    
+    for profile_id, profile_states in states.items():
+        _save_anomaly_state(cursor, profile_id, profile_states)
+    if flagged:
+        cursor.executemany(
+            "INSERT OR REPLACE INTO reading_anomalies (reading_id, profile_id, metric, value, z) "
+            "VALUES (?, ?, ?, ?, ?)",
+            flagged
+        )
+
+def _rebuild_anomalies(cursor, profile_id):
+    """Re-score a profile's whole history vectorized, replacing its state and anomalies"""
+    select = ", ".join(f"{column} AS {metric}" for metric, (column, _) in ANOMALY_COLUMNS.items())
+    history = pd.read_sql_query(
+        f"SELECT id, date AS Date, time AS Time, {select} FROM readings WHERE profile_id = ?",
+        cursor.connection, params=(profile_id,)
+    )
+    scored, states = anomaly.score_history(history)
+    
+    cursor.execute("DELETE FROM reading_anomalies WHERE profile_id = ?", (profile_id,))
+    flagged = []
+    for metric in ANOMALY_COLUMNS:
+        z = scored[f'{metric}_z']
+        hits = scored[z.abs() > anomaly.CONTROL_LIMIT]
+        flagged.extend(zip(hits['id'].astype(int).tolist(), [profile_id] * len(hits),
+                           [metric] * len(hits), hits[metric].astype(float).tolist(),
+                           hits[f'{metric}_z'].astype(float).tolist()))
+    if flagged:
+        cursor.executemany(
+            "INSERT INTO reading_anomalies (reading_id, profile_id, metric, value, z) "
+            "VALUES (?, ?, ?, ?, ?)",
+            flagged
+        )
+    
+    _save_anomaly_state(cursor, profile_id, states)
+    return states
+
+def rebuild_anomalies(profile_id, user_id=None):
+    """
+    Batch mode: re-score every reading of a profile in time order.
+    
+    Saved readings are scored in arrival order; this recomputes the
+    detector state and flags as if the history had arrived in date order.
+    
+    Returns: number of anomalies flagged, or None on error
+    """
     try:
-        conn = sqlite3.connect(DB_FILE)
+        with db_pool.connection(_db_file(user_id)) as conn:
+            cursor = conn.cursor()
+            if not _owns_profile(cursor, profile_id, user_id):
+                return None
+            
+            _rebuild_anomalies(cursor, profile_id)
+            cursor.execute("SELECT COUNT(*) FROM reading_anomalies WHERE profile_id = ?", (profile_id,))
+            count = cursor.fetchone()[0]
+            conn.commit()
         
-        # Join with profiles table to get profile information
-        query = """
-        SELECT r.id, r.date, r.time, r.systolic, r.diastolic, r.heart_rate, r.category,
-               p.id as ProfileId, p.name as Name, p.gender as Gender, p.age as Age
-        FROM readings r
-        JOIN profiles p ON r.profile_id = p.id
-        WHERE r.profile_id = ?
+        return count
+    except Exception as e:
+        print(f"Rebuild anomalies error: {e}")
+        return None
+
+def get_anomalies(profile_ids=None, start_date=None, end_date=None, user_id=None):
+    """
+    Get readings flagged as unusual for their profile.
+    
+    Returns: DataFrame with Id, Date, Time, ProfileId, Name, Metric,
+    Value and Z (the reading's distance from the profile's weighted mean
+    in standard deviations), newest first
+    """
+    try:
+        where, params = _reading_filters(profile_ids, start_date, end_date, user_id)
+        query = f"""
+        SELECT r.id AS Id, r.date AS Date, r.time AS Time, r.profile_id AS ProfileId,
+               p.name AS Name, a.metric AS Metric, a.value AS Value, a.z AS Z
+        FROM reading_anomalies a
+        JOIN readings r ON r.id = a.reading_id
+        JOIN profiles p ON p.id = r.profile_id
+        {where}
         ORDER BY r.date DESC, r.time DESC
         """
         
-        df = pd.read_sql_query(query, conn, params=(profile_id,))
+        with db_pool.connection(_db_file(user_id)) as conn:
+            return pd.read_sql_query(query, conn, params=params)
+    except Exception as e:
+        print(f"Get anomalies error: {e}")
+        return pd.DataFrame()
+
+def _analytics_key(user_id, profile_id):
+    """Key of a profile's rolling analytics state; ids are only unique per database file"""
+    return (_db_file(user_id), profile_id)
+
+def _observe_readings(user_id, rows):
+    """
+    Fold committed reading tuples into the rolling analytics, in order.
+    
+    The readings are already saved, so a failure here must not fail the
+    save: the profile's state is dropped instead and rebuilt from the
+    database on the next request.
+    """
+    for profile_id, date, time, systolic, diastolic, heart_rate, _ in rows:
+        key = _analytics_key(user_id, profile_id)
+        try:
+            rolling_analytics.observe(
+                key, date, time,
+                {'Systolic': systolic, 'Diastolic': diastolic, 'HeartRate': heart_rate}
+            )
+        except Exception as e:
+            print(f"Observe reading error: {e}")
+            rolling_analytics.invalidate(key)
+
+def get_rolling_analytics(profile_id, user_id=None):
+    """
+    Get moving averages, variability and morning vs evening comparisons
+    for a profile (see rolling_analytics.py).
+    
+    The state is built from the profile's history on first use and then
+    kept up to date as readings are saved, so later calls do not rescan.
+    
+    Returns: dict of per-metric summaries, or None if not found
+    """
+    try:
+        with db_pool.connection(_db_file(user_id)) as conn:
+            if not _owns_profile(conn.cursor(), profile_id, user_id):
+                return None
         
-        conn.close()
+        return rolling_analytics.get_summary(
+            _analytics_key(user_id, profile_id),
+            lambda: query_readings([profile_id], columns=['Date', 'Time', 'Systolic',
+                                                          'Diastolic', 'HeartRate'],
+                                   ascending=True, user_id=user_id)
+        )
+    except Exception as e:
+        print(f"Get rolling analytics error: {e}")
+        return None
+
+def _profile_versions(profile_ids=None, user_id=None):
+    """Return ({profile_id: data_version}, {profile_id: name}) for the requested profiles"""
+    with db_pool.connection(_db_file(user_id)) as conn:
+        cursor = conn.cursor()
+        if user_id is None:
+            cursor.execute("SELECT id, name, data_version FROM profiles")
+        else:
+            cursor.execute(PROFILE_VERSIONS_BY_USER_QUERY, (user_id,))
+        profiles = cursor.fetchall()
+    
+    if profile_ids is not None:
+        wanted = set(profile_ids)
+        profiles = [profile for profile in profiles if profile[0] in wanted]
+    return ({profile_id: version for profile_id, _, version in profiles},
+            {profile_id: name for profile_id, name, _ in profiles})
+
+def get_trends(profile_ids=None, robust=True, user_id=None):
+    """
+    Get per-profile trend slopes and 7/30-day forecasts (see trends.py).
+    
+    All profiles are fitted together in one vectorized pass. Results are
+    cached per profile data version, so only profiles whose readings
+    changed since the last call are reloaded and refitted.
+    
+    Returns: DataFrame with one row per profile that has readings, joined
+    with the profile's Name
+    """
+    try:
+        versions, names = _profile_versions(profile_ids, user_id)
         
-        return df
+        result = trends.get_trends(
+            _db_file(user_id), versions,
+            lambda stale: query_readings(stale, columns=['ProfileId', 'Date', 'MeasuredAt',
+                                                         'Systolic', 'Diastolic'],
+                                         ascending=True, user_id=user_id),
+            robust=robust
+        )
+        if not result.empty:
+            result.insert(1, 'Name', result['ProfileId'].map(names))
+        return result
     except Exception as e:
-        print(f"Get readings by profile error: {e}")
+        print(f"Get trends error: {e}")
         return pd.DataFrame()
 
-def get_all_readings():
-    """Get all blood pressure readings with profile information"""
+def get_circadian(profile_ids=None, periods=circadian.DAY_PERIODS, user_id=None):
+    """
+    Get time-of-day aggregates, nocturnal dipping and morning surge (see
+    circadian.py).
+    
+    The result is cached until a data version of one of the profiles
+    changes, so repeated page loads do not rescan the readings.
+    
+    Returns: (DataFrame per profile and period, DataFrame per profile),
+    both with the profile's Name
+    """
     try:
-        conn = sqlite3.connect(DB_FILE)
+        versions, names = _profile_versions(profile_ids, user_id)
         
-        # Join with profiles table to get profile information
-        query = """
-        SELECT r.id, r.date, r.time, r.systolic, r.diastolic, r.heart_rate, r.category,
-               p.id as ProfileId, p.name as Name, p.gender as Gender, p.age as Age
-        FROM readings r
-        JOIN profiles p ON r.profile_id = p.id
-        ORDER BY r.date DESC, r.time DESC
-        """
+        by_period, by_profile = circadian.get_circadian(
+            (_db_file(user_id), tuple(sorted(versions))), versions,
+            lambda: query_readings(list(versions), columns=['ProfileId', 'Date', 'Time', 'MeasuredAt',
+                                                            'Systolic', 'Diastolic', 'HeartRate'],
+                                   user_id=user_id) if versions else pd.DataFrame(),
+            periods=periods
+        )
+        by_period = by_period.copy()
+        by_profile = by_profile.copy()
+        by_period.insert(1, 'Name', by_period['ProfileId'].map(names))
+        by_profile.insert(1, 'Name', by_profile['ProfileId'].map(names))
+        return by_period, by_profile
+    except Exception as e:
+        print(f"Get circadian error: {e}")
+        return pd.DataFrame(), pd.DataFrame()
+
+def save_readings(readings, user_id=None):
+    """
+    Save readings for any of a user's profiles in one transaction.
+    
+    readings: (profile_id, date, time, systolic, diastolic, heart_rate,
+    category) tuples, inserted in the given order. Readings for profiles
+    the user does not own are skipped and reported.
+    
+    Returns: dict with success, inserted count and per-reading errors
+    """
+    errors = []
+    try:
+        with db_pool.connection(_db_file(user_id)) as conn:
+            cursor = conn.cursor()
+            
+            owned = {}
+            accepted = []
+            for index, reading in enumerate(readings):
+                profile_id = reading[0]
+                if profile_id not in owned:
+                    owned[profile_id] = _owns_profile(cursor, profile_id, user_id)
+                if owned[profile_id]:
+                    accepted.append(reading)
+                else:
+                    errors.append({"row": index, "message": "Profile not found"})
+            
+            rows = _insert_readings(cursor, accepted) if accepted else []
+            conn.commit()
         
-        df = pd.read_sql_query(query, conn)
+        _observe_readings(user_id, rows)
+        return {"success": True, "inserted": len(accepted), "errors": errors}
+    except Exception as e:
+        print(f"Save readings error: {e}")
+        return {"success": False, "inserted": 0, "errors": errors,
+                "message": f"Saving readings failed: {str(e)}"}
+
+def _iter_reading_rows(rows):
+    """Yield reading rows from an iterable, a DataFrame or a CSV file path"""
+    if isinstance(rows, (str, os.PathLike)):
+        with open(rows, newline='') as f:
+            yield from csv.DictReader(f)
+    elif isinstance(rows, pd.DataFrame):
+        for row in rows.to_dict('records'):
+            yield row
+    else:
+        yield from rows
+
+def _whole_number(value, field):
+    """
+    Convert an import value to int. Accepts "60" and the "60.0" that
+    pandas writes for a column with missing values; rejects fractions,
+    NaN and infinity.
+    """
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid {field} {value!r}, expected a whole number")
+    if not number.is_integer():
+        raise ValueError(f"invalid {field} {value!r}, expected a whole number")
+    return int(number)
+
+def _normalize_reading_row(row):
+    """
+    Convert one import row into (date, time, systolic, diastolic, heart_rate, category).
+    
+    Rows may be dicts keyed by any name in READING_FIELD_ALIASES, or
+    sequences in that field order. category may be missing or empty.
+    """
+    if isinstance(row, dict):
+        values = {}
+        for field, aliases in READING_FIELD_ALIASES.items():
+            values[field] = next((row[a] for a in aliases if a in row), None)
+    else:
+        row = tuple(row)
+        if len(row) < 4:
+            raise ValueError("expected at least date, time, systolic and diastolic")
+        fields = list(READING_FIELD_ALIASES)
+        values = dict(zip(fields, row + (None,) * (len(fields) - len(row))))
+
+    date, time = values['date'], values['time']
+    if not date or not time:
+        raise ValueError("date and time are required")
+    if isinstance(date, date_type):
+        date = date.strftime('%Y-%m-%d')
+    else:
+        # Stored dates must be ISO so they sort and roll up correctly
+        date = date_type.fromisoformat(str(date)).isoformat()
+    if isinstance(time, str):
+        # Stored times must be zero-padded HH:MM so they sort and convert to
+        # measured_at; H:MM is accepted and padded
+        try:
+            time = datetime.strptime(time.strip(), '%H:%M').strftime('%H:%M')
+        except ValueError:
+            raise ValueError(f"invalid time {time!r}, expected HH:MM")
+    else:
+        time = time.strftime('%H:%M')
+
+    systolic = _whole_number(values['systolic'], 'systolic')
+    diastolic = _whole_number(values['diastolic'], 'diastolic')
+
+    # Blank CSV cells and NaN from DataFrames both mean "no heart rate"
+    heart_rate = values['heart_rate']
+    if heart_rate in ('', None) or pd.isna(heart_rate):
+        heart_rate = None
+    else:
+        heart_rate = _whole_number(heart_rate, 'heart_rate')
+
+    category = values['category'] or None
+    if category is not None and pd.isna(category):
+        category = None
+
+    return date, time, systolic, diastolic, heart_rate, category
+
+def _with_categories(batch, gender, age):
+    """Fill in missing categories for a batch of reading tuples in one vectorized call"""
+    missing = [i for i, row in enumerate(batch) if row[6] is None]
+    if not missing:
+        return batch
+    
+    codes = categorize_bp_codes([batch[i][3] for i in missing],
+                                [batch[i][4] for i in missing], gender, age)
+    names = get_bp_categories()
+    for i, code in zip(missing, codes):
+        batch[i] = batch[i][:6] + (names[code],)
+    return batch
+
+def save_readings_bulk(profile_id, rows, batch_size=BULK_BATCH_SIZE, user_id=None):
+    """
+    Import many readings for one profile in a single transaction.
+    
+    rows: iterable of dicts or tuples, a DataFrame, or a CSV file path.
+    Readings without a category are categorized from the profile's gender
+    and age. Invalid rows are skipped and reported; the rest are inserted
+    with executemany() in batches of batch_size and committed once.
+    
+    Returns: dict with success, inserted count and per-row errors
+    """
+    errors = []
+    inserted = 0
+    try:
+        with db_pool.connection(_db_file(user_id)) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(PROFILE_BY_ID_QUERY, (profile_id,))
+            profile = cursor.fetchone()
+            if not profile or not _owns_profile(cursor, profile_id, user_id):
+                return {"success": False, "inserted": 0, "errors": [],
+                        "message": "Profile not found"}
+            gender, age = profile[2], profile[3]
+            
+            batch = []
+            touched = set()
+            for index, row in enumerate(_iter_reading_rows(rows)):
+                try:
+                    date, time, systolic, diastolic, heart_rate, category = _normalize_reading_row(row)
+                except (ValueError, TypeError, AttributeError) as e:
+                    errors.append({"row": index, "message": str(e)})
+                    continue
+                
+                batch.append((profile_id, date, time, systolic, diastolic, heart_rate, category))
+                touched.add((profile_id, date))
+                
+                if len(batch) >= batch_size:
+                    cursor.executemany(INSERT_READING_QUERY, _with_categories(batch, gender, age))
+                    inserted += len(batch)
+                    batch = []
+            
+            if batch:
+                cursor.executemany(INSERT_READING_QUERY, _with_categories(batch, gender, age))
+                inserted += len(batch)
+            
+            # One refresh per touched day and week rather than per row
+            _update_rollups(cursor, touched)
+            # Imports are usually backdated, so re-score the history in
+            # date order rather than scoring rows as they arrive
+            _rebuild_anomalies(cursor, profile_id)
+            
+            conn.commit()
         
-        conn.close()
+        # Imports are usually backdated, so rebuild the rolling analytics
+        # from history rather than folding them in
+        rolling_analytics.invalidate(_analytics_key(user_id, profile_id))
+        return {"success": True, "inserted": inserted, "errors": errors}
+    except Exception as e:
+        print(f"Bulk save readings error: {e}")
+        return {"success": False, "inserted": 0, "errors": errors,
+                "message": f"Bulk import failed: {str(e)}"}
+
+def get_readings_by_profile(profile_id, user_id=None):
+    """Get all readings for a specific profile"""
+    try:
+        with db_pool.connection(_db_file(user_id)) as conn:
+            if not _owns_profile(conn.cursor(), profile_id, user_id):
+                return pd.DataFrame()
+            # Join with profiles table to get profile information
+            df = pd.read_sql_query(READINGS_BY_PROFILE_QUERY, conn, params=(profile_id,))
         
-        return df
+        return _with_measured_at(df)
+    except Exception as e:
+        print(f"Get readings by profile error: {e}")
+        return pd.DataFrame()
+
+def get_all_readings(user_id=None):
+    """Get all blood pressure readings of a user's profiles (or every profile) with profile information"""
+    try:
+        with db_pool.connection(_db_file(user_id)) as conn:
+            # Join with profiles table to get profile information
+            query, params = _merged_readings_query(
+                READINGS_LIST_COLUMNS, _profile_scope(conn.cursor(), user_id=user_id),
+                order="date DESC, time DESC", join=READINGS_PROFILE_JOIN
+            )
+            df = pd.read_sql_query(query, conn, params=params)
+        
+        return _with_measured_at(df)
     except Exception as e:
         print(f"Get all readings error: {e}")
         return pd.DataFrame()
 
-def delete_reading(reading_id):
-    """Delete a specific reading"""
+def get_readings_page(profile_id=None, page_size=DEFAULT_PAGE_SIZE, cursor=None,
+                      direction="next", start_date=None, end_date=None, user_id=None):
+    """
+    Get one page of readings, newest first, using a keyset cursor.
+    
+    cursor is the (date, time, id) of the boundary row from a previous
+    page: direction="next" returns older readings after it and
+    direction="prev" returns newer readings before it. Without a cursor
+    the newest page is returned. start_date and end_date optionally
+    restrict the readings to an inclusive date range, and user_id to the
+    profiles that user owns.
+    
+    Returns: dict with rows (DataFrame), next_cursor and prev_cursor;
+    a cursor is None when there is no page in that direction
+    """
+    empty = {"rows": pd.DataFrame(), "next_cursor": None, "prev_cursor": None}
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        backwards = direction == "prev" and cursor is not None
+        
+        with db_pool.connection(_db_file(user_id)) as conn:
+            scope = _profile_scope(conn.cursor(),
+                                   [profile_id] if profile_id is not None else None, user_id)
+            query, params = _readings_page_query(scope, page_size, cursor, backwards,
+                                                 start_date, end_date)
+            df = pd.read_sql_query(query, conn, params=params)
         
-        cursor.execute("DELETE FROM readings WHERE id = ?", (reading_id,))
+        has_more = len(df) > page_size
+        df = df.iloc[:page_size]
+        if backwards:
+            df = df.iloc[::-1]
+        df = df.reset_index(drop=True)
         
-        conn.commit()
-        conn.close()
+        if df.empty:
+            return empty
+        df = _with_measured_at(df)
+        
+        # Plain Python values, since sqlite3 would bind numpy ints as blobs
+        first = (df.at[0, 'date'], df.at[0, 'time'], int(df.at[0, 'id']))
+        last = (df.at[len(df) - 1, 'date'], df.at[len(df) - 1, 'time'], int(df.at[len(df) - 1, 'id']))
+        if backwards:
+            next_cursor, prev_cursor = last, first if has_more else None
+        else:
+            next_cursor, prev_cursor = last if has_more else None, first if cursor is not None else None
         
+        return {"rows": df, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+    except Exception as e:
+        print(f"Get readings page error: {e}")
+        return empty
+
+def count_readings(profile_id=None, user_id=None):
+    """Count readings for a profile (or all of a user's profiles) from the index"""
+    try:
+        with db_pool.connection(_db_file(user_id)) as conn:
+            cursor = conn.cursor()
+            
+            if profile_id is not None:
+                if not _owns_profile(cursor, profile_id, user_id):
+                    return 0
+                cursor.execute(COUNT_READINGS_BY_PROFILE_QUERY, (profile_id,))
+            elif user_id is not None:
+                cursor.execute(COUNT_READINGS_BY_USER_QUERY, (user_id,))
+            else:
+                cursor.execute(COUNT_READINGS_QUERY)
+            count = cursor.fetchone()[0]
+        
+        return count
+    except Exception as e:
+        print(f"Count readings error: {e}")
+        return 0
+
+def delete_reading(reading_id, user_id=None):
+    """Delete a specific reading"""
+    try:
+        with db_pool.connection(_db_file(user_id)) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT profile_id, date FROM readings WHERE id = ?", (reading_id,))
+            reading = cursor.fetchone()
+            if reading and not _owns_profile(cursor, reading[0], user_id):
+                return False
+            
+            cursor.execute(DELETE_READING_QUERY, (reading_id,))
+            cursor.execute("DELETE FROM reading_anomalies WHERE reading_id = ?", (reading_id,))
+            if reading:
+                _update_rollups(cursor, {reading})
+            
+            conn.commit()
+        
+        if reading:
+            rolling_analytics.invalidate(_analytics_key(user_id, reading[0]))
         return True
     except Exception as e:
         print(f"Delete reading error: {e}")
         return False
 
-def export_data_to_csv():
-    """Export all data to CSV file"""
+def query_readings(profile_ids=None, start_date=None, end_date=None, columns=None,
+                   ascending=False, user_id=None):
+    """
+    Get readings filtered, ordered and projected in SQL.
+    
+    profile_ids: profiles to include (None for all)
+    start_date, end_date: inclusive date range (None for open-ended)
+    user_id: only readings of profiles this user owns (None for any)
+    columns: names from READING_COLUMNS to return (None for all)
+    
+    Returns: DataFrame ordered by date and time (newest first unless
+    ascending), with Date and MeasuredAt as datetime64 columns
+    """
     try:
-        conn = sqlite3.connect(DB_FILE)
+        if columns is None:
+            columns = list(READING_COLUMNS)
+        unknown = [c for c in columns if c not in READING_COLUMNS]
+        if unknown:
+            raise ValueError(f"unknown columns: {unknown}")
         
-        # Get all readings with profile information
-        query = """
-        SELECT r.date, r.time, r.systolic, r.diastolic, r.heart_rate, r.category,
-               p.name, p.gender, p.age
-        FROM readings r
-        JOIN profiles p ON r.profile_id = p.id
-        ORDER BY p.name, r.date, r.time
-        """
+        with db_pool.connection(_db_file(user_id)) as conn:
+            scope = _profile_scope(conn.cursor(), profile_ids, user_id)
+            query, params = _query_readings_query(columns, scope, start_date, end_date, ascending)
+            df = pd.read_sql_query(query, conn, params=params)
         
-        df = pd.read_sql_query(query, conn)
+        # Drop the sort columns added when they were not asked for
+        df = df[columns]
+        if 'Date' in df.columns:
+            df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d', errors='coerce')
+        if 'MeasuredAt' in df.columns:
+            df['MeasuredAt'] = pd.to_datetime(df['MeasuredAt'], unit='s')
         
-        # Rename columns for better readability
-        df.columns = ['Date', 'Time', 'Systolic', 'Diastolic', 'Heart Rate', 
-                      'Category', 'Name', 'Gender', 'Age']
+        return df
+    except Exception as e:
+        print(f"Query readings error: {e}")
+        return pd.DataFrame(columns=columns or list(READING_COLUMNS))
+
+def _rollup_filters(period, profile_ids=None, start_date=None, end_date=None, user_id=None):
+    """Build a WHERE clause and parameters selecting rollup rows of one period"""
+    clauses = ["period = ?"]
+    params = [period]
+    if profile_ids is not None:
+        profile_ids = list(profile_ids)
+        clauses.append(f"profile_id IN ({', '.join('?' for _ in profile_ids) or 'NULL'})")
+        params.extend(profile_ids)
+    if user_id is not None:
+        clauses.append(f"profile_id IN ({USER_PROFILES_SUBQUERY})")
+        params.append(user_id)
+    if start_date is not None:
+        clauses.append("bucket_start >= ?")
+        params.append(str(start_date))
+    if end_date is not None:
+        clauses.append("bucket_start <= ?")
+        params.append(str(end_date))
+    return f"WHERE {' AND '.join(clauses)}", params
+
+def _rollup_statistics(rollups, categories, keys):
+    """
+    Turn rollup sums into statistics.
+    
+    rollups: rows with the keys, n and each metric's n, sum, sumsq, min
+    and max; categories: rows with the keys, category and n
+    
+    Returns: one row per key with n, each metric's n, mean, std, min and
+    max, and one count column per category
+    """
+    result = rollups[keys + ['n']].copy()
+    for prefix, _ in ROLLUP_METRICS:
+        n = rollups[f'{prefix}_n']
+        total = rollups[f'{prefix}_sum']
+        mean = total / n.where(n > 0)
+        # Sample variance from the running sums, clipped against rounding
+        variance = (rollups[f'{prefix}_sumsq'] - total * mean) / (n - 1).where(n > 1)
+        result[f'{prefix}_n'] = n
+        result[f'{prefix}_mean'] = mean
+        result[f'{prefix}_std'] = variance.clip(lower=0) ** 0.5
+        result[f'{prefix}_min'] = rollups[f'{prefix}_min']
+        result[f'{prefix}_max'] = rollups[f'{prefix}_max']
+    
+    if categories.empty:
+        return result
+    if not keys:
+        # A single row: one column per category
+        for category, n in categories.groupby('category')['n'].sum().items():
+            result[category] = int(n)
+        return result
+    
+    histogram = categories.pivot_table(
+        index=keys, columns='category', values='n', aggfunc='sum', fill_value=0
+    ).reset_index()
+    histogram.columns.name = None
+    result = result.merge(histogram, on=keys, how='left')
+    category_columns = histogram.columns[len(keys):]
+    result[category_columns] = result[category_columns].fillna(0).astype(int)
+    return result
+
+def get_rollups(profile_ids=None, period='day', start_date=None, end_date=None, user_id=None):
+    """
+    Get rollup rows with mean, standard deviation and category counts.
+    
+    Returns one row per (profile, bucket) with n, and for each metric the
+    count, mean, std, min and max, plus one count column per category.
+    """
+    try:
+        where, params = _rollup_filters(period, profile_ids, start_date, end_date, user_id)
+        
+        with db_pool.connection(_db_file(user_id)) as conn:
+            rollups = pd.read_sql_query(
+                f"SELECT * FROM reading_rollups {where} ORDER BY profile_id, bucket_start",
+                conn, params=params
+            )
+            categories = pd.read_sql_query(
+                f"SELECT profile_id, bucket_start, category, n FROM reading_rollup_categories {where}",
+                conn, params=params
+            )
+        
+        return _rollup_statistics(rollups, categories, ['profile_id', 'bucket_start'])
+    except Exception as e:
+        print(f"Get rollups error: {e}")
+        return pd.DataFrame()
+
+def summarize_rollups(profile_ids=None, start_date=None, end_date=None, period=None,
+                      per_profile=True, user_id=None):
+    """
+    Summarize readings over a date range from the daily rollups.
+    
+    Only the days in [start_date, end_date] are combined, so a range that
+    starts mid-week still gives exact weekly figures.
+    
+    period: None for the whole range, 'day' or 'week' (buckets starting
+        on Monday)
+    per_profile: one row per profile (profile_id column) rather than
+        pooling the selected profiles
+    
+    Returns: DataFrame shaped like get_rollups(), with profile_id and
+    bucket_start only when grouped by them; empty when there is no data
+    """
+    try:
+        where, params = _rollup_filters('day', profile_ids, start_date, end_date, user_id)
         
-        conn.close()
+        keys = []
+        key_columns = []
+        if per_profile:
+            keys.append('profile_id')
+            key_columns.append('profile_id')
+        if period is not None:
+            keys.append('bucket_start')
+            # Day buckets regrouped like ROLLUP_BUCKETS groups reading dates
+            bucket = {'day': "bucket_start",
+                      'week': "date(bucket_start, 'weekday 0', '-6 days')"}[period]
+            key_columns.append(f"{bucket} AS bucket_start")
+        select_keys = "".join(f"{column}, " for column in key_columns)
+        group_by = f"GROUP BY {', '.join(str(i + 1) for i in range(len(keys)))}" if keys else ""
         
-        # Generate filename with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"blood_pressure_export_{timestamp}.csv"
+        metric_aggregates = ", ".join(
+            f"SUM({prefix}_n) AS {prefix}_n, SUM({prefix}_sum) AS {prefix}_sum, "
+            f"SUM({prefix}_sumsq) AS {prefix}_sumsq, MIN({prefix}_min) AS {prefix}_min, "
+            f"MAX({prefix}_max) AS {prefix}_max"
+            for prefix, _ in ROLLUP_METRICS
+        )
         
-        # Save to CSV
-        df.to_csv(filename, index=False)
+        with db_pool.connection(_db_file(user_id)) as conn:
+            rollups = pd.read_sql_query(
+                f"""
+                SELECT {select_keys}SUM(n) AS n, {metric_aggregates}
+                FROM reading_rollups
+                {where}
+                {group_by}
+                ORDER BY {', '.join(keys) or 'n'}
+                """,
+                conn, params=params
+            )
+            categories = pd.read_sql_query(
+                f"""
+                SELECT {select_keys}category, SUM(n) AS n
+                FROM reading_rollup_categories
+                {where}
+                GROUP BY {', '.join(str(i + 1) for i in range(len(keys) + 1))}
+                """,
+                conn, params=params
+            )
+        
+        # Without grouping an empty range still gives one row of NULLs
+        rollups = rollups[rollups['n'].fillna(0) > 0].reset_index(drop=True)
+        return _rollup_statistics(rollups, categories, keys)
+    except Exception as e:
+        print(f"Summarize rollups error: {e}")
+        return pd.DataFrame()
+
+def _date_filters(start_date=None, end_date=None):
+    """SQL conditions on r.date and their parameters for an inclusive date range"""
+    clauses = []
+    params = []
+    
+    # Dates are stored as ISO strings, so string comparison is chronological
+    if start_date is not None:
+        if isinstance(start_date, date_type):
+            start_date = start_date.strftime('%Y-%m-%d')
+        clauses.append("r.date >= ?")
+        params.append(start_date)
+    if end_date is not None:
+        if isinstance(end_date, date_type):
+            end_date = end_date.strftime('%Y-%m-%d')
+        clauses.append("r.date <= ?")
+        params.append(end_date)
+    
+    return clauses, params
+
+def _reading_filters(profile_ids=None, start_date=None, end_date=None, user_id=None):
+    """Build a WHERE clause and parameters for owner, profile and date range filters"""
+    clauses = []
+    params = []
+    
+    if profile_ids is not None:
+        profile_ids = list(profile_ids)
+        placeholders = ", ".join("?" for _ in profile_ids) or "NULL"
+        clauses.append(f"r.profile_id IN ({placeholders})")
+        params.extend(profile_ids)
+    
+    if user_id is not None:
+        clauses.append(f"r.profile_id IN ({USER_PROFILES_SUBQUERY})")
+        params.append(user_id)
+    
+    date_clauses, date_params = _date_filters(start_date, end_date)
+    clauses.extend(date_clauses)
+    params.extend(date_params)
+    
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+def _profile_scope(cursor, profile_ids=None, user_id=None):
+    """
+    Resolve the profiles a readings query covers.
+    
+    Returns: list of profile ids (the user's, narrowed to profile_ids
+    when given), or None for every reading in the database
+    """
+    if user_id is None:
+        return None if profile_ids is None else [int(p) for p in profile_ids]
+    
+    cursor.execute(PROFILES_BY_USER_QUERY, (user_id,))
+    owned = [row[0] for row in cursor.fetchall()]
+    if profile_ids is None:
+        return owned
+    wanted = set(profile_ids)
+    return [profile_id for profile_id in owned if profile_id in wanted]
+
+def _merged_readings_query(select, scope, clauses=(), params=(), order="", join=""):
+    """
+    Build an ordered readings query as one index scan per profile.
+    
+    Each profile's readings come off the (profile_id, date, time) index
+    already in order and SQLite merges the scans (MERGE (UNION ALL)),
+    rather than collecting every matching reading and sorting it, so a
+    LIMIT stops after the rows it needs.
+    
+    select: result columns; order: ORDER BY terms naming them
+    SQLite caps a compound SELECT at 500 arms, so scopes wider than one
+    user's profiles (MAX_PROFILES) are read with a single
+    profile_id IN (...) scan and sorted instead.
+    
+    scope: profile ids from _profile_scope(), or None for all readings
+    clauses, params: further conditions on r and their parameters
+    
+    Returns: (sql, params)
+    """
+    clauses = list(clauses)
+    params = list(params)
+    if scope is not None and len(scope) > MAX_PROFILES:
+        clauses.insert(0, f"r.profile_id IN ({', '.join('?' * len(scope))})")
+        params = list(scope) + params
+        scope = None
+    if scope is None:
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return f"SELECT {select} FROM readings r {join} {where} ORDER BY {order}", params
+    
+    arms = []
+    arm_params = []
+    # An empty scope still needs one arm; profile_id = NULL matches nothing
+    for profile_id in scope or [None]:
+        where = " AND ".join(["r.profile_id = ?"] + clauses)
+        arms.append(f"SELECT {select} FROM readings r {join} WHERE {where}")
+        arm_params.extend([profile_id] + list(params))
+    return f"{' UNION ALL '.join(arms)} ORDER BY {order}", arm_params
+
+def _readings_page_query(scope, page_size, cursor=None, backwards=False,
+                         start_date=None, end_date=None):
+    """
+    SQL and parameters for one keyset page of get_readings_page().
+    
+    Returns: (sql, params)
+    """
+    clauses, params = _date_filters(start_date, end_date)
+    if cursor is not None:
+        clauses.append(f"(r.date, r.time, r.id) {'>' if backwards else '<'} (?, ?, ?)")
+        params.extend(cursor)
+    
+    order = "ASC" if backwards else "DESC"
+    query, params = _merged_readings_query(
+        READINGS_LIST_COLUMNS, scope, clauses, params,
+        order=f"date {order}, time {order}, id {order}", join=READINGS_PROFILE_JOIN
+    )
+    # Fetch one extra row to learn whether another page follows
+    return f"{query} LIMIT ?", params + [page_size + 1]
+
+def _query_readings_query(columns, scope, start_date=None, end_date=None, ascending=False):
+    """
+    SQL and parameters for query_readings().
+    
+    Date and Time are selected even when not asked for, since the merged
+    scans can only be ordered by result columns.
+    
+    Returns: (sql, params)
+    """
+    selected = list(columns) + [c for c in ('Date', 'Time') if c not in columns]
+    select = ", ".join(f"{READING_COLUMNS[c]} AS {c}" for c in selected)
+    # Only join profiles when a profile attribute is requested
+    join = READINGS_PROFILE_JOIN if any(
+        READING_COLUMNS[c].startswith('p.') for c in columns) else ""
+    clauses, params = _date_filters(start_date, end_date)
+    order = "ASC" if ascending else "DESC"
+    return _merged_readings_query(select, scope, clauses, params,
+                                  order=f"Date {order}, Time {order}", join=join)
+
+def _export_query(scope, start_date=None, end_date=None):
+    """
+    SQL and parameters for export rows, by profile name then date and time.
+    
+    Returns: (sql, params)
+    """
+    clauses, params = _date_filters(start_date, end_date)
+    return _merged_readings_query(
+        "r.date AS date, r.time AS time, r.systolic, r.diastolic, r.heart_rate, "
+        "r.category, p.name AS name, p.gender, p.age",
+        scope, clauses, params, order="name, date, time", join=READINGS_PROFILE_JOIN
+    )
+
+# The readings queries above are built per call, so they are registered
+# with the SQL their builders generate for a user's profiles, a profile
+# selection, and every reading
+HOT_QUERIES.update({
+    "readings_page": _readings_page_query(
+        None, DEFAULT_PAGE_SIZE, ("2024-01-01", "08:00", 1)),
+    "readings_page_by_profile": _readings_page_query(
+        [1], DEFAULT_PAGE_SIZE, ("2024-01-01", "08:00", 1)),
+    "readings_prev_page_by_profile": _readings_page_query(
+        [1], DEFAULT_PAGE_SIZE, ("2024-01-01", "08:00", 1), backwards=True),
+    "readings_page_by_user": _readings_page_query(
+        [1, 2, 3], DEFAULT_PAGE_SIZE, ("2024-01-01", "08:00", 1)),
+    "readings_first_page_by_user_range": _readings_page_query(
+        [1, 2, 3], DEFAULT_PAGE_SIZE, start_date="2024-01-01", end_date="2024-12-31"),
+    "query_readings_range": _query_readings_query(
+        ['Date', 'Systolic'], None, start_date="2024-01-01"),
+    "query_readings_by_profile_range": _query_readings_query(
+        ['Date', 'Systolic'], [1], start_date="2024-01-01"),
+    "query_readings_by_user": _query_readings_query(
+        ['Date', 'Time', 'ProfileId', 'Name', 'Systolic', 'Diastolic'], [1, 2, 3]),
+    "query_readings_by_user_range": _query_readings_query(
+        ['Systolic', 'Diastolic'], [1, 2], start_date="2024-01-01", ascending=True),
+    "export_by_user": _export_query([1, 2, 3], start_date="2024-01-01"),
+})
+
+def _iter_export_rows(profile_ids=None, start_date=None, end_date=None,
+                      chunk_size=EXPORT_CHUNK_SIZE, user_id=None):
+    """Yield lists of export rows (in EXPORT_COLUMNS order) chunk_size at a time"""
+    with db_pool.connection(_db_file(user_id)) as conn:
+        cursor = conn.cursor()
+        query, params = _export_query(_profile_scope(cursor, profile_ids, user_id),
+                                      start_date, end_date)
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+def _open_text(dest, compress):
+    """
+    Return (text stream over dest, whether to close it). A path is opened;
+    a file-like dest must be binary when compressing, otherwise text.
+    """
+    if isinstance(dest, (str, os.PathLike)):
+        return (gzip.open(dest, 'wt', newline='') if compress else open(dest, 'w', newline=''),
+                True)
+    if compress:
+        return io.TextIOWrapper(gzip.GzipFile(fileobj=dest, mode='wb'), newline=''), True
+    return dest, False
+
+def stream_readings_csv(dest, profile_ids=None, start_date=None, end_date=None,
+                        compress=False, chunk_size=EXPORT_CHUNK_SIZE, user_id=None):
+    """
+    Write readings as CSV to a path or file-like object without loading them all.
+    
+    Rows are pulled from the cursor chunk_size at a time and written as they
+    arrive. With compress=True the output is gzip-compressed on the fly; a
+    file-like dest must then be opened in binary mode, otherwise text mode.
+    
+    Returns: number of readings written
+    """
+    out, close_out = _open_text(dest, compress)
+    written = 0
+    try:
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerow(EXPORT_COLUMNS)
+        
+        for rows in _iter_export_rows(profile_ids, start_date, end_date, chunk_size, user_id):
+            writer.writerows(rows)
+            written += len(rows)
+    finally:
+        # Closing the gzip wrapper writes its trailer but leaves a
+        # caller-owned dest open
+        if close_out:
+            out.close()
+    
+    return written
+
+def stream_readings_jsonl(dest, profile_ids=None, start_date=None, end_date=None,
+                          compress=False, chunk_size=EXPORT_CHUNK_SIZE, user_id=None):
+    """
+    Write readings as JSON Lines, one object per reading keyed by
+    EXPORT_COLUMNS, streamed like stream_readings_csv().
+    
+    Returns: number of readings written
+    """
+    out, close_out = _open_text(dest, compress)
+    written = 0
+    try:
+        for rows in _iter_export_rows(profile_ids, start_date, end_date, chunk_size, user_id):
+            out.writelines(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + '\n' for row in rows)
+            written += len(rows)
+    finally:
+        if close_out:
+            out.close()
+    
+    return written
+
+def stream_readings_parquet(dest, profile_ids=None, start_date=None, end_date=None,
+                            chunk_size=PARQUET_ROW_GROUP_SIZE, user_id=None):
+    """
+    Write readings as Parquet, one row group per chunk_size readings, so
+    only one chunk is held in memory. Requires pyarrow.
+    
+    Returns: number of readings written
+    """
+    if not HAS_PYARROW:
+        raise RuntimeError("Parquet export requires the pyarrow package")
+    
+    schema = pa.schema([
+        ('Date', pa.string()), ('Time', pa.string()),
+        ('Systolic', pa.int16()), ('Diastolic', pa.int16()), ('Heart Rate', pa.int16()),
+        ('Category', pa.dictionary(pa.int8(), pa.string())),
+        ('Name', pa.string()), ('Gender', pa.string()), ('Age', pa.int16()),
+    ])
+    written = 0
+    with pq.ParquetWriter(dest, schema, compression='zstd') as writer:
+        for rows in _iter_export_rows(profile_ids, start_date, end_date, chunk_size, user_id):
+            columns = zip(*rows)
+            writer.write_batch(pa.record_batch(
+                [pa.array(values, field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            ))
+            written += len(rows)
+    
+    return written
+
+def export_formats():
+    """Export formats usable in this install, in EXPORT_FORMATS order"""
+    return [fmt for fmt in EXPORT_FORMATS if fmt != 'parquet' or HAS_PYARROW]
+
+def export_readings_bytes(fmt='csv', profile_ids=None, start_date=None, end_date=None,
+                          user_id=None):
+    """
+    Export readings in one of EXPORT_FORMATS, streamed from the database
+    into an in-memory file.
+    
+    Returns: bytes, or None on error
+    """
+    try:
+        buffer = io.BytesIO()
+        if fmt in ('csv', 'jsonl'):
+            # Stream text through a wrapper that leaves the buffer open
+            text = io.TextIOWrapper(buffer, encoding='utf-8', newline='')
+            stream = stream_readings_csv if fmt == 'csv' else stream_readings_jsonl
+            stream(text, profile_ids, start_date, end_date, user_id=user_id)
+            text.flush()
+            text.detach()
+        elif fmt == 'csv.gz':
+            stream_readings_csv(buffer, profile_ids, start_date, end_date, compress=True,
+                                user_id=user_id)
+        elif fmt == 'parquet':
+            stream_readings_parquet(buffer, profile_ids, start_date, end_date, user_id=user_id)
+        else:
+            raise ValueError(f"unknown export format: {fmt}")
+        
+        return buffer.getvalue()
+    except Exception as e:
+        print(f"Export readings error: {e}")
+        return None
+
+def export_data_to_csv(filename=None, profile_ids=None, start_date=None, end_date=None,
+                       compress=False, user_id=None):
+    """Export readings to a CSV file, streamed in chunks, and return its name"""
+    try:
+        if filename is None:
+            # Generate filename with timestamp
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            filename = f"blood_pressure_export_{timestamp}.csv"
+            if compress:
+                filename += ".gz"
+        
+        stream_readings_csv(filename, profile_ids, start_date, end_date, compress,
+                            user_id=user_id)
         
         return filename
     except Exception as e:
         print(f"Export data error: {e}")
         return None
+
+def summary_table(summary, names, period='week'):
+    """
+    Label a per-profile summarize_rollups() result for export.
+    
+    names: profile id -> profile name
+    
+    Returns: DataFrame with Name, Week (or Day), Readings and the
+    statistic columns
+    """
+    table = summary.drop(columns=['profile_id'])
+    table.insert(0, 'Name', summary['profile_id'].map(names))
+    return table.rename(columns={'bucket_start': period.capitalize(), 'n': 'Readings'})
+
+def export_summary_to_csv(filename=None, profile_ids=None, start_date=None, end_date=None,
+                          period='week', user_id=None):
+    """Export per-profile statistics per week or day (see summary_table) and return the file name"""
+    try:
+        if filename is None:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            filename = f"blood_pressure_summary_{timestamp}.csv"
+        
+        summary = summarize_rollups(profile_ids, start_date, end_date, period=period,
+                                    user_id=user_id)
+        if summary.empty:
+            return None
+        names = {profile['id']: profile['name'] for profile in get_profiles(user_id)}
+        summary_table(summary, names, period).to_csv(filename, index=False)
+        
+        return filename
+    except Exception as e:
+        print(f"Export summary error: {e}")
+        return None
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "claim-profiles":
+        print("usage: python database.py claim-profiles <user_id>")
+        sys.exit(2)
+    print(f"Claimed {claim_unowned_profiles(int(sys.argv[2]))} profiles.")
@@ -0,0 +1,123 @@
+import sqlite3
+import threading
+import queue
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Connection tuning applied to every pooled connection
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KIB = 16384
+MMAP_SIZE = 64 * 1024 * 1024
+# Prepared statements sqlite3 keeps compiled per connection; since connections
+# are long-lived, repeated queries skip the parse/plan step entirely
+STATEMENT_CACHE_SIZE = 256
+MAX_IDLE_CONNECTIONS = 8
+# Pools kept open at once; with one database file per tenant only the most
+# recently used shards hold connections
+MAX_POOLS = 32
+
+class ConnectionPool:
+    """Pool of long-lived, tuned SQLite connections for one database file"""
+
+    def __init__(self, db_file, max_idle=MAX_IDLE_CONNECTIONS):
+        self.db_file = db_file
+        self.max_idle = max_idle
+        self._idle = queue.LifoQueue()
+        self._closed = False
+
+    def _connect(self):
+        """Open a new connection and apply the pragmas"""
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        cursor = conn.cursor()
+
+        # WAL lets readers proceed while a writer holds the lock
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+
+        # Negative cache_size is in KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+        cursor.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+
+        cursor.close()
+        return conn
+
+    def acquire(self):
+        """Take an idle connection, opening a new one if none is available"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding uncommitted work"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+
+        if self._closed or self._idle.qsize() >= self.max_idle:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    def close(self):
+        """Close every idle connection; borrowed ones close on release"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pools = OrderedDict()
+_pools_lock = threading.Lock()
+
+def get_pool(db_file):
+    """Get (or create) the shared pool for a database file, evicting the least recently used"""
+    evicted = []
+    with _pools_lock:
+        pool = _pools.get(db_file)
+        if pool is None:
+            pool = ConnectionPool(db_file)
+            _pools[db_file] = pool
+            while len(_pools) > MAX_POOLS:
+                evicted.append(_pools.popitem(last=False)[1])
+        else:
+            _pools.move_to_end(db_file)
+
+    # Connections still borrowed from an evicted pool close on release
+    for old in evicted:
+        old.close()
+    return pool
+
+@contextmanager
+def connection(db_file):
+    """Borrow a pooled connection for the duration of a with-block"""
+    pool = get_pool(db_file)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+def close_pool(db_file):
+    """Close and forget the pool for a database file"""
+    with _pools_lock:
+        pool = _pools.pop(db_file, None)
+    if pool is not None:
+        pool.close()
+
+def close_all():
+    """Close every pool, e.g. before deleting database files"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
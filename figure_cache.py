@@ -0,0 +1,89 @@
+import threading
+from collections import OrderedDict
+import plotly.io as pio
+
+# Most figures kept, and most bytes across them (measured as serialized
+# JSON); the least recently used are evicted first
+MAX_ENTRIES = 128
+MAX_BYTES = 64 * 1024 * 1024
+
+class FigureCache:
+    """
+    LRU cache of built Plotly figures.
+
+    A hit returns the Figure object itself. st.plotly_chart only converts
+    a Figure to a dict and serializes it, whereas a dict would first be
+    validated into a new Figure, a large share of the cost of building
+    it. Callers must not modify a returned figure.
+
+    Keys should hold everything a figure depends on, e.g. the user, the
+    profile selection, the time range and the database write sequence, so
+    an entry never needs invalidating: new data gives a new key and the
+    old entry ages out.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._figures = OrderedDict()  # key -> (figure, serialized size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_figure(self, key, build):
+        """Return the figure for key, calling build() only on a miss"""
+        with self._lock:
+            cached = self._figures.get(key)
+            if cached is not None:
+                self._figures.move_to_end(key)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+
+        figure = build()
+        size = len(pio.to_json(figure, validate=False))
+        with self._lock:
+            if key not in self._figures:
+                self._figures[key] = (figure, size)
+                self._bytes += size
+            self._figures.move_to_end(key)
+            figure = self._figures[key][0]
+            while self._figures and (len(self._figures) > self.max_entries
+                                     or self._bytes > self.max_bytes):
+                _, (_, evicted) = self._figures.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+        return figure
+
+    def clear(self):
+        """Drop every cached figure"""
+        with self._lock:
+            self._figures.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return hit/miss counters and the cache size"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._figures),
+                "bytes": self._bytes,
+            }
+
+_default_cache = FigureCache()
+
+def get_cache():
+    """Return the process-wide figure cache"""
+    return _default_cache
+
+def get_figure(key, build):
+    """Return a figure from the process-wide cache, building it on a miss"""
+    return _default_cache.get_figure(key, build)
+
+def stats():
+    """Counters of the process-wide cache"""
+    return _default_cache.stats()
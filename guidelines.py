@@ -0,0 +1,208 @@
+import os
+import bisect
+import numpy as np
+
+# Guideline sets as data. Each one lists:
+#   categories: (name, systolic range, diastolic range, match) from most to
+#       least severe; a reading takes the first category it matches. A
+#       range is (minimum, exclusive maximum) with None for an open end,
+#       or None to ignore that value. match is "any" (either value in its
+#       range) or "all" (both). The last entry is the fallback.
+#   age_bounds: ages that start a new bracket once exceeded
+#   age_adjustments: (systolic, diastolic) subtracted per age bracket
+#   gender_adjustments: (systolic, diastolic) subtracted for a gender
+GUIDELINES = {
+    "acc_aha_2017": {
+        "name": "ACC/AHA 2017",
+        "categories": [
+            ("Hypertensive Crisis", (180, None), (120, None), "any"),
+            ("Hypertension Stage 2", (140, None), (90, None), "any"),
+            ("Hypertension Stage 1", (130, 140), (80, 90), "any"),
+            ("Elevated", (120, 130), (None, 80), "all"),
+            ("Normal", None, None, "any"),
+        ],
+        # Older people tend to have higher BP, women slightly lower
+        "age_bounds": [50, 60],
+        "age_adjustments": [(0, 0), (3, 2), (5, 3)],
+        "gender_adjustments": {"Female": (-3, -2)},
+    },
+    "esc_2018": {
+        "name": "ESC/ESH 2018",
+        "categories": [
+            ("Grade 3 Hypertension", (180, None), (110, None), "any"),
+            ("Grade 2 Hypertension", (160, None), (100, None), "any"),
+            ("Grade 1 Hypertension", (140, None), (90, None), "any"),
+            ("High Normal", (130, None), (85, None), "any"),
+            ("Normal", (120, None), (80, None), "any"),
+            ("Optimal", None, None, "any"),
+        ],
+        "age_bounds": [],
+        "age_adjustments": [(0, 0)],
+        "gender_adjustments": {},
+    },
+}
+
+DEFAULT_GUIDELINE = "acc_aha_2017"
+
+# Readings are floored and clipped into [0, MAX_*] for the table lookup;
+# index MAX_* + 1 holds the result for a missing (NaN) value. Thresholds
+# must sit well inside the range so clipping never changes a category.
+MAX_SYSTOLIC = 300
+MAX_DIASTOLIC = 200
+
+def _in_range(values, bounds):
+    """Test values against a (minimum, exclusive maximum) range; NaN is never in range"""
+    low, high = bounds
+    result = ~np.isnan(values)
+    if low is not None:
+        result &= values >= low
+    if high is not None:
+        result &= values < high
+    return result
+
+def compile_guideline(key, rules):
+    """
+    Compile a guideline's rules into a dense category lookup table.
+    
+    table[age_bracket, gender_index, systolic, diastolic] holds the
+    category code (an index into categories, least severe first) for every
+    integer reading plus the missing-value slot. Since thresholds and
+    adjustments are integers, a fractional reading gets the same category
+    as its floor.
+    
+    Returns: dict with the table and what is needed to index it
+    """
+    if rules["categories"][-1][1:3] != (None, None):
+        raise ValueError(f"{key}: the last category must be an unconditional fallback")
+    if len(rules["age_adjustments"]) != len(rules["age_bounds"]) + 1:
+        raise ValueError(f"{key}: need one age adjustment per bracket")
+    
+    genders = list(rules["gender_adjustments"])
+    gender_adjustments = [(0, 0)] + [rules["gender_adjustments"][g] for g in genders]
+    
+    margin = max(abs(a) for adj in rules["age_adjustments"] + gender_adjustments for a in adj)
+    for name, *ranges, _ in rules["categories"]:
+        for bounds, maximum in zip(ranges, (MAX_SYSTOLIC, MAX_DIASTOLIC)):
+            for bound in bounds or ():
+                if bound is not None and not margin < bound < maximum - margin:
+                    raise ValueError(f"{key}: {name} threshold {bound} is outside the lookup table")
+    
+    # Every integer reading, then NaN for the missing-value slot
+    systolic = np.append(np.arange(MAX_SYSTOLIC + 1, dtype=float), np.nan)[:, None]
+    diastolic = np.append(np.arange(MAX_DIASTOLIC + 1, dtype=float), np.nan)[None, :]
+    
+    # Codes count up with severity, so the fallback is 0
+    categories = [name for name, _, _, _ in rules["categories"]][::-1]
+    shape = (len(rules["age_adjustments"]), len(gender_adjustments),
+             MAX_SYSTOLIC + 2, MAX_DIASTOLIC + 2)
+    table = np.zeros(shape, dtype=np.int8)
+    for bracket, (age_s, age_d) in enumerate(rules["age_adjustments"]):
+        for gender_index, (gender_s, gender_d) in enumerate(gender_adjustments):
+            adjusted_s = systolic - age_s - gender_s
+            adjusted_d = diastolic - age_d - gender_d
+            codes = table[bracket, gender_index]
+            assigned = np.zeros(shape[2:], dtype=bool)
+            for name, systolic_range, diastolic_range, match in rules["categories"][:-1]:
+                tests = []
+                if systolic_range is not None:
+                    tests.append(_in_range(adjusted_s, systolic_range))
+                if diastolic_range is not None:
+                    tests.append(_in_range(adjusted_d, diastolic_range))
+                if match == "all":
+                    matches = np.logical_and.reduce(np.broadcast_arrays(*tests))
+                else:
+                    matches = np.logical_or.reduce(np.broadcast_arrays(*tests))
+                matches = matches & ~assigned
+                codes[matches] = categories.index(name)
+                assigned |= matches
+    
+    return {
+        "key": key,
+        "name": rules["name"],
+        "categories": categories,
+        "age_bounds": list(rules["age_bounds"]),
+        "genders": genders,
+        "table": table,
+        # Flat copy for scalar lookups, which are cheaper on bytes than
+        # through NumPy indexing, with the offset of each (age bracket,
+        # gender) block; None is the block for unadjusted genders
+        "flat": table.tobytes(),
+        "row_offsets": [
+            {gender: (bracket * len(gender_adjustments) + index) * shape[2] * shape[3]
+             for index, gender in enumerate([None] + genders)}
+            for bracket in range(shape[0])
+        ],
+    }
+
+# Compiled once at import; classification is then a table index
+COMPILED = {key: compile_guideline(key, rules) for key, rules in GUIDELINES.items()}
+
+_active = COMPILED[os.environ.get("BP_GUIDELINE", DEFAULT_GUIDELINE)]
+
+def get_guideline():
+    """Return the compiled guideline currently used for categorization"""
+    return _active
+
+def set_guideline(key):
+    """
+    Switch the guideline used for categorization in this process.
+
+    Stored categories are not changed; database.sync_guideline() queues
+    their recategorization.
+    """
+    global _active
+    if key not in COMPILED:
+        raise ValueError(f"Unknown guideline: {key}")
+    _active = COMPILED[key]
+    return _active
+
+def _clip_index(values, maximum):
+    """Turn readings into table indexes: floor, clip, and send NaN to the missing slot"""
+    values = np.floor(np.asarray(values, dtype=float))
+    return np.where(np.isnan(values), maximum + 1,
+                    np.clip(np.nan_to_num(values, nan=0.0), 0, maximum)).astype(np.intp)
+
+def age_brackets(age, guideline=None):
+    """Return the age bracket index (or indexes) under a guideline"""
+    guideline = guideline or _active
+    age = np.asarray(age, dtype=float)
+    # An age equal to a bound stays in the lower bracket; NaN ages, which
+    # exceed no bound, go to the first
+    brackets = np.searchsorted(guideline["age_bounds"], age, side='left')
+    return np.where(np.isnan(age), 0, brackets)
+
+def gender_indexes(gender, guideline=None):
+    """Return the gender adjustment index (or indexes); 0 means no adjustment"""
+    guideline = guideline or _active
+    gender = np.asarray(gender)
+    indexes = np.zeros(gender.shape, dtype=np.intp)
+    for index, name in enumerate(guideline["genders"], start=1):
+        indexes[gender == name] = index
+    return indexes
+
+def lookup_codes(systolic, diastolic, gender, age, guideline=None):
+    """
+    Categorize arrays of readings with a single fancy index.
+    
+    Arguments broadcast together like NumPy operands.
+    
+    Returns: int8 array of codes into the guideline's categories
+    """
+    guideline = guideline or _active
+    return guideline["table"][
+        age_brackets(age, guideline),
+        gender_indexes(gender, guideline),
+        _clip_index(systolic, MAX_SYSTOLIC),
+        _clip_index(diastolic, MAX_DIASTOLIC),
+    ]
+
+def lookup_category(systolic, diastolic, gender, age, guideline=None):
+    """Categorize one reading with a direct table lookup"""
+    guideline = guideline or _active
+    bracket = bisect.bisect_left(guideline["age_bounds"], age) if age == age else 0
+    row = guideline["row_offsets"][bracket].get(gender, guideline["row_offsets"][bracket][None])
+    
+    # Same floor/clip/NaN handling as _clip_index(), without array overhead
+    s = MAX_SYSTOLIC + 1 if systolic != systolic else int(min(max(systolic, 0), MAX_SYSTOLIC) // 1)
+    d = MAX_DIASTOLIC + 1 if diastolic != diastolic else int(min(max(diastolic, 0), MAX_DIASTOLIC) // 1)
+    return guideline["categories"][guideline["flat"][row + s * (MAX_DIASTOLIC + 2) + d]]
@@ -0,0 +1,64 @@
+import sys
+import sqlite3
+import database
+import auth_db
+
+# Plan steps that mean SQLite is reading a whole table or sorting in memory
+# instead of walking an index
+DEGRADED_STEPS = ("SCAN ", "USE TEMP B-TREE")
+
+def explain_query_plan(conn, sql, params=()):
+    """Return the EXPLAIN QUERY PLAN detail lines for a query"""
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return [row[-1] for row in rows]
+
+def find_degraded_steps(plan):
+    """Return the plan steps that scan a table or sort without an index"""
+    return [
+        step for step in plan
+        if step.startswith(DEGRADED_STEPS) and step != "SCAN CONSTANT ROW"
+    ]
+
+def check_query_plans(targets=None):
+    """
+    Explain every registered hot query and collect regressions.
+
+    targets: list of (db_file, hot_queries) pairs, defaulting to the
+    readings and auth databases.
+
+    Returns: list of dicts describing each query whose plan degraded
+    """
+    if targets is None:
+        targets = [
+            (database.DB_FILE, database.HOT_QUERIES),
+            (auth_db.AUTH_DB_FILE, auth_db.HOT_QUERIES),
+        ]
+
+    problems = []
+    for db_file, hot_queries in targets:
+        # A fresh connection so the plans reflect the schema on disk rather
+        # than whatever a pooled connection last loaded
+        conn = sqlite3.connect(db_file)
+        try:
+            for name, (sql, params) in hot_queries.items():
+                try:
+                    plan = explain_query_plan(conn, sql, params)
+                except Exception as e:
+                    problems.append({"db": db_file, "query": name, "steps": [f"error: {e}"]})
+                    continue
+
+                degraded = find_degraded_steps(plan)
+                if degraded:
+                    problems.append({"db": db_file, "query": name, "steps": degraded})
+        finally:
+            conn.close()
+
+    return problems
+
+if __name__ == "__main__":
+    problems = check_query_plans()
+    for problem in problems:
+        print(f"{problem['db']}: {problem['query']} -> {'; '.join(problem['steps'])}")
+    if problems:
+        sys.exit(1)
+    print("All hot queries use an index.")
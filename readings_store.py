@@ -0,0 +1,187 @@
+import numpy as np
+import pandas as pd
+from circadian import minutes_of_day
+
+# Rows per pre-allocated chunk; appends fill the last chunk in place and
+# only allocate when it is full
+CHUNK_SIZE = 1024
+
+# Stored in place of a missing heart rate or an unparseable time
+MISSING = -1
+
+# Column -> dtype of each chunk array
+_COLUMNS = {
+    'day': np.int32,           # days since the epoch of the local date
+    'minute': np.int16,        # minutes since midnight, MISSING if unknown
+    'profile_id': np.int32,
+    'systolic': np.int16,
+    'diastolic': np.int16,
+    'heart_rate': np.int16,
+    'category': np.int8,       # index into ReadingsStore.categories
+}
+
+# 'HH:MM' for each minute of the day; MISSING (-1) indexes the trailing None
+_TIME_STRINGS = np.array([f"{m // 60:02d}:{m % 60:02d}" for m in range(24 * 60)] + [None],
+                         dtype=object)
+
+def _new_chunk(size=CHUNK_SIZE):
+    """Allocate one empty chunk"""
+    return {column: np.empty(size, dtype=dtype) for column, dtype in _COLUMNS.items()}
+
+class ReadingsStore:
+    """
+    Compact in-memory readings for one session.
+
+    Vitals are int16, categories are int8 codes, the date is a day number
+    and the time a minute of the day, and name, gender and age are held
+    once per profile instead of on every row. A time that does not parse
+    is kept as unknown rather than guessed. Rows live in fixed-size chunks, so appending
+    never copies what is already stored.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.filled = 0     # rows used in the last chunk
+        self.profiles = {}  # profile id -> (name, gender, age)
+        self.categories = []
+        self._category_codes = {}
+
+    def __len__(self):
+        if not self.chunks:
+            return 0
+        return (len(self.chunks) - 1) * CHUNK_SIZE + self.filled
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    def _category_code(self, category):
+        """Code for a category name, adding it on first use"""
+        code = self._category_codes.get(category)
+        if code is None:
+            code = self._category_codes[category] = len(self.categories)
+            self.categories.append(category)
+        return code
+
+    def set_profile(self, profile_id, name, gender, age):
+        """Record (or update) a profile's attributes"""
+        self.profiles[profile_id] = (name, gender, age)
+
+    def append(self, profile_id, date, time, systolic, diastolic, heart_rate, category):
+        """Add one reading given its date (date or 'YYYY-MM-DD') and 'HH:MM' time"""
+        if not self.chunks or self.filled == CHUNK_SIZE:
+            self.chunks.append(_new_chunk())
+            self.filled = 0
+        chunk, row = self.chunks[-1], self.filled
+        chunk['day'][row] = (pd.Timestamp(date).normalize() - pd.Timestamp(0)).days
+        chunk['minute'][row] = minutes_of_day([time])[0]
+        chunk['profile_id'][row] = profile_id
+        chunk['systolic'][row] = systolic
+        chunk['diastolic'][row] = diastolic
+        chunk['heart_rate'][row] = MISSING if heart_rate is None else heart_rate
+        chunk['category'][row] = self._category_code(category)
+        self.filled += 1
+
+    def extend(self, df):
+        """
+        Add readings from a DataFrame in bulk.
+
+        df: columns Date, Time, ProfileId, Systolic, Diastolic, HeartRate and
+            Category, plus Name, Gender and Age to record the profiles
+        """
+        if df.empty:
+            return
+        for profile in df.drop_duplicates('ProfileId').itertuples(index=False):
+            if hasattr(profile, 'Name'):
+                self.set_profile(profile.ProfileId, profile.Name, profile.Gender, profile.Age)
+
+        days = pd.to_datetime(df['Date']).dt.normalize()
+        columns = {
+            'day': ((days - pd.Timestamp(0)) // pd.Timedelta(days=1)).to_numpy(),
+            'minute': minutes_of_day(df['Time'].astype(str).to_numpy()),
+            'profile_id': df['ProfileId'].to_numpy(),
+            'systolic': df['Systolic'].to_numpy(),
+            'diastolic': df['Diastolic'].to_numpy(),
+            'heart_rate': df['HeartRate'].fillna(MISSING).to_numpy(),
+            'category': np.array([self._category_code(c) for c in df['Category'].unique()],
+                                 dtype=np.int8)[pd.factorize(df['Category'])[0]],
+        }
+
+        # Fill the last chunk, then whole new chunks
+        start = 0
+        while start < len(df):
+            if not self.chunks or self.filled == CHUNK_SIZE:
+                self.chunks.append(_new_chunk())
+                self.filled = 0
+            count = min(CHUNK_SIZE - self.filled, len(df) - start)
+            chunk = self.chunks[-1]
+            for column, values in columns.items():
+                chunk[column][self.filled:self.filled + count] = values[start:start + count]
+            self.filled += count
+            start += count
+
+    def column(self, name, last=None):
+        """
+        One stored column as a contiguous array.
+
+        last: only the last this many values, touching only the chunks
+        that hold them
+        """
+        if not self.chunks:
+            return np.empty(0, dtype=_COLUMNS[name])
+        parts = [chunk[name] for chunk in self.chunks[:-1]] + [self.chunks[-1][name][:self.filled]]
+        if last is not None:
+            # Enough trailing chunks to cover last values
+            needed = 1 + max(0, last - self.filled + CHUNK_SIZE - 1) // CHUNK_SIZE
+            return np.concatenate(parts[-needed:])[-last:]
+        return np.concatenate(parts)
+
+    def latest(self):
+        """Return the most recently added reading as a dict, or None"""
+        if self.empty:
+            return None
+        return self.to_frame(last=1).iloc[0].to_dict()
+
+    def to_frame(self, last=None):
+        """
+        Build a DataFrame view with the app's usual reading columns.
+
+        Name, Gender and Category come back as categoricals, so the view
+        does not repeat strings per row either. Time is missing where it was
+        not a valid 'HH:MM' time.
+
+        last: only the last this many readings
+        """
+        arrays = {name: self.column(name, last) for name in _COLUMNS}
+
+        # Profile attributes are looked up per row only in the view; a
+        # profile without recorded attributes gets missing values
+        positions = pd.Index(list(self.profiles)).get_indexer(arrays['profile_id'])
+        attributes = pd.DataFrame(list(self.profiles.values()),
+                                  columns=['Name', 'Gender', 'Age']).reindex(positions)
+
+        heart_rate = arrays['heart_rate'].astype(float)
+        heart_rate[arrays['heart_rate'] == MISSING] = np.nan
+        return pd.DataFrame({
+            'Date': pd.to_datetime(arrays['day'], unit='D'),
+            'Time': _TIME_STRINGS[arrays['minute']],
+            'ProfileId': arrays['profile_id'],
+            'Name': attributes['Name'].astype('category').to_numpy(),
+            'Gender': attributes['Gender'].astype('category').to_numpy(),
+            'Age': attributes['Age'].to_numpy(),
+            'Systolic': arrays['systolic'],
+            'Diastolic': arrays['diastolic'],
+            'HeartRate': heart_rate,
+            'Category': pd.Categorical.from_codes(arrays['category'], categories=self.categories),
+        })
+
+    def nbytes(self):
+        """Approximate memory held by the stored arrays"""
+        return sum(values.nbytes for chunk in self.chunks for values in chunk.values())
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build a store holding the readings of a DataFrame"""
+        store = cls()
+        store.extend(df)
+        return store
@@ -0,0 +1,254 @@
+import threading
+from collections import deque
+import numpy as np
+import pandas as pd
+
+# Vitals tracked per profile
+ROLLING_METRICS = ['Systolic', 'Diastolic', 'HeartRate']
+
+# Readings in the moving window used for moving averages and variability
+WINDOW_READINGS = 14
+
+# EWMA smoothing over roughly this many readings: alpha = 2 / (span + 1)
+EWMA_SPAN = 10
+
+# Time-of-day slots for the morning vs evening comparison, as [start, end)
+# hours
+MORNING_HOURS = (4, 12)
+EVENING_HOURS = (18, 24)
+
+class RunningStats:
+    """Welford accumulator for count, mean and variance"""
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value):
+        """Add one value"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def remove(self, value):
+        """Undo add(value), for sliding windows"""
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        delta = value - self.mean
+        self.count -= 1
+        self.mean -= delta / self.count
+        self.m2 -= delta * (value - self.mean)
+
+    def std(self):
+        """Sample standard deviation, or None below two values"""
+        if self.count < 2:
+            return None
+        return max(self.m2, 0.0) ** 0.5 / (self.count - 1) ** 0.5
+
+class MetricState:
+    """Incremental analytics for one vital of one profile"""
+
+    def __init__(self, window=WINDOW_READINGS, span=EWMA_SPAN):
+        self.alpha = 2 / (span + 1)
+        self.total = RunningStats()
+        self.window = deque(maxlen=window)
+        self.window_stats = RunningStats()
+        # Sum of |x[i] - x[i-1]| over consecutive pairs inside the window
+        self.window_abs_diff = 0.0
+        self.ewma = None
+        self.morning = RunningStats()
+        self.evening = RunningStats()
+
+    def add(self, value, hour):
+        """Add one reading; missing values are skipped"""
+        if value is None or value != value:
+            return
+        value = float(value)
+        self.total.add(value)
+
+        if len(self.window) == self.window.maxlen:
+            oldest = self.window[0]
+            self.window_stats.remove(oldest)
+            self.window_abs_diff -= abs(self.window[1] - oldest) if len(self.window) > 1 else 0.0
+        if self.window:
+            self.window_abs_diff += abs(value - self.window[-1])
+        self.window.append(value)
+        self.window_stats.add(value)
+
+        self.ewma = value if self.ewma is None else self.alpha * value + (1 - self.alpha) * self.ewma
+
+        if MORNING_HOURS[0] <= hour < MORNING_HOURS[1]:
+            self.morning.add(value)
+        elif EVENING_HOURS[0] <= hour < EVENING_HOURS[1]:
+            self.evening.add(value)
+
+    def summary(self):
+        """Return the current analytics as a dict"""
+        window_mean = self.window_stats.mean if self.window_stats.count else None
+        window_std = self.window_stats.std()
+        morning = self.morning.mean if self.morning.count else None
+        evening = self.evening.mean if self.evening.count else None
+        return {
+            'count': self.total.count,
+            'mean': self.total.mean if self.total.count else None,
+            'std': self.total.std(),
+            'moving_average': window_mean,
+            'window_std': window_std,
+            'window_cv': (window_std / window_mean
+                          if window_std is not None and window_mean else None),
+            'window_arv': (self.window_abs_diff / (len(self.window) - 1)
+                           if len(self.window) > 1 else None),
+            'ewma': self.ewma,
+            'morning_mean': morning,
+            'evening_mean': evening,
+            'morning_evening_diff': (morning - evening
+                                     if morning is not None and evening is not None else None),
+        }
+
+class ProfileState:
+    """Incremental analytics for every tracked vital of one profile"""
+
+    def __init__(self, window=WINDOW_READINGS, span=EWMA_SPAN):
+        self.metrics = {metric: MetricState(window, span) for metric in ROLLING_METRICS}
+        # (date, time) of the latest reading seen; older readings can't be
+        # folded in incrementally
+        self.last_seen = None
+
+    def add(self, date, time, values):
+        """Add one reading given its 'YYYY-MM-DD' date, 'HH:MM' time and metric values"""
+        self.last_seen = (date, time)
+        hour = int(time[:2])
+        for metric in ROLLING_METRICS:
+            self.metrics[metric].add(values.get(metric), hour)
+
+    def summary(self):
+        """Return each metric's summary() keyed by metric name"""
+        return {metric: state.summary() for metric, state in self.metrics.items()}
+
+def _hours(df):
+    """Hour of day for each reading from its 'HH:MM' Time column"""
+    return pd.to_numeric(df['Time'].astype(str).str[:2], errors='coerce').to_numpy()
+
+def rolling_history(df, window=WINDOW_READINGS, span=EWMA_SPAN):
+    """
+    Compute the same windows vectorized over a reading history.
+
+    df: readings with Date, Time and metric columns, in any order
+
+    Returns: DataFrame in time order with, per metric, the moving average,
+    window std, CV, ARV and EWMA as of each reading. Readings missing a
+    metric are skipped for that metric, as they are incrementally.
+    """
+    history = df.sort_values(['Date', 'Time'], kind='stable').reset_index(drop=True)
+    result = history[['Date', 'Time']].copy()
+    for metric in ROLLING_METRICS:
+        if metric not in history.columns:
+            continue
+        values = history[metric].astype(float).dropna()
+        rolling = values.rolling(window, min_periods=1)
+        mean = rolling.mean()
+        std = rolling.std()
+        # ARV: mean of the successive differences with both ends in the
+        # window, of which there are one fewer than readings
+        abs_diff = values.diff().abs()
+        arv = abs_diff.rolling(window - 1, min_periods=1).sum() / (rolling.count() - 1)
+        result[f'{metric}_moving_average'] = mean
+        result[f'{metric}_window_std'] = std
+        result[f'{metric}_window_cv'] = std / mean
+        result[f'{metric}_window_arv'] = arv
+        result[f'{metric}_ewma'] = values.ewm(alpha=2 / (span + 1), adjust=False).mean()
+    return result
+
+def state_from_history(df, window=WINDOW_READINGS, span=EWMA_SPAN):
+    """
+    Build a ProfileState equal to feeding df's readings in time order, but
+    computed vectorized rather than one reading at a time.
+    """
+    state = ProfileState(window, span)
+    if df.empty:
+        return state
+    history = df.sort_values(['Date', 'Time'], kind='stable').reset_index(drop=True)
+    hours = _hours(history)
+    last_date = history['Date'].iloc[-1]
+    if not isinstance(last_date, str):
+        last_date = last_date.strftime('%Y-%m-%d')
+    state.last_seen = (last_date, history['Time'].iloc[-1])
+
+    for metric in ROLLING_METRICS:
+        if metric not in history.columns:
+            continue
+        metric_state = state.metrics[metric]
+        values = history[metric].to_numpy(dtype=float)
+        present = ~np.isnan(values)
+        values, metric_hours = values[present], hours[present]
+        if not len(values):
+            continue
+
+        metric_state.total = _welford(values)
+        tail = values[-window:]
+        metric_state.window.extend(tail.tolist())
+        metric_state.window_stats = _welford(tail)
+        metric_state.window_abs_diff = float(np.abs(np.diff(tail)).sum())
+        metric_state.ewma = float(
+            pd.Series(values).ewm(alpha=2 / (span + 1), adjust=False).mean().iloc[-1])
+        metric_state.morning = _welford(values[(metric_hours >= MORNING_HOURS[0]) &
+                                               (metric_hours < MORNING_HOURS[1])])
+        metric_state.evening = _welford(values[(metric_hours >= EVENING_HOURS[0]) &
+                                               (metric_hours < EVENING_HOURS[1])])
+    return state
+
+def _welford(values):
+    """RunningStats for an array, as if each value had been added"""
+    if not len(values):
+        return RunningStats()
+    mean = float(values.mean())
+    return RunningStats(len(values), mean, float(((values - mean) ** 2).sum()))
+
+_states = {}
+_states_lock = threading.Lock()
+
+def get_summary(key, load_history):
+    """
+    Return the analytics summary for a profile.
+
+    key identifies the profile's state (the database passes its file and
+    the profile id). load_history() is called only when no state is held
+    yet and must return the profile's readings as a DataFrame.
+    """
+    with _states_lock:
+        state = _states.get(key)
+    if state is None:
+        state = state_from_history(load_history())
+        with _states_lock:
+            # Keep a state built concurrently by another caller
+            state = _states.setdefault(key, state)
+    with _states_lock:
+        return state.summary()
+
+def observe(key, date, time, values):
+    """
+    Fold a newly saved reading into a profile's state.
+
+    values maps metric names to numbers. Only profiles with state are
+    updated; a reading dated before the latest one seen drops the state so
+    it is rebuilt from history on the next request.
+    """
+    with _states_lock:
+        state = _states.get(key)
+        if state is None:
+            return
+        if state.last_seen is not None and (date, time) < state.last_seen:
+            del _states[key]
+            return
+        state.add(date, time, values)
+
+def invalidate(key=None):
+    """Drop held state for one profile, or for all profiles"""
+    with _states_lock:
+        if key is None:
+            _states.clear()
+        else:
+            _states.pop(key, None)
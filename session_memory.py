@@ -0,0 +1,132 @@
+import os
+import sys
+import threading
+import time
+import pandas as pd
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Sessions with no interaction for this long lose their heavy data; it is
+# reloaded on their next interaction
+IDLE_SECONDS = int(os.environ.get("BP_SESSION_IDLE_SECONDS", "1800"))
+
+# Idle sessions are looked for at most this often, on some session's rerun
+EVICT_INTERVAL_SECONDS = 60
+
+# Session id -> {"last_seen": monotonic time, "items": {name: value},
+#                "state_bytes": approximate st.session_state size}
+_sessions = {}
+_lock = threading.Lock()
+_last_evict = time.monotonic()
+
+def session_id():
+    """Id of the Streamlit session running this script, or 'default' outside one"""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "default"
+
+def size_of(value):
+    """Approximate bytes held by a value"""
+    if hasattr(value, 'nbytes') and callable(value.nbytes):
+        return value.nbytes()
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(size_of(k) + size_of(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(size_of(v) for v in value)
+    return sys.getsizeof(value)
+
+def _entry(key):
+    """The registry entry of a session, created on first use; call with _lock held"""
+    return _sessions.setdefault(key, {"last_seen": time.monotonic(), "items": {},
+                                      "state_bytes": 0})
+
+def touch(session_state=None):
+    """
+    Mark the current session active, record the size of its
+    st.session_state, and evict idle sessions if it is time to.
+
+    Call once per rerun.
+    """
+    global _last_evict
+    now = time.monotonic()
+    state_bytes = size_of(dict(session_state)) if session_state is not None else 0
+    with _lock:
+        entry = _entry(session_id())
+        entry["last_seen"] = now
+        entry["state_bytes"] = state_bytes
+        evict = now - _last_evict >= EVICT_INTERVAL_SECONDS
+        if evict:
+            _last_evict = now
+    if evict:
+        evict_idle()
+
+def get(name, load):
+    """
+    Return the current session's value for name, calling load() to
+    (re)build it if the session has none, e.g. after eviction.
+    """
+    key = session_id()
+    with _lock:
+        entry = _entry(key)
+        if name in entry["items"]:
+            return entry["items"][name]
+    value = load()
+    with _lock:
+        # Keep a value loaded concurrently by another rerun of the session
+        return _entry(key)["items"].setdefault(name, value)
+
+def drop(name):
+    """Forget the current session's value for name"""
+    with _lock:
+        entry = _sessions.get(session_id())
+        if entry is not None:
+            entry["items"].pop(name, None)
+
+def clear():
+    """Forget everything held for the current session, e.g. on logout"""
+    with _lock:
+        _sessions.pop(session_id(), None)
+
+def evict_idle(max_idle=IDLE_SECONDS):
+    """
+    Drop the held data of every session idle for longer than max_idle
+    seconds.
+
+    Returns: (sessions evicted, approximate bytes freed)
+    """
+    now = time.monotonic()
+    with _lock:
+        idle = [key for key, entry in _sessions.items() if now - entry["last_seen"] > max_idle]
+        evicted = [_sessions.pop(key) for key in idle]
+    return len(evicted), sum(size_of(value) for entry in evicted
+                             for value in entry["items"].values())
+
+def stats():
+    """
+    Report approximate memory held per session.
+
+    Returns: dict with session count, total bytes and per-session rows
+    (session, idle seconds, held bytes, session_state bytes, item names),
+    largest first
+    """
+    now = time.monotonic()
+    with _lock:
+        entries = [(key, entry["last_seen"], dict(entry["items"]), entry["state_bytes"])
+                   for key, entry in _sessions.items()]
+    sessions = []
+    for key, last_seen, items, state_bytes in entries:
+        sessions.append({
+            "session": key,
+            "idle_seconds": round(now - last_seen),
+            "held_bytes": sum(size_of(value) for value in items.values()),
+            "state_bytes": state_bytes,
+            "items": sorted(items),
+        })
+    sessions.sort(key=lambda s: s["held_bytes"] + s["state_bytes"], reverse=True)
+    return {
+        "sessions": len(sessions),
+        "total_bytes": sum(s["held_bytes"] + s["state_bytes"] for s in sessions),
+        "per_session": sessions,
+    }
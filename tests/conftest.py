@@ -0,0 +1,33 @@
+import os
+import sys
+import pytest
+
+# The app's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+
+# More profiles than SQLite allows arms in one compound SELECT (500)
+PROFILES = 600
+DAYS = 5
+
+@pytest.fixture
+def many_profiles(tmp_path, monkeypatch):
+    """A database with PROFILES profiles, each with a rising reading per day"""
+    db_file = str(tmp_path / "blood_pressure.db")
+    monkeypatch.setattr(database, "DB_FILE", db_file)
+    assert database.setup_database(db_file)
+
+    with database.db_pool.connection(db_file) as conn:
+        conn.executemany(
+            "INSERT INTO profiles (id, name, gender, age) VALUES (?, ?, 'Female', 40)",
+            [(profile_id, f"Profile {profile_id}") for profile_id in range(1, PROFILES + 1)]
+        )
+        conn.commit()
+
+    result = database.save_readings([
+        (profile_id, f"2024-01-0{day + 1}", "08:00", 120 + day, 80, 70, "Elevated")
+        for profile_id in range(1, PROFILES + 1)
+        for day in range(DAYS)
+    ])
+    assert result["inserted"] == PROFILES * DAYS
+    return db_file
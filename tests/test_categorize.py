@@ -0,0 +1,136 @@
+import math
+import numpy as np
+import pandas as pd
+import pytest
+import guidelines
+from utils import categorize_bp, categorize_bp_array, categorize_bp_codes, get_bp_categories
+
+GENDERS = ["Male", "Female", "Other"]
+# Either side of every age bracket bound, plus a missing age
+AGES = [0, 30, 49, 50, 50.5, 51, 59, 60, 60.5, 61, 90, math.nan]
+
+def reference_category(systolic, diastolic, gender, age, rules):
+    """Evaluate a guideline's rules directly, as a first-match if/elif chain"""
+    bracket = 0
+    for bound in rules["age_bounds"]:
+        if age > bound:
+            bracket += 1
+    age_s, age_d = rules["age_adjustments"][bracket]
+    gender_s, gender_d = rules["gender_adjustments"].get(gender, (0, 0))
+    adjusted = (systolic - age_s - gender_s, diastolic - age_d - gender_d)
+
+    for name, systolic_range, diastolic_range, match in rules["categories"]:
+        tests = []
+        for value, bounds in zip(adjusted, (systolic_range, diastolic_range)):
+            if bounds is None:
+                continue
+            low, high = bounds
+            # Comparisons with NaN are False, so a missing value is never in range
+            tests.append((low is None or value >= low) and (high is None or value < high))
+        if not tests or (all(tests) if match == "all" else any(tests)):
+            return name
+
+def original_categorize_bp(systolic, diastolic, gender, age):
+    """categorize_bp() as it was written before guidelines became data (ACC/AHA 2017)"""
+    age_factor_systolic = 0
+    age_factor_diastolic = 0
+    if age > 60:
+        age_factor_systolic = 5
+        age_factor_diastolic = 3
+    elif age > 50:
+        age_factor_systolic = 3
+        age_factor_diastolic = 2
+    gender_factor_systolic = -3 if gender == "Female" else 0
+    gender_factor_diastolic = -2 if gender == "Female" else 0
+    adjusted_systolic = systolic - age_factor_systolic - gender_factor_systolic
+    adjusted_diastolic = diastolic - age_factor_diastolic - gender_factor_diastolic
+
+    if adjusted_systolic >= 180 or adjusted_diastolic >= 120:
+        return "Hypertensive Crisis"
+    elif adjusted_systolic >= 140 or adjusted_diastolic >= 90:
+        return "Hypertension Stage 2"
+    elif (adjusted_systolic >= 130 and adjusted_systolic < 140) or (adjusted_diastolic >= 80 and adjusted_diastolic < 90):
+        return "Hypertension Stage 1"
+    elif adjusted_systolic >= 120 and adjusted_systolic < 130 and adjusted_diastolic < 80:
+        return "Elevated"
+    else:
+        return "Normal"
+
+@pytest.fixture(params=list(guidelines.GUIDELINES))
+def guideline(request):
+    """Make each guideline active in turn, restoring the previous one afterwards"""
+    previous = guidelines.get_guideline()["key"]
+    guidelines.set_guideline(request.param)
+    yield request.param
+    guidelines.set_guideline(previous)
+
+def grid(systolic, diastolic):
+    """Every combination of the given readings with GENDERS and AGES, as flat arrays"""
+    s, d, g, a = np.meshgrid(systolic, diastolic, np.arange(len(GENDERS)), AGES, indexing='ij')
+    return s.ravel(), d.ravel(), np.array(GENDERS)[g.ravel()], a.ravel()
+
+def test_codes_match_rules_on_every_integer_reading(guideline):
+    rules = guidelines.GUIDELINES[guideline]
+    # Past the table's edges too, where readings are clipped
+    s, d = np.meshgrid(np.arange(-5, guidelines.MAX_SYSTOLIC + 21),
+                       np.arange(-5, guidelines.MAX_DIASTOLIC + 21), indexing='ij')
+    s, d = s.ravel(), d.ravel()
+    categories = get_bp_categories()
+
+    for gender in GENDERS:
+        for age in [30, 50, 51, 60, 61, math.nan]:
+            expected = [categories.index(reference_category(x, y, gender, age, rules))
+                        for x, y in zip(s.tolist(), d.tolist())]
+            np.testing.assert_array_equal(categorize_bp_codes(s, d, gender, age), expected)
+
+def boundary_values(thresholds):
+    """Readings on, just below and just above each threshold, including fractions"""
+    values = set()
+    for threshold in thresholds:
+        for offset in (-5, -3, -2, -1.5, -1, -0.5, -0.01, 0, 0.01, 0.5, 1, 1.5, 2, 3, 5):
+            values.add(threshold + offset)
+    return sorted(values)
+
+def thresholds(rules, position):
+    """Every bound of one value (0 systolic, 1 diastolic) across a guideline's categories"""
+    return {bound for category in rules["categories"] if category[position + 1]
+            for bound in category[position + 1] if bound is not None}
+
+def test_scalar_and_vectorized_agree_on_boundaries_and_nan(guideline):
+    rules = guidelines.GUIDELINES[guideline]
+    systolic = boundary_values(thresholds(rules, 0)) + [math.nan]
+    diastolic = boundary_values(thresholds(rules, 1)) + [math.nan]
+    s, d, g, a = grid(systolic, diastolic)
+
+    codes = categorize_bp_codes(s, d, g, a)
+    categories = get_bp_categories()
+    for i in range(len(s)):
+        expected = reference_category(s[i], d[i], g[i], a[i], rules)
+        assert categorize_bp(s[i], d[i], g[i], a[i]) == expected, (s[i], d[i], g[i], a[i])
+        assert categories[codes[i]] == expected, (s[i], d[i], g[i], a[i])
+
+def test_matches_original_categorize_bp():
+    previous = guidelines.get_guideline()["key"]
+    guidelines.set_guideline("acc_aha_2017")
+    try:
+        s, d, g, a = grid(np.arange(60, 261), np.arange(30, 161))
+        codes = categorize_bp_codes(s, d, g, a)
+        categories = get_bp_categories()
+        for i in range(0, len(s), 7):
+            expected = original_categorize_bp(s[i], d[i], g[i], a[i])
+            assert categorize_bp(s[i], d[i], g[i], a[i]) == expected
+            assert categories[codes[i]] == expected
+    finally:
+        guidelines.set_guideline(previous)
+
+def test_array_accepts_series_and_broadcasts_scalars(guideline):
+    systolic = pd.Series([118.0, 125.0, 135.0, 150.0, 185.0, math.nan])
+    diastolic = pd.Series([70.0, 75.0, 85.0, 95.0, 125.0, 95.0])
+
+    result = categorize_bp_array(systolic, diastolic, "Female", 55)
+
+    assert isinstance(result, pd.Categorical)
+    assert result.ordered
+    assert list(result.categories) == get_bp_categories()
+    assert list(result) == [categorize_bp(s, d, "Female", 55)
+                            for s, d in zip(systolic, diastolic)]
@@ -0,0 +1,8 @@
+import database
+from conftest import PROFILES
+
+def test_circadian_covers_every_profile(many_profiles):
+    by_period, by_profile = database.get_circadian()
+    assert by_period['ProfileId'].nunique() == PROFILES
+    assert by_profile['ProfileId'].nunique() == PROFILES
+    assert by_period['Name'].notna().all()
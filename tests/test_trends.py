@@ -0,0 +1,13 @@
+import database
+from conftest import PROFILES, DAYS
+
+def test_query_readings_covers_every_profile(many_profiles):
+    readings = database.query_readings(list(range(1, PROFILES + 1)),
+                                       columns=['ProfileId', 'Systolic'])
+    assert len(readings) == PROFILES * DAYS
+    assert readings['ProfileId'].nunique() == PROFILES
+
+def test_trends_cover_every_profile(many_profiles):
+    result = database.get_trends()
+    assert len(result) == PROFILES
+    assert result['Name'].notna().all()
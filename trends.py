@@ -0,0 +1,164 @@
+import threading
+import numpy as np
+import pandas as pd
+
+# Vitals with a fitted trend
+TREND_METRICS = ['Systolic', 'Diastolic']
+
+# Days ahead projected from each trend line
+FORECAST_HORIZONS = (7, 30)
+
+# Huber threshold in robust standard deviations; residuals beyond it are
+# down-weighted instead of pulling the line
+HUBER_K = 1.345
+HUBER_ITERATIONS = 20
+HUBER_TOLERANCE = 1e-6
+
+SECONDS_PER_DAY = 86400
+
+def _weighted_fit(codes, t, y, weights, groups):
+    """Weighted least squares line per group from bincount sums"""
+    def total(values):
+        return np.bincount(codes, weights=values, minlength=groups)
+
+    w_sum = total(weights)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t_mean = total(weights * t) / w_sum
+        y_mean = total(weights * y) / w_sum
+        # Centering on each group's mean keeps the sums well conditioned
+        dt = t - t_mean[codes]
+        slope = total(weights * dt * (y - y_mean[codes])) / total(weights * dt * dt)
+    # A group whose readings share one timestamp has no slope
+    slope = np.where(np.isfinite(slope), slope, 0.0)
+    return slope, y_mean - slope * t_mean
+
+def _group_median(codes, values, groups):
+    """Median of values per group, from one sort"""
+    order = np.lexsort((values, codes))
+    ordered = values[order]
+    counts = np.bincount(codes, minlength=groups)
+    start = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    low = start + (counts - 1) // 2
+    high = start + counts // 2
+    ordered = np.append(ordered, np.nan)
+    return np.where(counts > 0, (ordered[np.minimum(low, len(ordered) - 1)] +
+                                 ordered[np.minimum(high, len(ordered) - 1)]) / 2, np.nan)
+
+def fit_trends(codes, t, y, groups, robust=False):
+    """
+    Fit a trend line for every group at once.
+
+    codes: group number (0..groups-1) of each observation
+    t: observation times in days; y: values
+    robust: refit with Huber weights (IRLS) so isolated outliers do not
+        tilt the line; every group is reweighted in the same vectorized
+        iterations
+
+    Returns: (slope per day, intercept at t=0, residual std) arrays of
+    length groups
+    """
+    codes = np.asarray(codes, dtype=np.intp)
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    weights = np.ones(len(y))
+    slope, intercept = _weighted_fit(codes, t, y, weights, groups)
+
+    if robust:
+        for _ in range(HUBER_ITERATIONS):
+            residuals = y - (intercept[codes] + slope[codes] * t)
+            # Robust scale per group from the median absolute residual
+            scale = _group_median(codes, np.abs(residuals), groups) / 0.6745
+            limit = HUBER_K * np.where(scale > 0, scale, np.inf)[codes]
+            with np.errstate(divide='ignore'):
+                weights = np.minimum(1.0, limit / np.abs(residuals))
+            new_slope, new_intercept = _weighted_fit(codes, t, y, weights, groups)
+            converged = np.nanmax(np.abs(new_slope - slope), initial=0.0) < HUBER_TOLERANCE
+            slope, intercept = new_slope, new_intercept
+            if converged:
+                break
+
+    residuals = y - (intercept[codes] + slope[codes] * t)
+    counts = np.bincount(codes, minlength=groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        resid_std = np.sqrt(np.bincount(codes, weights=residuals ** 2, minlength=groups)
+                            / np.where(counts > 2, counts - 2, np.nan))
+    return slope, intercept, resid_std
+
+def profile_trends(df, robust=True, horizons=FORECAST_HORIZONS):
+    """
+    Fit trends for every profile in df in one vectorized call per metric.
+
+    df: readings with ProfileId, MeasuredAt (or Date) and metric columns
+
+    Returns: DataFrame with one row per profile: n, the last reading time, and per metric the slope (per day), the fitted value at
+    the last reading, the residual std and a forecast per horizon
+    """
+    if df.empty:
+        return pd.DataFrame(columns=['ProfileId'])
+
+    when = pd.to_datetime(df['MeasuredAt'] if 'MeasuredAt' in df.columns else df['Date'])
+    if 'MeasuredAt' in df.columns and 'Date' in df.columns:
+        # Rows not yet backfilled with measured_at fall back to their date
+        when = when.fillna(pd.to_datetime(df['Date']))
+    # Seconds since the epoch whatever the datetime resolution
+    seconds = ((when - pd.Timestamp(0)) / pd.Timedelta(seconds=1)).to_numpy(dtype=float)
+    codes, profile_ids = pd.factorize(df['ProfileId'], sort=True)
+    groups = len(profile_ids)
+    # Days since the first reading overall, so the fit works on small numbers
+    t = (seconds - seconds.min()) / SECONDS_PER_DAY
+    last_t = np.full(groups, -np.inf)
+    np.maximum.at(last_t, codes, t)
+
+    result = pd.DataFrame({
+        'ProfileId': profile_ids,
+        'n': np.bincount(codes, minlength=groups),
+        'LastReading': pd.to_datetime(seconds.min() + last_t * SECONDS_PER_DAY, unit='s'),
+    })
+    for metric in TREND_METRICS:
+        if metric not in df.columns:
+            continue
+        y = df[metric].to_numpy(dtype=float)
+        present = ~np.isnan(y)
+        slope, intercept, resid_std = fit_trends(codes[present], t[present], y[present],
+                                                 groups, robust=robust)
+        current = intercept + slope * last_t
+        result[f'{metric}_slope'] = slope
+        result[f'{metric}_current'] = current
+        result[f'{metric}_resid_std'] = resid_std
+        for days in horizons:
+            result[f'{metric}_forecast_{days}d'] = current + slope * days
+    return result
+
+# (scope, profile id, robust) -> (data version, trend row)
+_cache = {}
+_cache_lock = threading.Lock()
+
+def get_trends(scope, versions, load, robust=True):
+    """
+    Return trend rows for the given profiles, refitting only stale ones.
+
+    scope: namespace for the cache, e.g. the database file
+    versions: {profile_id: data version}; a profile is refitted when its
+        version differs from the one its cached row was computed at
+    load(profile_ids): returns the readings of those profiles
+
+    Returns: DataFrame as from profile_trends(), one row per profile with readings
+    """
+    with _cache_lock:
+        stale = [profile_id for profile_id, version in versions.items()
+                 if _cache.get((scope, profile_id, robust), (None,))[0] != version]
+
+    if stale:
+        fitted = profile_trends(load(stale), robust=robust)
+        rows = {row.ProfileId: row for row in fitted.itertuples(index=False)}
+        with _cache_lock:
+            for profile_id in stale:
+                _cache[(scope, profile_id, robust)] = (versions[profile_id], rows.get(profile_id))
+
+    with _cache_lock:
+        rows = [_cache[(scope, profile_id, robust)][1] for profile_id in versions
+                if (scope, profile_id, robust) in _cache]
+    rows = [row for row in rows if row is not None]
+    if not rows:
+        return pd.DataFrame(columns=['ProfileId'])
+    return pd.DataFrame(rows)
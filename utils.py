@@ -1,43 +1,55 @@
 import pandas as pd
 import numpy as np
+import guidelines
 
 def categorize_bp(systolic, diastolic, gender, age):
     """
     Categorize blood pressure reading according to medical standards.
     Takes into account gender and age differences.
     
+    The thresholds and adjustments come from the active guideline in
+    guidelines.py, precompiled into a lookup table.
+    
     Returns: Category string
     """
-    # Age factor adjustment - older people tend to have higher BP
-    age_factor_systolic = 0
-    age_factor_diastolic = 0
-    
-    if age > 60:
-        age_factor_systolic = 5
-        age_factor_diastolic = 3
-    elif age > 50:
-        age_factor_systolic = 3
-        age_factor_diastolic = 2
-    
-    # Gender adjustments - women tend to have slightly lower BP than men
-    gender_factor_systolic = -3 if gender == "Female" else 0
-    gender_factor_diastolic = -2 if gender == "Female" else 0
-    
-    # Adjust the readings based on age and gender
-    adjusted_systolic = systolic - age_factor_systolic - gender_factor_systolic
-    adjusted_diastolic = diastolic - age_factor_diastolic - gender_factor_diastolic
-    
-    # Categorize according to standard guidelines
-    if adjusted_systolic >= 180 or adjusted_diastolic >= 120:
-        return "Hypertensive Crisis"
-    elif adjusted_systolic >= 140 or adjusted_diastolic >= 90:
-        return "Hypertension Stage 2"
-    elif (adjusted_systolic >= 130 and adjusted_systolic < 140) or (adjusted_diastolic >= 80 and adjusted_diastolic < 90):
-        return "Hypertension Stage 1"
-    elif adjusted_systolic >= 120 and adjusted_systolic < 130 and adjusted_diastolic < 80:
-        return "Elevated"
-    else:
-        return "Normal"
+    return guidelines.lookup_category(systolic, diastolic, gender, age)
+
+def get_bp_categories():
+    """Return the active guideline's categories in order of severity; category codes index into this"""
+    return guidelines.get_guideline()["categories"]
+
+def categorization_key(gender, age):
+    """
+    Return the part of a profile's demographics that affects categorize_bp().
+    
+    Two profiles with the same key get the same category for every reading.
+    """
+    guideline = guidelines.get_guideline()
+    return (int(guidelines.gender_indexes(gender, guideline)),
+            int(guidelines.age_brackets(age, guideline)))
+
+def categorize_bp_codes(systolic, diastolic, gender, age):
+    """
+    Vectorized categorize_bp() returning integer codes into get_bp_categories().
+    
+    All four arguments may be scalars, lists, NumPy arrays or pandas
+    Series and are broadcast together. Results match categorize_bp()
+    element for element; a missing value fails every threshold, as it
+    does there.
+    
+    Returns: int8 array of category codes
+    """
+    return guidelines.lookup_codes(systolic, diastolic, gender, age)
+
+def categorize_bp_array(systolic, diastolic, gender, age):
+    """
+    Vectorized categorize_bp() over arrays or Series.
+    
+    Returns: pandas Categorical of category strings, ordered by severity
+    """
+    codes = categorize_bp_codes(systolic, diastolic, gender, age)
+    return pd.Categorical.from_codes(np.atleast_1d(codes), categories=get_bp_categories(),
+                                     ordered=True)
 
 def get_category_color(category):
     """Return a color based on blood pressure category."""
@@ -47,6 +59,12 @@ def get_category_color(category):
         "Hypertension Stage 1": "#FF9800",  # Orange
         "Hypertension Stage 2": "#F44336",  # Red
         "Hypertensive Crisis": "#B71C1C",  # Dark Red
+        # ESC/ESH categories
+        "Optimal": "#2E7D32",  # Dark Green
+        "High Normal": "#FFEB3B",  # Yellow
+        "Grade 1 Hypertension": "#FF9800",  # Orange
+        "Grade 2 Hypertension": "#F44336",  # Red
+        "Grade 3 Hypertension": "#B71C1C",  # Dark Red
     }
     return colors.get(category, "#757575")  # Default gray
 
@@ -98,30 +116,141 @@ def get_category_description(category):
     }
     return descriptions.get(category, "No description available.")
 
-def calculate_statistics(df):
-    """Calculate statistics from blood pressure data."""
-    stats = {
-        'avg_systolic': df['Systolic'].mean(),
-        'min_systolic': df['Systolic'].min(),
-        'max_systolic': df['Systolic'].max(),
-        'avg_diastolic': df['Diastolic'].mean(),
-        'min_diastolic': df['Diastolic'].min(),
-        'max_diastolic': df['Diastolic'].max(),
-    }
+# Metrics summarized by grouped_statistics(); the last two are derived
+STAT_METRICS = ['Systolic', 'Diastolic', 'HeartRate', 'PulsePressure', 'MAP']
+STAT_PERCENTILES = (25, 50, 75)
+
+def add_derived_metrics(df):
+    """Return a copy of df with pulse pressure and mean arterial pressure columns"""
+    df = df.copy()
+    df['PulsePressure'] = df['Systolic'] - df['Diastolic']
+    df['MAP'] = df['Diastolic'] + df['PulsePressure'] / 3
+    return df
+
+def grouped_statistics(df, by=None, freq=None, time_column='Date',
+                       metrics=None, percentiles=STAT_PERCENTILES):
+    """
+    Summarize every metric for every group in one vectorized pass.
+    
+    df: readings with Systolic, Diastolic and optionally HeartRate columns
+    by: column name or list of names to group by, e.g. 'ProfileId'
+    freq: pandas period alias ('D', 'W', 'M', ...) bucketing time_column;
+        weekly buckets start on Monday like the database rollups
+    metrics: names from STAT_METRICS (None for all available)
+    
+    Each metric gets count, mean, std (sample), min, max and the given
+    percentiles, all ignoring missing values, so a group without heart
+    rates reports a count of 0 and NaN statistics rather than zeros.
     
-    # Add heart rate stats if available
-    if 'HeartRate' in df.columns and not df['HeartRate'].empty:
-        stats.update({
-            'avg_heart_rate': df['HeartRate'].mean(),
-            'min_heart_rate': df['HeartRate'].min(),
-            'max_heart_rate': df['HeartRate'].max(),
-        })
+    Returns: DataFrame with one row per group, the group keys as columns
+    and one {metric}_{statistic} column per result
+    """
+    data = add_derived_metrics(df)
+    if metrics is None:
+        metrics = [m for m in STAT_METRICS if m in data.columns]
+    
+    keys = [] if by is None else [by] if isinstance(by, str) else list(by)
+    if freq is not None:
+        data['Bucket'] = pd.to_datetime(data[time_column]).dt.to_period(freq).dt.start_time
+        keys.append('Bucket')
+    
+    if keys:
+        grouper = data.groupby(keys, sort=True, dropna=False)
+        codes = grouper.ngroup().to_numpy()
+        result = grouper.size().index.to_frame(index=False)
     else:
-        stats.update({
-            'avg_heart_rate': 0,
-            'min_heart_rate': 0,
-            'max_heart_rate': 0,
-        })
+        codes = np.zeros(len(data), dtype=np.intp)
+        result = pd.DataFrame(index=range(1))
+    groups = len(result)
+    
+    for metric in metrics:
+        values = data[metric].to_numpy(dtype=float)
+        present = ~np.isnan(values)
+        filled = np.where(present, values, 0.0)
+        
+        count = np.bincount(codes, weights=present, minlength=groups).astype(np.int64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.bincount(codes, weights=filled, minlength=groups) / count
+            # Squared deviations from each group's mean, which stays
+            # accurate where sum-of-squares would cancel
+            deviation = np.where(present, values - mean[codes], 0.0)
+            std = np.sqrt(np.bincount(codes, weights=deviation ** 2, minlength=groups)
+                          / np.where(count > 1, count - 1, np.nan))
+        
+        # One sort orders each group's values with missing ones last, so
+        # min, max and percentiles are positions within the group. The
+        # trailing NaN keeps positions of empty groups in bounds.
+        order = np.lexsort((values, codes))
+        ordered = np.append(values[order], np.nan)
+        start = np.searchsorted(codes[order], np.arange(groups))
+        empty = count == 0
+        
+        stats = {
+            'count': count,
+            'mean': mean,
+            'std': std,
+            'min': np.where(empty, np.nan, ordered[start]),
+            'max': np.where(empty, np.nan, ordered[start + np.maximum(count - 1, 0)]),
+        }
+        for q in percentiles:
+            # Linear interpolation between neighbours, as numpy.percentile does
+            position = start + np.maximum(count - 1, 0) * q / 100
+            low = np.floor(position).astype(np.intp)
+            high = np.ceil(position).astype(np.intp)
+            value = ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+            stats[f'p{q}'] = np.where(empty, np.nan, value)
+        
+        for name, column in stats.items():
+            result[f'{metric}_{name}'] = column
+    
+    return result
+
+def _stat_value(value):
+    """Convert a statistic for display: None when missing, int when whole"""
+    if pd.isna(value):
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+def calculate_statistics(df):
+    """
+    Calculate statistics from blood pressure data.
+    
+    A single-group view of grouped_statistics(). Heart rate statistics
+    are None when no reading has a heart rate.
+    """
+    summary = grouped_statistics(df).iloc[0]
+    stats = {}
+    for metric, key in [('Systolic', 'systolic'), ('Diastolic', 'diastolic'),
+                        ('HeartRate', 'heart_rate'), ('PulsePressure', 'pulse_pressure'),
+                        ('MAP', 'map')]:
+        for statistic, prefix in [('mean', 'avg'), ('min', 'min'), ('max', 'max'),
+                                  ('std', 'std'), ('p50', 'median')]:
+            stats[f'{prefix}_{key}'] = _stat_value(summary.get(f'{metric}_{statistic}'))
+    
+    return stats
+
+def statistics_from_rollups(summary):
+    """
+    calculate_statistics() from one row of database.summarize_rollups().
+    
+    Rollups hold counts, sums, minima and maxima only, so medians and the
+    spread of the derived metrics are None. Every reading has a systolic
+    and a diastolic value, so the derived means follow from theirs.
+    """
+    stats = {}
+    for key in ['systolic', 'diastolic', 'heart_rate']:
+        for statistic, prefix in [('mean', 'avg'), ('min', 'min'), ('max', 'max'),
+                                  ('std', 'std')]:
+            stats[f'{prefix}_{key}'] = _stat_value(summary.get(f'{key}_{statistic}'))
+        stats[f'median_{key}'] = None
+    
+    pulse_pressure = summary['systolic_mean'] - summary['diastolic_mean']
+    for key, value in [('pulse_pressure', pulse_pressure),
+                       ('map', summary['diastolic_mean'] + pulse_pressure / 3)]:
+        stats[f'avg_{key}'] = _stat_value(value)
+        for prefix in ['min', 'max', 'std', 'median']:
+            stats[f'{prefix}_{key}'] = None
     
     return stats
 
@@ -0,0 +1,196 @@
+import os
+import queue
+import atexit
+import logging
+import threading
+import time
+import database
+
+logger = logging.getLogger(__name__)
+
+# Write-behind mode: with BP_WRITE_BEHIND=1, save_reading() queues readings
+# for a background writer instead of committing before it returns
+WRITE_BEHIND = os.environ.get("BP_WRITE_BEHIND") == "1"
+
+# A group commit happens once this many readings are waiting...
+MAX_BATCH = 200
+# ...or once the oldest waiting reading has waited this long
+MAX_DELAY_SECONDS = 0.05
+
+_READING = "reading"
+_BARRIER = "barrier"
+_STOP = "stop"
+
+class WriteBehindQueue:
+    """
+    In-process queue drained by one writer thread in group commits.
+
+    A single thread takes items in FIFO order and each user's readings are
+    inserted in submission order, so readings for a profile are never
+    reordered. A barrier queued by flush() is released only after every
+    reading submitted before it has been written, and reports whether any
+    of the readings written since the previous barrier failed.
+    """
+
+    def __init__(self, max_batch=MAX_BATCH, max_delay=MAX_DELAY_SECONDS):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.committed = 0
+        self.failed = 0
+        self.commits = 0
+        # Set by a failed write, cleared when a barrier reports it
+        self._failed_since_barrier = False
+
+    def _ensure_started(self):
+        """Start the writer thread on first use"""
+        with self._lock:
+            if self._closed:
+                return False
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="write-behind",
+                                                daemon=True)
+                self._thread.start()
+            return True
+
+    def submit(self, reading, user_id=None):
+        """
+        Queue one (profile_id, date, time, systolic, diastolic, heart_rate,
+        category) reading for the next group commit.
+
+        Returns: False if the queue has been closed, otherwise True
+        """
+        if not self._ensure_started():
+            return False
+        self._queue.put((_READING, user_id, tuple(reading)))
+        return True
+
+    def flush(self, timeout=None):
+        """
+        Wait until everything submitted so far has been written.
+
+        Returns: True once durable; False on timeout, if the writer is not
+        running, or if any reading written since the last flush failed
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                return self._queue.empty()
+        done = threading.Event()
+        outcome = {}
+        self._queue.put((_BARRIER, done, outcome))
+        if not done.wait(timeout):
+            return False
+        return outcome["durable"]
+
+    def close(self, timeout=None):
+        """Commit what is queued and stop the writer thread"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put((_STOP, None, None))
+            thread.join(timeout)
+
+    def stats(self):
+        """Return queue depth and commit counters"""
+        return {
+            "pending": self._queue.qsize(),
+            "committed": self.committed,
+            "failed": self.failed,
+            "commits": self.commits,
+        }
+
+    def _run(self):
+        """Writer loop: gather a batch, commit it, release any barriers"""
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+
+            # Keep gathering until the batch is full, the oldest reading has
+            # waited long enough, or a barrier/stop asks for a commit now
+            readings = 1 if items[0][0] == _READING else 0
+            while items[-1][0] == _READING and readings < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                if items[-1][0] == _READING:
+                    readings += 1
+
+            batch = [item for item in items if item[0] == _READING]
+            try:
+                failed = self._commit(batch)
+            except Exception:
+                # Keep the writer alive so barriers are still released
+                logger.exception("Write-behind commit of %d readings failed", len(batch))
+                self.failed += len(batch)
+                failed = len(batch)
+            if failed:
+                self._failed_since_barrier = True
+
+            barriers = [(event, outcome) for kind, event, outcome in items if kind == _BARRIER]
+            for event, outcome in barriers:
+                outcome["durable"] = not self._failed_since_barrier
+                event.set()
+            if barriers:
+                self._failed_since_barrier = False
+            if items[-1][0] == _STOP:
+                return
+
+    def _commit(self, items):
+        """
+        Write a batch with one transaction per user (and so per shard).
+
+        Returns: number of readings not written
+        """
+        by_user = {}
+        for _, user_id, reading in items:
+            by_user.setdefault(user_id, []).append(reading)
+
+        failed = 0
+        for user_id, readings in by_user.items():
+            result = database.save_readings(readings, user_id=user_id)
+            if result["success"]:
+                self.committed += result["inserted"]
+                failed += len(result["errors"])
+                self.commits += 1
+            else:
+                logger.error("Write-behind commit for user %s failed: %s",
+                             user_id, result.get("message"))
+                failed += len(readings)
+            for error in result["errors"]:
+                logger.error("Write-behind reading error: %s", error["message"])
+        self.failed += failed
+        return failed
+
+_default_queue = WriteBehindQueue()
+atexit.register(_default_queue.close)
+
+def get_queue():
+    """Return the process-wide write-behind queue"""
+    return _default_queue
+
+def save_reading(profile_id, date, time, systolic, diastolic, heart_rate, category,
+                 user_id=None):
+    """
+    Save a reading, queued for a group commit when write-behind is enabled.
+
+    In write-behind mode a True result means the reading was accepted, not
+    yet committed; call flush() when it must be on disk.
+    """
+    if not WRITE_BEHIND:
+        return database.save_reading(profile_id, date, time, systolic, diastolic,
+                                     heart_rate, category, user_id=user_id)
+    return _default_queue.submit(
+        (profile_id, date, time, systolic, diastolic, heart_rate, category), user_id
+    )
+
+def flush(timeout=None):
+    """Wait for queued readings to commit; immediate when write-behind is off"""
+    return _default_queue.flush(timeout)